@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import time
+from typing import Union
+import aiohttp
+from . import retry
+from .errors import CircuitOpenError, QQBotAPIError, TransportUnavailableError
+from .cache import MISSING, ResponseCache
+from .QQBotHttp import QQBotHttp
+from .singleflight import AsyncSingleFlight
+from .trace import span
+
+class AsyncQQBotHttp(QQBotHttp):
+    """QQBotHttp 的 asyncio 版本
+
+    接口与 QQBotHttp 完全一致, 区别是每个接口返回可等待对象::
+
+        api = AsyncQQBotHttp(url)
+        info = await api.get_login_info()
+        await api.send_group_message(message, group_id)
+
+    所有接口共用一个 aiohttp 连接池, 大量并发请求可以同时进行而不阻塞事件循环。
+    连接池在第一次请求时于当前事件循环中创建, 使用完毕后需 ``await api.close()``。
+    """
+    def __init__(self,url,pool_size=100,keep_alive=True,timeout=(3.05, 10),warmup=0,retry_policies=None,circuit_breaker=None,cache_policies=None,transport=None):
+        """
+        参数:
+            url (str): OneBot HTTP 服务地址
+            pool_size (int): 连接池大小,所有接口共用
+            keep_alive (bool): 是否复用TCP连接
+            timeout (float | tuple): 默认超时(秒),可传入 (连接超时, 读取超时)
+            warmup (int): 第一次请求前预先建立的连接数
+            retry_policies (dict): 按接口名覆盖重试策略, 如 {'send_group_msg': RetryPolicy(...)}
+            circuit_breaker (CircuitBreaker | dict): 熔断器或其参数, 默认使用 CircuitBreaker()
+            cache_policies (dict): 按接口名覆盖只读接口的缓存策略 (有效期, 最多条目数), 见 cache.DEFAULT_CACHE_POLICIES
+            transport (WebSocketTransport): 设置后接口优先经 WebSocket 调用, 未连接时使用 HTTP
+        """
+        self._url = url
+        self._retry_policies = dict(retry_policies or {})
+        self.circuit_breaker = self._create_circuit_breaker(circuit_breaker)
+        self.cache = ResponseCache(cache_policies)
+        self.single_flight = AsyncSingleFlight()
+        self.transport = transport
+        self._timeout = tuple(timeout) if isinstance(timeout, list) else timeout
+        self._pool_size = pool_size
+        self._keep_alive = keep_alive
+        self._warmup = warmup
+        self._session = None
+
+        self.logger = logging.getLogger('QQBot.AsyncHttpAPI')
+        self.logger.info("Initializing AsyncQQBotHttp with URL: %s", url)
+
+    @staticmethod
+    def _client_timeout(timeout) -> aiohttp.ClientTimeout:
+        if isinstance(timeout, tuple):
+            return aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        return aiohttp.ClientTimeout(total=timeout)
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """获取共用的连接池, 不存在时创建"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self._pool_size, force_close=not self._keep_alive)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self._client_timeout(self._timeout))
+            if self._warmup:
+                await self.warmup(self._warmup)
+        return self._session
+
+    async def warmup(self, connections: int):
+        """预先建立连接, 避免首批请求承担TCP握手开销
+
+        参数:
+            connections (int): 需要建立的连接数
+        """
+        async def _touch():
+            try:
+                async with self._session.get(self._url + "/get_status") as response:
+                    await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.logger.warning(f"Warmup request failed: {str(e)}")
+
+        await asyncio.gather(*(_touch() for _ in range(connections)))
+        self.logger.debug("Warmed up %s connections", connections)
+
+    async def close(self):
+        """关闭连接池"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    @staticmethod
+    def _error_kind(error: Exception) -> str:
+        """将异常归类为 retry 模块中的失败类型"""
+        if isinstance(error, QQBotAPIError):
+            return retry.API
+        if isinstance(error, TransportUnavailableError):
+            return retry.CONNECT
+        if isinstance(error, aiohttp.ClientResponseError):
+            # 4xx 说明后端正常处理了请求, 5xx 视为后端故障
+            return retry.API if error.status < 500 else retry.NETWORK
+        # 只有新建连接失败时才能确定请求未到达后端
+        if isinstance(error, (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError)):
+            return retry.CONNECT
+        if isinstance(error, asyncio.TimeoutError):
+            return retry.TIMEOUT
+        return retry.NETWORK
+
+    async def _send(self, method: str, url: str, params, timeout) -> Union[dict, list]:
+        """发送一次请求, 不做重试"""
+        if self.transport is not None and self.transport.connected:
+            action = url.rsplit('/', 1)[-1]
+            ws_timeout = (timeout.sock_read or timeout.total) if timeout is not None else self._read_timeout(self._timeout)
+            try:
+                return self._parse_response(url, await self.transport.acall(action, params, ws_timeout))
+            except TransportUnavailableError as e:
+                self.logger.debug(f"WebSocket unavailable, sending '{action}' via HTTP: {str(e)}")
+        session = await self._get_session()
+        if method.upper() == 'POST':
+            # POST 请求直接发送 JSON 数据
+            request = session.post(url, json=params, timeout=timeout)
+        else:
+            # GET 请求使用 URL 参数
+            request = session.get(url, params=params, timeout=timeout)
+        async with request as http_response:
+            http_response.raise_for_status()
+            response = await http_response.json(content_type=None)
+        return self._parse_response(url, response)
+
+    async def _make_request(self, method: str, url: str, params=None, timeout=None, **kwargs) -> Union[dict, list]:
+        """发送HTTP请求并处理响应
+
+        参数:
+            method (str): HTTP方法 ('GET' 或 'POST')
+            url (str): 请求URL
+            params (dict): 请求参数
+            timeout (float | tuple): 本次请求的超时, 默认使用初始化时的设置
+            **kwargs: json 可作为 params 的别名
+
+        失败时按接口的重试策略(见 get_retry_policy)重试, 仍失败则抛出异常
+        """
+        if params is None:
+            params = kwargs.get('json')
+        request_timeout = self._client_timeout(timeout) if timeout is not None else None
+        action = url.rsplit('/', 1)[-1]
+        cached = self.cache.get(action, params)
+        if cached is not MISSING:
+            return cached
+        key = self._flight_key(action, params)
+        with span(self._span_name(action)):
+            if key is not None:
+                # 并发的相同读取请求合并为一次
+                return await self.single_flight.do(key, lambda: self._request(method, url, action, params, request_timeout))
+            return await self._request(method, url, action, params, request_timeout)
+
+    async def _request(self, method: str, url: str, action: str, params, timeout) -> Union[dict, list]:
+        """经熔断器和重试策略发送请求"""
+        await self._check_circuit()
+        policy = self.get_retry_policy(action)
+        policy.budget.deposit()
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = await self._send(method, url, params, timeout)
+                self.circuit_breaker.record_success()
+                self._update_cache(action, params, response)
+                return response
+            except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError, QQBotAPIError) as e:
+                kind = self._error_kind(e)
+                self._record_circuit_failure(kind)
+                delay = policy.next_delay(attempt, time.monotonic() - started, kind)
+                if delay is None or not self.circuit_breaker.available():
+                    self.logger.warning(f"Request '{action}' failed after {attempt} attempt(s): {str(e)}")
+                    raise
+                self.logger.warning(f"Request '{action}' attempt {attempt} failed, retrying in {delay:.2f}s: {str(e)}")
+                await asyncio.sleep(delay)
+
+    async def _check_circuit(self):
+        """熔断时立即失败; 需要试探时先用 get_status 探测后端"""
+        if not self.circuit_breaker.acquire():
+            return
+        try:
+            await self._send('POST', self._url + "/get_status", None, None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError, QQBotAPIError) as e:
+            self.circuit_breaker.record_failure()
+            raise CircuitOpenError(f"OneBot backend health probe failed: {str(e)}") from e
+        self.circuit_breaker.record_success()
@@ -1,27 +1,99 @@
+import asyncio
+import atexit
 import json
 import logging
 import os
+import threading
+import weakref
+import time
+from collections import deque
+from concurrent.futures import Future
 import sqlalchemy
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from QQBotAPI.message import ReceivedMessageChain
 from QQBotAPI.person import Group, Person
 from QQBotAPI.config import DataBasePath
 from QQBotAPI.errors import DataNotFoundInDataBaseError
 
+# 数据库结构版本, 记录在 PRAGMA user_version 中
+SCHEMA_VERSION = 1
+
+# 每个连接打开时设置的 PRAGMA, 可通过 MessageManager 的 pragmas 参数覆盖
+DEFAULT_PRAGMAS = {
+    # WAL 模式下 NORMAL 只在检查点时 fsync, 断电最多丢失最近提交的事务, 数据库不会损坏
+    'synchronous': 'NORMAL',
+    # 页缓存 64MB(负数单位为 KB)
+    'cache_size': -65536,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    # 写入线程提交检查点等情况下, 等待锁的毫秒数, 而不是立即报 database is locked
+    'busy_timeout': 5000
+}
+
+# 尚未 close() 的 MessageManager, 进程正常退出时由 _close_open_managers 写入缓冲区中的消息
+_open_managers = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_managers():
+    for manager in list(_open_managers):
+        manager.close()
+
 class MessageManager():
-    def __init__(self,qq_id):
+    """按机器人账号保存消息的 SQLite 数据库, 文件为 {qq_id}.db
+
+    打开时按 PRAGMA user_version 依次执行 _MIGRATIONS 中未执行的迁移, 旧版本的数据库文件就地升级。
+
+    wal 时使用 WAL 日志并设置 DEFAULT_PRAGMAS, 读取不阻塞写入。所有写入(add_message、update_message、迁移)
+    都由同一个写入线程经唯一的写连接执行, 不会互相争用写锁; 读取使用最多 readers 个只读连接的连接池。
+
+    write_behind 时 add_message 只把消息放入内存缓冲区, 由写入线程攒够 batch_size 条,
+    或最早的一条等待 flush_interval 秒后, 在一个事务中写入, 提交(fsync)次数不再等于消息数。
+    缓冲区中的消息同样可以通过 get_message_via_id 读取。进程异常退出时会丢失未写入的消息;
+    进程正常退出时未 close() 的实例会自动关闭并写入剩余消息。
+    写入失败时按 flush_interval 的指数退避(最长 max_backoff 秒)重试, 连续失败 max_retries 次后
+    丢弃该批消息(计入 dropped)。缓冲区中的消息达到 max_buffer 条时 add_message 等待写入线程腾出空间。
+
+    参数:
+        qq_id: 机器人QQ号
+        db_path (str): 数据库目录, 默认为 DataBasePath().db_path
+        write_behind (bool): 是否批量写入, 为 False 时每条消息立即提交
+        batch_size (int): 每批最多写入的消息数
+        flush_interval (float): 消息在缓冲区中最多等待的秒数
+        max_buffer (int): 缓冲区中最多的消息数(含正在写入的一批)
+        max_retries (int): 一批消息最多连续写入失败的次数
+        max_backoff (float): 重试前最长等待的秒数
+        wal (bool): 是否使用 WAL 日志, 为 False 时使用 SQLite 默认的回滚日志和 synchronous=FULL
+        pragmas (dict): 覆盖 DEFAULT_PRAGMAS 中的设置
+        readers (int): 读连接池大小
+    """
+    def __init__(self,qq_id,db_path:str = None,write_behind:bool = True,batch_size:int = 100,flush_interval:float = 0.05,
+                 max_buffer:int = 10000,max_retries:int = 5,max_backoff:float = 30.0,
+                 wal:bool = True,pragmas:dict = None,readers:int = 4):
         self.logger = logging.getLogger('MessageManager')
 
         
         # Get database directory from config
-        db_dir = DataBasePath().db_path
+        db_dir = db_path or DataBasePath().db_path
         os.makedirs(db_dir, exist_ok=True)
         # Use absolute path with configured directory
         db_path = os.path.join(db_dir, f'{qq_id}.db')
         db_url = f'sqlite:///{db_path}'
-        self.engine = sqlalchemy.create_engine(db_url)
+        self.db_file = db_path
+        self.readers = readers
+        self.wal = wal
+        self.pragmas = dict(DEFAULT_PRAGMAS, **(pragmas or {})) if wal else {'busy_timeout': DEFAULT_PRAGMAS['busy_timeout'], **(pragmas or {})}
+        # 唯一的写连接只在写入线程中使用(迁移在写入线程启动前执行)
+        self._write_engine = sqlalchemy.create_engine(db_url, pool_size=1, max_overflow=0,
+                                                      connect_args={'check_same_thread': False})
+        sqlalchemy.event.listen(self._write_engine, 'connect', lambda conn, _: self._configure(conn, writer=True))
+        # 读连接池, 连接设为只读
+        self.engine = sqlalchemy.create_engine(db_url, pool_size=readers, max_overflow=0,
+                                               connect_args={'check_same_thread': False})
+        sqlalchemy.event.listen(self.engine, 'connect', lambda conn, _: self._configure(conn, writer=False))
         self.logger.debug(f"Database connected to {db_url}")
         
-        #创建表
+        #表结构, 由 _migrate 创建
         self.metadata = sqlalchemy.MetaData()
         self.message_table = sqlalchemy.Table(
             'messages',
@@ -30,39 +102,332 @@ class MessageManager():
             sqlalchemy.Column('time', sqlalchemy.Integer),
             sqlalchemy.Column('group', sqlalchemy.Integer),
             sqlalchemy.Column('sender', sqlalchemy.Integer),
-            sqlalchemy.Column('json', sqlalchemy.JSON)
+            sqlalchemy.Column('json', sqlalchemy.JSON),
+            # message_id 在同一账号内唯一, 每个账号一个数据库文件
+            sqlalchemy.Index('ix_messages_message_id', 'message_id', unique=True),
+            sqlalchemy.Index('ix_messages_group_time', 'group', 'time'),
+            sqlalchemy.Index('ix_messages_sender_time', 'sender', 'time')
         )
         
-        self.metadata.create_all(self.engine)
+        self._migrate()
 
-        
-        
-    def add_message(self,message:ReceivedMessageChain):
-        #插入消息
+        self.write_behind = write_behind
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max(max_buffer, batch_size)
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        # 当前一批连续写入失败的次数
+        self._attempts = 0
+        # message_id -> 待写入的行; 写入线程取走的一批在提交前放在 _flushing 中, 读取时两者都要查
+        self._buffer = {}
+        self._flushing = {}
+        self._buffered_at = None
+        # 其他写操作, (函数, Future), 函数在写连接的事务中执行
+        self._jobs = deque()
+        self._cond = threading.Condition()
+        self._flush_requested = False
+        self._closed = False
+        self.batches = 0
+        self.flushed_rows = 0
+        self.max_batch = 0
+        self.flush_failures = 0
+        self.dropped = 0
+        self.backpressure_waits = 0
+        self._flush_latency_total = 0.0
+        self.max_flush_latency = 0.0
+        self.jobs = 0
+        self._writer = threading.Thread(target=self._write_loop, name=f'MessageWriter-{qq_id}', daemon=True)
+        self._writer.start()
+        _open_managers.add(self)
+
+    def _configure(self, dbapi_connection, writer:bool):
+        cursor = dbapi_connection.cursor()
+        if writer and self.wal:
+            # WAL 模式记录在数据库文件中, 由写连接设置一次即可
+            cursor.execute("PRAGMA journal_mode = WAL")
+        for name, value in self.pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        if not writer:
+            cursor.execute("PRAGMA query_only = ON")
+        cursor.close()
+
+    def schema_version(self) -> int:
+        with self._write_engine.connect() as conn:
+            return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+    def _migrate(self):
+        """把数据库升级到 SCHEMA_VERSION, 每个迁移与版本号在同一事务中提交"""
+        version = self.schema_version()
+        if version > SCHEMA_VERSION:
+            raise RuntimeError(f"Database schema version {version} is newer than supported version {SCHEMA_VERSION}")
+        for target in range(version + 1, SCHEMA_VERSION + 1):
+            with self._write_engine.begin() as conn:
+                _MIGRATIONS[target](self, conn)
+                conn.exec_driver_sql(f"PRAGMA user_version = {target}")
+            self.logger.info(f"Database migrated to schema version {target}")
+
+    def _migrate_to_1(self, conn):
+        """消息表加上 message_id 唯一索引和 (group, time)、(sender, time) 索引
+
+        旧版本每次收到(包括 OneBot 重发的)消息都插入一行, 同一 message_id 只保留最后写入的一行。
+        """
+        self.message_table.create(conn, checkfirst=True)
+        removed = conn.exec_driver_sql(
+            "DELETE FROM messages WHERE message_id IS NOT NULL AND rowid NOT IN "
+            "(SELECT MAX(rowid) FROM messages WHERE message_id IS NOT NULL GROUP BY message_id)"
+        ).rowcount
+        if removed:
+            self.logger.info(f"Removed {removed} duplicate messages")
+        # 表已存在时 create 不会创建索引
+        for index in self.message_table.indexes:
+            index.create(conn, checkfirst=True)
+
+    @staticmethod
+    def _row(message:ReceivedMessageChain) -> dict:
         group_id = message.get_group()
         if group_id:
             group_id = group_id.get_group_id()
-        with self.engine.connect() as conn:
-            conn.execute(self.message_table.insert().values(
-                message_id = message.get_message_id(),
-                time = message.get_time(),
-                group = group_id,
-                sender = message.get_sender().get_user_id(),
-                json = message.get_json_for_db()
-            ))
-            conn.commit()
+        return dict(
+            message_id = message.get_message_id(),
+            time = message.get_time(),
+            group = group_id,
+            sender = message.get_sender().get_user_id(),
+            json = message.get_json_for_db()
+        )
+
+    def _upsert(self, conn, rows):
+        #已存在的消息(如重新获取的消息)覆盖原记录
+        statement = sqlite_insert(self.message_table)
+        statement = statement.on_conflict_do_update(
+            index_elements=['message_id'],
+            set_={name: statement.excluded[name] for name in ('time', 'group', 'sender', 'json')}
+        )
+        conn.execute(statement, rows)
+
+    def add_message(self,message:ReceivedMessageChain):
+        #插入消息
+        row = self._row(message)
+        if not self.write_behind:
+            self._execute(lambda conn: self._upsert(conn, [row]))
+        else:
+            self._buffer_row(row)
         
         self.logger.debug(f"Message {message.get_message_id()} added to database: {json.dumps(message.get_json_for_db(), indent=4, ensure_ascii=False)}")
+
+    def _submit(self, function) -> Future:
+        """由写入线程在一个事务中执行 function(conn), 返回其结果的 Future"""
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MessageManager is closed")
+            self._jobs.append((function, future))
+            self._cond.notify_all()
+        return future
+
+    def _execute(self, function):
+        return self._submit(function).result()
+
+    def _buffer_full(self, message_id) -> bool:
+        # 替换缓冲区中已有的消息不占用新的空间
+        return (len(self._buffer) + len(self._flushing) >= self.max_buffer
+                and message_id not in self._buffer)
+
+    def _buffer_row(self, row:dict, block:bool = True) -> bool:
+        """放入缓冲区; 缓冲区已满时 block 为真则等待空间, 否则返回False"""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MessageManager is closed")
+            if self._buffer_full(row['message_id']):
+                if not block:
+                    return False
+                self.backpressure_waits += 1
+                self._cond.wait_for(lambda: self._closed or not self._buffer_full(row['message_id']))
+                if self._closed:
+                    raise RuntimeError("MessageManager is closed")
+            if not self._buffer:
+                self._buffered_at = time.monotonic()
+            self._buffer[row['message_id']] = row
+            if len(self._buffer) == 1 or len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+            return True
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                # 其他写操作立即执行; 缓冲区等到攒够一批、等待超时、或被要求立即写入
+                while not self._jobs:
+                    if not self._buffer:
+                        if self._closed:
+                            return
+                        self._cond.wait()
+                        continue
+                    remaining = self._buffered_at + self.flush_interval - time.monotonic()
+                    if len(self._buffer) >= self.batch_size or self._flush_requested or self._closed or remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._jobs:
+                    job = self._jobs.popleft()
+                else:
+                    job = None
+                    if len(self._buffer) <= self.batch_size:
+                        self._flushing, self._buffer = self._buffer, {}
+                    else:
+                        # 剩下的消息至少和这一批一样早, 沿用 _buffered_at, 下一轮立即写入
+                        rows = list(self._buffer.items())
+                        self._flushing, self._buffer = dict(rows[:self.batch_size]), dict(rows[self.batch_size:])
+                    buffered_at = self._buffered_at
+            if job is not None:
+                self._run_job(*job)
+                continue
+            self._write_batch(self._flushing, buffered_at)
+
+    def _run_job(self, function, future:Future):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            with self._write_engine.begin() as conn:
+                result = function(conn)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        self.jobs += 1
+
+    def _write_batch(self, rows:dict, buffered_at:float):
+        try:
+            with self._write_engine.begin() as conn:
+                self._upsert(conn, list(rows.values()))
+        except Exception as e:
+            self.flush_failures += 1
+            self._attempts += 1
+            if self._closed or self._attempts >= self.max_retries:
+                self._attempts = 0
+                self.logger.error(f"Failed to write {len(rows)} messages"
+                                  f"{' on close' if self._closed else f' {self.max_retries} times'}, dropped: {str(e)}")
+                with self._cond:
+                    self.dropped += len(rows)
+                    self._flushing = {}
+                    self._cond.notify_all()
+                return
+            backoff = min(self.max_backoff, self.flush_interval * 2 ** self._attempts)
+            self.logger.error(f"Failed to write {len(rows)} messages, retrying in {backoff:.2f}s: {str(e)}")
+            with self._cond:
+                # 放回缓冲区, 期间收到的新版本优先
+                self._buffer = {**rows, **self._buffer}
+                self._buffered_at = buffered_at
+                self._flushing = {}
+                self._cond.notify_all()
+                # 关闭时不再等待, 立即最后尝试一次
+                self._cond.wait_for(lambda: self._closed, backoff)
+            return
+        self._attempts = 0
+        latency = time.monotonic() - buffered_at
+        with self._cond:
+            self._flushing = {}
+            self.batches += 1
+            self.flushed_rows += len(rows)
+            self.max_batch = max(self.max_batch, len(rows))
+            self._flush_latency_total += latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+            if not self._buffer:
+                self._flush_requested = False
+            self._cond.notify_all()
+
+    def _pending_row(self, message_id) -> dict | None:
+        with self._cond:
+            return self._buffer.get(message_id) or self._flushing.get(message_id)
+
+    def flush(self, timeout:float = None) -> bool:
+        """立即写入缓冲区中的消息并等待完成, 返回是否已全部写入"""
+        with self._cond:
+            if not self._buffer and not self._flushing:
+                self._flush_requested = False
+                return True
+            self._flush_requested = True
+            self._cond.notify_all()
+            done = self._cond.wait_for(lambda: not self._buffer and not self._flushing, timeout)
+            if done:
+                self._flush_requested = False
+            return done
+
+    def close(self):
+        """写入剩余的消息并停止写入线程, 之后不能再添加消息"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        _open_managers.discard(self)
+        self._writer.join()
+        self._write_engine.dispose()
+        self.engine.dispose()
+        self.logger.info("Database connection closed")
         
+    @staticmethod
+    def _matches(row:dict, group:Group = None, sender:Person = None, start:int = None, end:int = None) -> bool:
+        return ((not group or row['group'] == group.get_group_id())
+                and (not sender or row['sender'] == sender.get_user_id())
+                and (start is None or row['time'] >= start)
+                and (end is None or row['time'] < end))
+
+    def _id_query(self, message_id:int, group:Group = None, sender:Person = None):
+        query = self.message_table.select().where(self.message_table.c.message_id == message_id)
+        if group:
+            query = query.where(self.message_table.c.group == group.get_group_id())
+        if sender:
+            query = query.where(self.message_table.c.sender == sender.get_user_id())
+        return query
+
+    def _range_query(self, group:Group = None, sender:Person = None, start:int = None, end:int = None, limit:int = 100):
+        # 按群或发送者查询时使用 (group, time) / (sender, time) 索引
+        query = self.message_table.select()
+        if group:
+            query = query.where(self.message_table.c.group == group.get_group_id())
+        if sender:
+            query = query.where(self.message_table.c.sender == sender.get_user_id())
+        if start is not None:
+            query = query.where(self.message_table.c.time >= start)
+        if end is not None:
+            query = query.where(self.message_table.c.time < end)
+        return query.order_by(self.message_table.c.time.desc()).limit(limit)
+
+    def _merge_pending(self, rows:list, limit:int, **filters) -> list:
+        """合并数据库中的行和尚未写入的行, 同一消息以尚未写入的版本为准, 按时间从新到旧"""
+        with self._cond:
+            pending = {**self._flushing, **self._buffer}
+        merged = {row['message_id']: row for row in rows}
+        merged.update({message_id: row for message_id, row in pending.items() if self._matches(row, **filters)})
+        rows = sorted(merged.values(), key=lambda row: row['time'], reverse=True)[:limit]
+        return [ReceivedMessageChain.json_from_db(row['json']) for row in rows]
+
+    def get_messages(self, group:Group = None, sender:Person = None, start:int = None, end:int = None,
+                     limit:int = 100) -> list:
+        """按群、发送者和时间范围查询消息
+
+        参数:
+            group (Group): 只查询该群的消息
+            sender (Person): 只查询该用户发送的消息
+            start (int): 起始时间戳(含)
+            end (int): 结束时间戳(不含)
+            limit (int): 最多返回的消息数
+
+        返回:
+            List[ReceivedMessageChain]: 按时间从新到旧排列的消息
+        """
+        with self.engine.connect() as conn:
+            rows = conn.execute(self._range_query(group, sender, start, end, limit)).mappings().all()
+        return self._merge_pending(rows, limit, group=group, sender=sender, start=start, end=end)
+
     def get_message_via_id(self,message_id:int,group:Group = None, sender:Person = None) -> ReceivedMessageChain | None:
-        #通过消息ID获取消息
+        #通过消息ID获取消息, 先查找尚未写入的消息
+        row = self._pending_row(message_id)
+        if row is not None:
+            if self._matches(row, group, sender):
+                return ReceivedMessageChain.json_from_db(row['json'])
+            raise DataNotFoundInDataBaseError(f"Message {message_id} not found in database")
         with self.engine.connect() as conn:
-            query = self.message_table.select().where(self.message_table.c.message_id == message_id)
-            if group:
-                query = query.where(self.message_table.c.group == group.get_group_id())
-            if sender:
-                query = query.where(self.message_table.c.sender == sender.get_user_id())
-            result = conn.execute(query).fetchone()
+            result = conn.execute(self._id_query(message_id, group, sender)).fetchone()
         if result:
             self.logger.debug(f"Message {message_id} queried from database: {json.dumps(result[4], indent=4, ensure_ascii=False)}")
             return ReceivedMessageChain.json_from_db(result[4])
@@ -71,20 +436,139 @@ class MessageManager():
         
     def __del__(self):
         if hasattr(self, 'engine'):
+            self._write_engine.dispose()
             self.engine.dispose()
             self.logger.info("Database connection closed")
             
     def update_message(self,message:ReceivedMessageChain):
         #更新消息
-        group_id = message.get_group()
-        if group_id:
-            group_id = group_id.get_group_id()
-        with self.engine.connect() as conn:
-            conn.execute(self.message_table.update().where(self.message_table.c.message_id == message.get_message_id()).values(
-                time = message.get_time(),
-                group = group_id,
-                sender = message.get_sender().get_user_id(),
-                json = message.get_json_for_db()
-            ))
-            conn.commit()
-        self.logger.debug(f"Message {message.get_message_id()} updated in database: {json.dumps(message.get_json_for_db(), indent=4, ensure_ascii=False)}")
\ No newline at end of file
+        row = self._row(message)
+        if self._pending_row(row['message_id']) is not None:
+            # 尚未写入的消息直接替换缓冲区中的版本
+            self.add_message(message)
+            return
+        self._execute(lambda conn: self._update(conn, row))
+        self.logger.debug(f"Message {message.get_message_id()} updated in database: {json.dumps(message.get_json_for_db(), indent=4, ensure_ascii=False)}")
+
+    def _update(self, conn, row:dict):
+        conn.execute(self.message_table.update().where(self.message_table.c.message_id == row['message_id']).values(
+            time = row['time'],
+            group = row['group'],
+            sender = row['sender'],
+            json = row['json']
+        ))
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                'wal': self.wal,
+                'write_behind': self.write_behind,
+                'pending': len(self._buffer) + len(self._flushing),
+                'queued_writes': len(self._jobs),
+                'writes': self.jobs,
+                'batches': self.batches,
+                'rows': self.flushed_rows,
+                'avg_batch': round(self.flushed_rows / self.batches, 1) if self.batches else None,
+                'max_batch': self.max_batch,
+                'avg_flush_latency_ms': round(self._flush_latency_total / self.batches * 1000, 3) if self.batches else None,
+                'max_flush_latency_ms': round(self.max_flush_latency * 1000, 3),
+                'failures': self.flush_failures,
+                'dropped': self.dropped,
+                'max_buffer': self.max_buffer,
+                'backpressure_waits': self.backpressure_waits
+            }
+
+class AsyncMessageManager:
+    """MessageManager 的协程接口, 在事件循环中读写消息而不阻塞
+
+    读取经 SQLAlchemy 的 aiosqlite 异步引擎执行(只读连接, PRAGMA 与 MessageManager 相同),
+    每个事件循环使用各自的连接池。写入交给 MessageManager 的写入线程, 等待其结果而不占用事件循环;
+    write_behind 时 add_message 只放入缓冲区, 不需要等待。尚未写入的消息同样可以读取。
+    MessageManager 的同步方法不受影响, 二者可以同时使用。
+
+    需要安装 aiosqlite, 首次读取时才导入。
+
+    参数:
+        manager (MessageManager): 数据库文件、写入线程和缓冲区所属的 MessageManager
+    """
+    def __init__(self, manager:MessageManager):
+        self.logger = logging.getLogger('MessageManager')
+        self.manager = manager
+        # 事件循环 -> 异步引擎, 连接不能跨事件循环使用
+        self._engines = weakref.WeakKeyDictionary()
+
+    def _engine(self):
+        from sqlalchemy.ext.asyncio import create_async_engine
+        loop = asyncio.get_running_loop()
+        engine = self._engines.get(loop)
+        if engine is None:
+            engine = create_async_engine(f'sqlite+aiosqlite:///{self.manager.db_file}',
+                                         pool_size=self.manager.readers, max_overflow=0)
+            sqlalchemy.event.listen(engine.sync_engine, 'connect',
+                                    lambda conn, _: self.manager._configure(conn, writer=False))
+            self._engines[loop] = engine
+        return engine
+
+    async def add_message(self, message:ReceivedMessageChain):
+        row = self.manager._row(message)
+        if self.manager.write_behind:
+            if not self.manager._buffer_row(row, block=False):
+                # 缓冲区已满, 在线程中等待而不阻塞事件循环
+                await asyncio.to_thread(self.manager._buffer_row, row)
+        else:
+            await asyncio.wrap_future(self.manager._submit(lambda conn: self.manager._upsert(conn, [row])))
+
+    async def update_message(self, message:ReceivedMessageChain):
+        row = self.manager._row(message)
+        if self.manager._pending_row(row['message_id']) is not None:
+            await self.add_message(message)
+            return
+        await asyncio.wrap_future(self.manager._submit(lambda conn: self.manager._update(conn, row)))
+
+    async def get_message_via_id(self, message_id:int, group:Group = None, sender:Person = None) -> ReceivedMessageChain:
+        """同 MessageManager.get_message_via_id
+
+        异常:
+            DataNotFoundInDataBaseError: 消息不存在
+        """
+        row = self.manager._pending_row(message_id)
+        if row is not None:
+            if self.manager._matches(row, group, sender):
+                return ReceivedMessageChain.json_from_db(row['json'])
+            raise DataNotFoundInDataBaseError(f"Message {message_id} not found in database")
+        async with self._engine().connect() as conn:
+            result = (await conn.execute(self.manager._id_query(message_id, group, sender))).fetchone()
+        if result:
+            return ReceivedMessageChain.json_from_db(result[4])
+        raise DataNotFoundInDataBaseError(f"Message {message_id} not found in database")
+
+    async def get_messages(self, group:Group = None, sender:Person = None, start:int = None, end:int = None,
+                           limit:int = 100) -> list:
+        """同 MessageManager.get_messages, 按时间从新到旧返回"""
+        async with self._engine().connect() as conn:
+            rows = (await conn.execute(self.manager._range_query(group, sender, start, end, limit))).mappings().all()
+        return self.manager._merge_pending(rows, limit, group=group, sender=sender, start=start, end=end)
+
+    async def flush(self, timeout:float = None) -> bool:
+        return await asyncio.to_thread(self.manager.flush, timeout)
+
+    async def close(self):
+        """关闭各事件循环的连接池及其 aiosqlite 线程, 不关闭 MessageManager
+
+        其他事件循环的连接池在该循环中关闭, 因此应在这些循环停止之前调用。
+        """
+        current = asyncio.get_running_loop()
+        for loop, engine in list(self._engines.items()):
+            self._engines.pop(loop, None)
+            if loop is current:
+                await engine.dispose()
+            elif loop.is_running():
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(engine.dispose(), loop))
+            else:
+                self.logger.warning("Event loop stopped before its async database connections were closed")
+
+
+# 迁移到各版本的方法, 版本号 -> MessageManager 的方法
+_MIGRATIONS = {
+    1: MessageManager._migrate_to_1
+}
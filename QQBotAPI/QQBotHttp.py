@@ -1,54 +1,254 @@
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Union
 import requests
 import logging
 import os
 from logging.handlers import RotatingFileHandler
-from .errors import QQBotAPIError
+from requests.adapters import HTTPAdapter
+from . import retry
+from .cache import MISSING, ResponseCache
+from .circuit_breaker import CircuitBreaker
+from .errors import CircuitOpenError, QQBotAPIError, TransportUnavailableError
+from .retry import READ_RETRY_POLICY, SEND_RETRY_POLICY, RetryPolicy
+from .singleflight import SingleFlight
+from .trace import span
 from requests.exceptions import RequestException
+from urllib3.exceptions import NewConnectionError
+
+# 以这些前缀开头的接口只读取数据, 可以安全地重试
+IDEMPOTENT_PREFIXES = ('get_', 'can_', 'ocr_')
 
 class QQBotHttp():
-    def __init__(self,url):
+    def __init__(self,url,pool_size=10,keep_alive=True,timeout=(3.05, 10),warmup=0,retry_policies=None,circuit_breaker=None,cache_policies=None,transport=None):
+        """
+        参数:
+            url (str): OneBot HTTP 服务地址
+            pool_size (int): 连接池大小,所有接口共用
+            keep_alive (bool): 是否复用TCP连接
+            timeout (float | tuple): 默认超时(秒),可传入 (连接超时, 读取超时)
+            warmup (int): 初始化时预先建立的连接数
+            retry_policies (dict): 按接口名覆盖重试策略, 如 {'send_group_msg': RetryPolicy(...)}
+            circuit_breaker (CircuitBreaker | dict): 熔断器或其参数, 默认使用 CircuitBreaker()
+            cache_policies (dict): 按接口名覆盖只读接口的缓存策略 (有效期, 最多条目数), 见 cache.DEFAULT_CACHE_POLICIES
+            transport (WebSocketTransport): 设置后接口优先经 WebSocket 调用, 未连接时使用 HTTP
+        """
         self._url = url
+        self._retry_policies = dict(retry_policies or {})
+        self.circuit_breaker = self._create_circuit_breaker(circuit_breaker)
+        self.cache = ResponseCache(cache_policies)
+        self.single_flight = SingleFlight()
+        self.transport = transport
+        # yaml 配置中的超时是 list, requests 只接受 tuple
+        self._timeout = tuple(timeout) if isinstance(timeout, list) else timeout
         
         self.logger = logging.getLogger('QQBot.HttpAPI')
         
         self.logger.info("Initializing QQBotHttp with URL: %s", url)
+        self._session = self._create_session(pool_size, keep_alive)
+        if warmup:
+            self.warmup(warmup)
         self._qq_id = self.get_login_info().get('user_id')
         self._nickname = self.get_login_info().get('nickname')
         
         self.logger.info("Bot initialized. QQ ID: %s, Nickname: %s", self._qq_id, self._nickname)
 
-    def _make_request(self, method: str, url: str, params=None, **kwargs) -> Union[dict, list]:
+    def _create_session(self, pool_size, keep_alive) -> requests.Session:
+        """创建所有接口共用的连接池"""
+        session = requests.Session()
+        # 重试由 _make_request 负责, 连接池本身不重试
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0, pool_block=False)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if not keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    @staticmethod
+    def _create_circuit_breaker(circuit_breaker) -> CircuitBreaker:
+        if isinstance(circuit_breaker, CircuitBreaker):
+            return circuit_breaker
+        return CircuitBreaker(**(circuit_breaker or {}))
+
+    def warmup(self, connections: int):
+        """预先建立连接, 避免首批请求承担TCP握手开销
+        
+        参数:
+            connections (int): 需要建立的连接数
+        """
+        def _touch(_):
+            try:
+                self._session.get(self._url + "/get_status", timeout=self._timeout).close()
+            except requests.RequestException as e:
+                self.logger.warning(f"Warmup request failed: {str(e)}")
+        
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            list(executor.map(_touch, range(connections)))
+        self.logger.debug("Warmed up %s connections", connections)
+
+    def close(self):
+        """关闭连接池"""
+        self._session.close()
+
+    def get_retry_policy(self, action: str) -> RetryPolicy:
+        """获取接口对应的重试策略
+        
+        优先使用初始化时传入的 retry_policies, 否则读取类接口使用 READ_RETRY_POLICY,
+        其余(发送、撤回、设置等)使用 SEND_RETRY_POLICY
+        """
+        if action in self._retry_policies:
+            return self._retry_policies[action]
+        if action.startswith(IDEMPOTENT_PREFIXES):
+            return READ_RETRY_POLICY
+        return SEND_RETRY_POLICY
+
+    def set_retry_policy(self, action: str, policy: RetryPolicy):
+        """为单个接口设置重试策略, action 为接口名, 如 'send_group_msg'"""
+        self._retry_policies[action] = policy
+
+    @staticmethod
+    def _error_kind(error: Exception) -> str:
+        """将异常归类为 retry 模块中的失败类型"""
+        if isinstance(error, QQBotAPIError):
+            return retry.API
+        if isinstance(error, TransportUnavailableError):
+            return retry.CONNECT
+        if isinstance(error, TimeoutError):
+            return retry.TIMEOUT
+        if isinstance(error, requests.HTTPError):
+            # 4xx 说明后端正常处理了请求, 5xx 视为后端故障
+            return retry.API if error.response is not None and error.response.status_code < 500 else retry.NETWORK
+        if isinstance(error, requests.ConnectTimeout):
+            return retry.CONNECT
+        if isinstance(error, requests.ConnectionError):
+            # 只有新建连接失败时才能确定请求未到达后端
+            reason = getattr(error.args[0], 'reason', None) if error.args else None
+            return retry.CONNECT if isinstance(reason, NewConnectionError) else retry.NETWORK
+        if isinstance(error, requests.Timeout):
+            return retry.TIMEOUT
+        return retry.NETWORK
+
+    @staticmethod
+    def _read_timeout(timeout) -> float:
+        """WebSocket 调用只有一个超时, 使用读取超时"""
+        return timeout[1] if isinstance(timeout, tuple) else timeout
+
+    def _parse_response(self, url: str, response: dict) -> Union[dict, list]:
+        if response.get('status') == 'ok':
+            self.logger.debug(f"API '{url}' request successful: {json.dumps(response, indent=4, ensure_ascii=False)}")
+            return response.get('data')
+        raise QQBotAPIError("API request failed", response)
+
+    def _send(self, method: str, url: str, params, timeout) -> Union[dict, list]:
+        """发送一次请求, 不做重试"""
+        if self.transport is not None and self.transport.connected:
+            action = url.rsplit('/', 1)[-1]
+            try:
+                return self._parse_response(url, self.transport.call(action, params, self._read_timeout(timeout)))
+            except TransportUnavailableError as e:
+                self.logger.debug(f"WebSocket unavailable, sending '{action}' via HTTP: {str(e)}")
+        if method.upper() == 'POST':
+            # POST 请求直接发送 JSON 数据
+            http_response = self._session.post(url, json=params, timeout=timeout)
+        else:
+            # GET 请求使用 URL 参数
+            http_response = self._session.get(url, params=params, timeout=timeout)
+        http_response.raise_for_status()
+        return self._parse_response(url, http_response.json())
+
+    def _make_request(self, method: str, url: str, params=None, timeout=None, **kwargs) -> Union[dict, list]:
         """发送HTTP请求并处理响应
         
         参数:
             method (str): HTTP方法 ('GET' 或 'POST')
             url (str): 请求URL
             params (dict): 请求参数
-            **kwargs: 传递给requests的其他参数
+            timeout (float | tuple): 本次请求的超时, 默认使用初始化时的设置
+            **kwargs: json 可作为 params 的别名
             
-        重试3次后仍失败则抛出异常
-        """
-        for attempt in range(3):
+        失败时按接口的重试策略(见 get_retry_policy)重试, 仍失败则抛出异常
+        """
+        if params is None:
+            params = kwargs.get('json')
+        if timeout is None:
+            timeout = self._timeout
+        action = url.rsplit('/', 1)[-1]
+        cached = self.cache.get(action, params)
+        if cached is not MISSING:
+            return cached
+        key = self._flight_key(action, params)
+        with span(self._span_name(action)):
+            if key is not None:
+                # 并发的相同读取请求合并为一次
+                return self.single_flight.do(key, lambda: self._request(method, url, action, params, timeout))
+            return self._request(method, url, action, params, timeout)
+
+    @staticmethod
+    def _span_name(action: str) -> str:
+        """请求计入追踪的阶段: 发送消息为 send, 其他接口为 api"""
+        return 'send' if action.startswith('send_') else 'api'
+
+    def _request(self, method: str, url: str, action: str, params, timeout) -> Union[dict, list]:
+        """经熔断器和重试策略发送请求"""
+        self._check_circuit()
+        policy = self.get_retry_policy(action)
+        policy.budget.deposit()
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
             try:
-                if method.upper() == 'POST':
-                    # POST 请求直接发送 JSON 数据
-                    response = requests.post(url, json=params).json()
-                else:
-                    # GET 请求使用 URL 参数
-                    response = requests.get(url, params=params).json()
-                    
-                if response.get('status') == 'ok':
-                    self.logger.debug(f"API '{url}' request successful: {json.dumps(response, indent=4, ensure_ascii=False)}")
-                    return response.get('data')
-                raise QQBotAPIError("API request failed", response)
-            except (requests.RequestException, QQBotAPIError) as e:
-                self.logger.warning(f"Request attempt {attempt + 1} failed: {str(e)}")
-                if attempt == 2:
+                response = self._send(method, url, params, timeout)
+                self.circuit_breaker.record_success()
+                self._update_cache(action, params, response)
+                return response
+            except (requests.RequestException, QQBotAPIError, ConnectionError, TimeoutError) as e:
+                kind = self._error_kind(e)
+                self._record_circuit_failure(kind)
+                delay = policy.next_delay(attempt, time.monotonic() - started, kind)
+                if delay is None or not self.circuit_breaker.available():
+                    self.logger.warning(f"Request '{action}' failed after {attempt} attempt(s): {str(e)}")
                     raise
-                time.sleep(1)
+                self.logger.warning(f"Request '{action}' attempt {attempt} failed, retrying in {delay:.2f}s: {str(e)}")
+                time.sleep(delay)
+
+    @staticmethod
+    def _flight_key(action: str, params):
+        """只读接口的合并键, 非只读接口或参数不可哈希时返回None"""
+        if not action.startswith(IDEMPOTENT_PREFIXES):
+            return None
+        key = (action, tuple(sorted((params or {}).items())))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def _update_cache(self, action: str, params, response):
+        """缓存只读接口的结果, 并失效被修改类接口影响的缓存"""
+        self.cache.set(action, params, response)
+        removed = self.cache.invalidate(action, params)
+        if removed:
+            self.logger.debug(f"'{action}' invalidated {removed} cached response(s)")
+
+    def _record_circuit_failure(self, kind: str):
+        """后端返回了错误说明它仍然存活, 只有网络失败计入熔断"""
+        if kind == retry.API:
+            self.circuit_breaker.record_success()
+        else:
+            self.circuit_breaker.record_failure()
+
+    def _check_circuit(self):
+        """熔断时立即失败; 需要试探时先用 get_status 探测后端"""
+        if not self.circuit_breaker.acquire():
+            return
+        try:
+            self._send('POST', self._url + "/get_status", None, self._timeout)
+        except (requests.RequestException, QQBotAPIError, ConnectionError, TimeoutError) as e:
+            self.circuit_breaker.record_failure()
+            raise CircuitOpenError(f"OneBot backend health probe failed: {str(e)}") from e
+        self.circuit_breaker.record_success()
 
     #Bot 账号
     def get_login_info(self):
@@ -66,6 +266,21 @@ class QQBotHttp():
         url = self._url + "/get_login_info"
         return self._make_request('POST', url)
     
+    def get_status(self):
+        """获取运行状态。
+
+        返回:dict
+            online	bool	当前 QQ 在线
+            good	bool	状态符合预期
+
+        异常:
+            QQBotAPIError: 当API请求失败或返回非ok状态时抛出
+            RequestException: 当网络请求失败时抛出
+        """
+        self.logger.debug("Getting status...")
+        url = self._url + "/get_status"
+        return self._make_request('POST', url)
+    
     #好友信息
     def get_stranger_info(self,user_id,no_cache=False):
         """获取陌生人信息。
@@ -192,18 +407,7 @@ class QQBotHttp():
             'user_id': user_id,
             'message': message
         }
-        for attempt in range(3):
-            try:
-                self.logger.debug("Attempt %s to send private message", attempt + 1)
-                response = self._make_request('POST', url, params=params)
-                return response
-            except (requests.RequestException, QQBotAPIError):
-                if attempt == 2:
-                    raise
-                time.sleep(1)
-                continue
-        
-        raise QQBotAPIError("API request failed after 3 attempts", response)
+        return self._make_request('POST', url, params=params)
     
     def send_private_message_via_group(self,message,user_id,group_id):
         """通过QQ机器人API向群聊中的用户发送私聊消息。
@@ -227,18 +431,7 @@ class QQBotHttp():
             'message': message ,
             'group_id': group_id
         }
-        for attempt in range(3):
-            try:
-                self.logger.debug("Attempt %s to send private message", attempt + 1)
-                response = self._make_request('POST', url, params=params)
-                return response
-            except (requests.RequestException, QQBotAPIError):
-                if attempt == 2:
-                    raise
-                time.sleep(1)
-                continue
-        
-        raise QQBotAPIError("API request failed after 3 attempts", response)
+        return self._make_request('POST', url, params=params)
     
     def send_group_message(self,message,group_id:int):
         """通过QQ机器人API向指定群组发送消息。
@@ -519,32 +712,31 @@ class QQBotHttp():
     
     #文件
     def upload_group_file(self,group_id,file_path,file_name,folder):
-        def upload_group_file(self,group_id,file_path,file_name,folder):
-            """上传群文件。
+        """上传群文件。
+        
+        参数:
+            group_id (int64): 群号
+            file_path (str): 本地文件路径
+            file_name (str): 储存名称
+            folder (str): 父目录ID
             
-            参数:
-                group_id (int64): 群号
-                file_path (str): 本地文件路径
-                file_name (str): 储存名称
-                folder (str): 父目录ID
-                
-            返回:
-                bool: 上传是否成功
-                
-            异常:
-                QQBotAPIError: 当API请求失败或返回非ok状态时抛出
-                RequestException: 当网络请求失败时抛出
-            """
-            self.logger.info("Uploading file %s to get_group %s", file_name, group_id)
-            url = self._url + "/upload_group_file"
-            params = {
-                'group_id': group_id,
-                'file': file_path,
-                'name': file_name,
-                'folder': folder
-            }
-            return self._make_request('POST', url, params=params)
+        返回:
+            bool: 上传是否成功
             
+        异常:
+            QQBotAPIError: 当API请求失败或返回非ok状态时抛出
+            RequestException: 当网络请求失败时抛出
+        """
+        self.logger.info("Uploading file %s to get_group %s", file_name, group_id)
+        url = self._url + "/upload_group_file"
+        params = {
+            'group_id': group_id,
+            'file': file_path,
+            'name': file_name,
+            'folder': folder
+        }
+        return self._make_request('POST', url, params=params)
+        
     def delete_group_file(self, group_id, file_id, busid):
         """删除群文件。
 
@@ -834,11 +1026,12 @@ class QQBotHttp():
         }
         return self._make_request('POST', url, params=params)
 
-    def get_group_member_info(self,group_id,no_cache=False):
+    def get_group_member_info(self,group_id,user_id,no_cache=False):
         """获取群成员信息。
 
         参数:
             group_id (int): 群号
+            user_id (int): QQ号
             no_cache (bool): 是否不使用缓存(使用缓存可能更新不及时,但响应更快)
 
         返回:
@@ -848,10 +1041,11 @@ class QQBotHttp():
             QQBotAPIError: 当API请求失败或返回非ok状态时抛出
             RequestException: 当网络请求失败时抛出
         """
-        self.logger.debug("Getting member info for get_group %s", group_id)
+        self.logger.debug("Getting member info for user %s in get_group %s", user_id, group_id)
         url = self._url + "/get_group_member_info"
         params = {
             'group_id': group_id,
+            'user_id': user_id,
             'no_cache': no_cache
         }
         return self._make_request('POST', url, params=params)
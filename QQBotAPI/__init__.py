@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from logging.handlers import RotatingFileHandler
 import os
@@ -5,17 +6,22 @@ from typing import List
 
 from QQBotAPI import DataManager
 from .QQBotHttp import QQBotHttp
+from .AsyncQQBotHttp import AsyncQQBotHttp
 from .message import *
 from .data import QQ_FACE_DISCRIPTION
 from .person import Person, Group
-from .errors import QQBotAPIError
+from .errors import QQBotAPIError, DataNotFoundInDataBaseError
+from .send_scheduler import SendScheduler, PRIORITY_REPLY, PRIORITY_NORMAL, PRIORITY_BROADCAST
 
 class QQBot:
-    def __init__(self,url):
+    def __init__(self,url,send_scheduler:SendScheduler = None,storage:dict = None,**http_options):
         # 确保 URL 包含协议前缀
         if not url.startswith(('http://', 'https://')):
             url = 'http://' + url
-        self.api = QQBotHttp(url)
+        # http_options 透传给 QQBotHttp (pool_size, keep_alive, timeout, warmup)
+        self.api = QQBotHttp(url, **http_options)
+        # 设置后群聊/私聊消息经限速队列发送
+        self.send_scheduler = send_scheduler
         self.qq_id = "Temp"
         self.logger = logging.getLogger(__name__)
         
@@ -26,7 +32,10 @@ class QQBot:
         
         self.logger = logging.getLogger(__name__ + "." + str(self.qq_id))
         
-        self.MessageManager = DataManager.MessageManager(self.qq_id)
+        # storage 透传给 MessageManager (write_behind, batch_size, flush_interval, max_buffer, max_retries, wal, pragmas, readers)
+        self.MessageManager = DataManager.MessageManager(self.qq_id, **(storage or {}))
+        # 供 async 插件使用, 不阻塞事件循环
+        self.AsyncMessageManager = DataManager.AsyncMessageManager(self.MessageManager)
     
     #好友信息
     def get_user_info(self,user_id):
@@ -51,12 +60,16 @@ class QQBot:
                                       ))
         return friend_list
 
-    def send_private_message(self,user:Union[int,Person],message):
+    def send_private_message(self,user:Union[int,Person],message,priority=PRIORITY_NORMAL):
         """发送私聊消息
         
         Args:
             user (Union[int, Person]): 用户ID或Person对象
             message (List[message]): 消息内容
+            priority (int): 发送优先级, 仅在设置了 send_scheduler 时生效
+            
+        Returns:
+            设置了 send_scheduler 时返回 Future, 否则返回接口结果
         """
         if isinstance(user, Person):
             user_id = user.get_user_id()
@@ -65,14 +78,20 @@ class QQBot:
         messages = []
         for msg in message:
             messages.append(msg.get_json())
-        self.api.send_private_message(messages,user_id)
+        if self.send_scheduler is not None:
+            return self.send_scheduler.submit('private', user_id, lambda: self.api.send_private_message(messages,user_id), priority)
+        return self.api.send_private_message(messages,user_id)
         
-    def send_group_message(self,group,message):
+    def send_group_message(self,group,message,priority=PRIORITY_NORMAL):
         """发送群消息
         
         Args:
             group (Union[int, Group]): 群ID或Group对象
             message (List[message]): 消息内容
+            priority (int): 发送优先级, 仅在设置了 send_scheduler 时生效
+            
+        Returns:
+            设置了 send_scheduler 时返回 Future, 否则返回接口结果
         """
         if isinstance(group, Group):
             group_id = group.get_group_id()
@@ -81,7 +100,9 @@ class QQBot:
         messages = []
         for msg in message:
             messages.append(msg.get_json())
-        self.api.send_group_message(messages,group_id)
+        if self.send_scheduler is not None:
+            return self.send_scheduler.submit('group', group_id, lambda: self.api.send_group_message(messages,group_id), priority)
+        return self.api.send_group_message(messages,group_id)
         
     def get_msg_via_id(self,msg_id:int) -> MessageChain | None:
         """通过消息ID获取消息
@@ -99,4 +120,133 @@ class QQBot:
             msg = MessageChain(self.api.get_msg(msg_id))
             self.MessageManager.add_message(msg)
             return msg
-            
\ No newline at end of file
+
+
+class AsyncQQBot:
+    """QQBot 的 asyncio 版本, 所有网络请求均为协程
+
+    使用 ``bot = await AsyncQQBot.create(url)`` 创建, 结束时 ``await bot.close()``。
+    """
+    def __init__(self,url,send_scheduler:SendScheduler = None,storage:dict = None,**http_options):
+        # 确保 URL 包含协议前缀
+        if not url.startswith(('http://', 'https://')):
+            url = 'http://' + url
+        self.api = AsyncQQBotHttp(url, **http_options)
+        self.storage = storage or {}
+        # 设置后群聊/私聊消息经限速队列发送
+        self.send_scheduler = send_scheduler
+        self.qq_id = "Temp"
+        self.nickname = ""
+        self.friend_list = []
+        self.MessageManager = None
+        self.AsyncMessageManager = None
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    async def create(cls,url,send_scheduler:SendScheduler = None,storage:dict = None,**http_options):
+        """创建并初始化机器人(获取登录信息、好友列表, 打开数据库)"""
+        bot = cls(url, send_scheduler, storage, **http_options)
+        await bot.start()
+        return bot
+
+    async def start(self):
+        self.logger.info("Initializing AsyncQQBotHttp with URL: %s", self.api._url)
+        login_info = await self.api.get_login_info()
+        self.qq_id = login_info.get('user_id')
+        self.nickname = login_info.get('nickname')
+        self.friend_list = await self.get_friend_list()
+
+        self.logger = logging.getLogger(__name__ + "." + str(self.qq_id))
+
+        self.MessageManager = DataManager.MessageManager(self.qq_id, **self.storage)
+        self.AsyncMessageManager = DataManager.AsyncMessageManager(self.MessageManager)
+
+    async def close(self):
+        await self.api.close()
+        if self.MessageManager is not None:
+            await self.AsyncMessageManager.close()
+            # 写入缓冲区中剩余的消息
+            await asyncio.to_thread(self.MessageManager.close)
+
+    #好友信息
+    async def get_user_info(self,user_id):
+        if user_id in self.friend_list:
+            return self.friend_list[self.friend_list.index(user_id)]
+        else:
+            info = await self.api.get_stranger_info(user_id)
+            return Person(user_id=user_id, nickname=info['nickname'])
+
+    async def get_friend_list(self):
+        """获取好友列表
+
+        Returns:
+            List[Person]: 好友列表
+        """
+        friends = await self.api.get_friend_list()
+        friend_list = []
+        for friend in friends:
+            friend_list.append(Person(user_id=friend['user_id'],
+                                      nickname=friend['nickname'],
+                                      remark=friend['remark']
+                                      ))
+        return friend_list
+
+    async def _scheduled(self, kind, target_id, send, priority):
+        """经 send_scheduler 排队发送, 调度线程在当前事件循环中执行 send()"""
+        loop = asyncio.get_running_loop()
+        future = self.send_scheduler.submit(kind, target_id, lambda: asyncio.run_coroutine_threadsafe(send(), loop).result(), priority)
+        return await asyncio.wrap_future(future)
+
+    async def send_private_message(self,user:Union[int,Person],message,priority=PRIORITY_NORMAL):
+        """发送私聊消息
+
+        Args:
+            user (Union[int, Person]): 用户ID或Person对象
+            message (List[message]): 消息内容
+            priority (int): 发送优先级, 仅在设置了 send_scheduler 时生效
+        """
+        if isinstance(user, Person):
+            user_id = user.get_user_id()
+        else:
+            user_id = user
+        messages = []
+        for msg in message:
+            messages.append(msg.get_json())
+        if self.send_scheduler is not None:
+            return await self._scheduled('private', user_id, lambda: self.api.send_private_message(messages,user_id), priority)
+        return await self.api.send_private_message(messages,user_id)
+
+    async def send_group_message(self,group,message,priority=PRIORITY_NORMAL):
+        """发送群消息
+
+        Args:
+            group (Union[int, Group]): 群ID或Group对象
+            message (List[message]): 消息内容
+            priority (int): 发送优先级, 仅在设置了 send_scheduler 时生效
+        """
+        if isinstance(group, Group):
+            group_id = group.get_group_id()
+        else:
+            group_id = group
+        messages = []
+        for msg in message:
+            messages.append(msg.get_json())
+        if self.send_scheduler is not None:
+            return await self._scheduled('group', group_id, lambda: self.api.send_group_message(messages,group_id), priority)
+        return await self.api.send_group_message(messages,group_id)
+
+    async def get_msg_via_id(self,msg_id:int) -> MessageChain | None:
+        """通过消息ID获取消息
+
+        Args:
+            msg_id (int): 消息ID
+
+        Returns:
+            MessageChain: 消息对象
+        """
+        try:
+            return await self.AsyncMessageManager.get_message_via_id(msg_id)
+        except DataNotFoundInDataBaseError:
+            msg = ReceivedMessageChain(await self.api.get_msg(msg_id))
+            await self.AsyncMessageManager.add_message(msg)
+            return msg
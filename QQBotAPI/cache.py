@@ -0,0 +1,178 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+# 缓存未命中时的返回值
+MISSING = object()
+
+
+class TTLCache:
+    """带过期时间的 LRU 缓存, 线程安全
+
+    参数:
+        maxsize (int): 最多保存的条目数, 超出时淘汰最久未使用的条目
+        ttl (float): 条目有效期(秒)
+    """
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            item = self._data.get(key, MISSING)
+            if item is not MISSING:
+                expires, value = item
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def add_if_absent(self, key: Hashable, value=True) -> bool:
+        """key 不存在或已过期时写入并返回True, 否则返回False(不刷新有效期)"""
+        with self._lock:
+            item = self._data.get(key, MISSING)
+            if item is not MISSING and item[0] > time.monotonic():
+                self.hits += 1
+                return False
+            self.misses += 1
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def discard(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """删除 predicate(key) 为真的条目, 返回删除数量"""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+# 只读接口的缓存策略: 接口名 -> (有效期秒数, 最多条目数)
+DEFAULT_CACHE_POLICIES = {
+    'get_login_info': (3600, 1),
+    'get_stranger_info': (600, 4096),
+    'get_group_info': (300, 512),
+    'get_group_list': (300, 1),
+    'get_group_member_info': (120, 8192),
+    'get_group_member_list': (300, 128),
+    'get_group_honor_info': (600, 128),
+    'get_essence_msg_list': (300, 128),
+}
+
+# 修改类接口成功后需要失效的缓存: 接口名 -> [(只读接口名, 需要匹配的参数名)]
+# 参数名为空时失效该只读接口的全部缓存
+DEFAULT_INVALIDATIONS = {
+    'set_group_card': [('get_group_member_info', ('group_id', 'user_id')), ('get_group_member_list', ('group_id',))],
+    'set_group_special_title': [('get_group_member_info', ('group_id', 'user_id')), ('get_group_member_list', ('group_id',))],
+    'set_group_admin': [('get_group_member_info', ('group_id', 'user_id')), ('get_group_member_list', ('group_id',))],
+    'set_group_kick': [('get_group_member_info', ('group_id', 'user_id')), ('get_group_member_list', ('group_id',)),
+                       ('get_group_info', ('group_id',))],
+    'set_group_name': [('get_group_info', ('group_id',)), ('get_group_list', ())],
+    'set_group_leave': [('get_group_info', ('group_id',)), ('get_group_list', ()), ('get_group_member_list', ('group_id',))],
+    'set_essence_msg': [('get_essence_msg_list', ())],
+    'delete_essence_msg': [('get_essence_msg_list', ())],
+    'delete_friend': [('get_stranger_info', ('user_id',))],
+}
+
+
+class ResponseCache:
+    """按接口分别缓存 OneBot 只读接口的返回值
+
+    缓存键为除 no_cache 外的全部请求参数。请求参数中 no_cache 为真时跳过缓存读取,
+    但仍用新结果刷新缓存。修改类接口成功后按 invalidations 失效受影响的条目。
+    缓存返回的是同一个对象, 调用方不应修改。
+
+    参数:
+        policies (dict): 接口名 -> (有效期, 最多条目数), 与 DEFAULT_CACHE_POLICIES 合并,
+                         值为 None 时关闭该接口的缓存
+        invalidations (dict): 修改类接口 -> 失效规则, 默认 DEFAULT_INVALIDATIONS
+    """
+    def __init__(self, policies: dict = None, invalidations: dict = None):
+        merged = dict(DEFAULT_CACHE_POLICIES)
+        merged.update(policies or {})
+        self._caches = {}
+        for action, policy in merged.items():
+            if policy:
+                ttl, maxsize = policy
+                self._caches[action] = TTLCache(maxsize, ttl)
+        self._invalidations = DEFAULT_INVALIDATIONS if invalidations is None else invalidations
+
+    @staticmethod
+    def make_key(params) -> tuple:
+        if not params:
+            return ()
+        return tuple(sorted((k, v) for k, v in params.items() if k != 'no_cache'))
+
+    def is_cached(self, action: str) -> bool:
+        return action in self._caches
+
+    def get(self, action: str, params, default=MISSING):
+        """返回缓存的结果, 未命中或要求 no_cache 时返回 default"""
+        cache = self._caches.get(action)
+        if cache is None or (params and params.get('no_cache')):
+            return default
+        return cache.get(self.make_key(params), default)
+
+    def set(self, action: str, params, value):
+        cache = self._caches.get(action)
+        if cache is not None:
+            cache.set(self.make_key(params), value)
+
+    def invalidate(self, action: str, params) -> int:
+        """action 为修改类接口时, 失效受其影响的缓存"""
+        removed = 0
+        for read_action, names in self._invalidations.get(action, ()):
+            cache = self._caches.get(read_action)
+            if cache is None:
+                continue
+            expected = {name: (params or {}).get(name) for name in names}
+            removed += cache.invalidate(lambda key: all(dict(key).get(k) == v for k, v in expected.items()))
+        return removed
+
+    def clear(self):
+        for cache in self._caches.values():
+            cache.clear()
+
+    def stats(self) -> dict:
+        return {action: cache.stats() for action, cache in self._caches.items()}
+
@@ -0,0 +1,110 @@
+import logging
+import threading
+import time
+from .errors import CircuitOpenError
+
+CLOSED = 'closed'         # 正常, 请求直接发出
+OPEN = 'open'             # 熔断, 请求立即失败
+HALF_OPEN = 'half_open'   # 试探, 由一个请求先执行健康探测
+
+
+class CircuitBreaker:
+    """OneBot 后端的熔断器
+
+    连续 failure_threshold 次网络失败后熔断(OPEN), 之后 recovery_timeout 秒内
+    所有请求直接抛出 CircuitOpenError。到期后进入 HALF_OPEN, 下一个请求先执行
+    一次健康探测(get_status), 成功则恢复(CLOSED), 失败则重新熔断。
+
+    OneBot 的心跳事件也作为存活信号: 心跳正常时熔断器立即进入 HALF_OPEN,
+    心跳报告异常时立即熔断。
+
+    参数:
+        failure_threshold (int): 触发熔断的连续失败次数
+        recovery_timeout (float): 熔断后等待多久再试探(秒)
+    """
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.logger = logging.getLogger('QQBot.CircuitBreaker')
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.trips = 0
+        self.last_heartbeat = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def available(self) -> bool:
+        """后端是否可能可用, 熔断且未到试探时间时返回False"""
+        with self._lock:
+            return not (self._state == OPEN and time.monotonic() - self._opened_at < self.recovery_timeout)
+
+    def acquire(self) -> bool:
+        """请求发出前调用
+
+        返回:
+            bool: True 表示本次请求需要先执行健康探测, 探测结果通过
+                  record_success / record_failure 报告
+
+        异常:
+            CircuitOpenError: 熔断中, 或其他请求正在探测
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return False
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+        raise CircuitOpenError("OneBot backend is unavailable, circuit is open")
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                self.logger.info("Circuit closed, OneBot backend recovered")
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._trip()
+            self._probing = False
+
+    def _trip(self):
+        if self._state != OPEN:
+            self.trips += 1
+            self.logger.warning(f"Circuit opened after {self._failures} failure(s), failing fast for {self.recovery_timeout}s")
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+
+    def record_heartbeat(self, status: dict):
+        """处理 OneBot 心跳事件中的 status 字段"""
+        with self._lock:
+            self.last_heartbeat = time.time()
+            if status.get('online', True) and status.get('good', True):
+                if self._state == OPEN:
+                    # 后端仍在发送心跳, 提前允许试探
+                    self._state = HALF_OPEN
+            else:
+                self._trip()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'trips': self.trips,
+                'rejected': self.rejected,
+                'last_heartbeat': self.last_heartbeat
+            }
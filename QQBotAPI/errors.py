@@ -14,3 +14,17 @@ class DataNotFoundInDataBaseError(Exception):
         super().__init__(message)
         logger = logging.getLogger(__name__)
         logger.error(message)
+        
+class SendQueueFullError(QQBotAPIError):
+    """发送队列已满, 消息被丢弃时抛出"""
+    def __init__(self, message):
+        super().__init__(message)
+        
+class CircuitOpenError(QQBotAPIError):
+    """OneBot 后端熔断期间, 请求不再发出而是立即抛出"""
+    def __init__(self, message):
+        super().__init__(message)
+        
+class TransportUnavailableError(ConnectionError):
+    """WebSocket 未连接或发送失败, 请求一定没有到达后端, 可以改用 HTTP"""
+    pass
@@ -6,6 +6,7 @@ from .person import Person, Group
 import os
 import requests
 from .config import CachePath
+from .send_scheduler import PRIORITY_REPLY
 class MessageChain():
     def __init__(self):
         pass
@@ -58,7 +59,8 @@ class ReceivedMessageChain(MessageChain):
         self._message_type = raw_data["message_type"]
         self._message_id = raw_data["message_id"]
         self._message_seq = raw_data["message_seq"]
-        if "group_id" in raw_data:
+        # 数据库中的私聊消息 group_id 为 None
+        if raw_data.get("group_id") is not None:
             self._group = Group(raw_data["group_id"])
             self.is_group = True
         else:
@@ -135,7 +137,8 @@ class ReceivedMessageChain(MessageChain):
             reply_chain.message.extend(message)
         else:
             reply_chain.message.extend(message.message)
-        reply_chain.send(qqbot)
+        # 传入 AsyncQQBot 时返回协程, 由调用方 await
+        return reply_chain.send(qqbot)
         
     def convert_to_sent(self):
         return SentMessageChain.convert_from_received(self)
@@ -177,10 +180,11 @@ class ReplyMessageChain(SentMessageChain):
         self._sender = reply_message._sender
         
     def send(self,qqbot):
+        # 回复优先于插件主动发送的消息
         if self._is_group:
-            qqbot.send_group_message(self._group, self.message)
+            return qqbot.send_group_message(self._group, self.message, priority=PRIORITY_REPLY)
         else:
-            qqbot.send_private_message(self._sender, self.message)
+            return qqbot.send_private_message(self._sender, self.message, priority=PRIORITY_REPLY)
 
 class ReplyFlag():
     def __init__(self,message:Union[str,int,MessageChain]):
@@ -0,0 +1,119 @@
+import random
+import threading
+import time
+from typing import Optional
+
+# 失败类型, 由各客户端根据异常判断
+CONNECT = 'connect'   # 连接未建立, 请求一定没有到达后端
+TIMEOUT = 'timeout'   # 读取超时, 后端可能已经执行
+NETWORK = 'network'   # 其他网络错误(连接中断、响应无法解析等)
+API = 'api'           # 后端返回了非ok状态
+
+
+class RetryBudget:
+    """进程级重试预算
+
+    令牌桶: 每个请求存入 ratio 个令牌, 每次重试取出 1 个令牌,
+    另外每秒保底补充 min_per_second 个。后端大面积故障时重试量被限制在
+    请求量的 ratio 倍以内, 避免重试风暴。
+    """
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 1.0, max_tokens: float = 20.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.exhausted = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.max_tokens, self._tokens + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def deposit(self):
+        """记录一次请求"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        """申请一次重试, 预算不足时返回False"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.retries += 1
+                return True
+            self.exhausted += 1
+            return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refill()
+            return {
+                'tokens': round(self._tokens, 2),
+                'retries': self.retries,
+                'exhausted': self.exhausted
+            }
+
+
+DEFAULT_RETRY_BUDGET = RetryBudget()
+
+
+class RetryPolicy:
+    """重试策略: 指数退避 + 抖动 + 总时限 + 全局重试预算
+
+    参数:
+        max_attempts (int): 最多尝试次数(含第一次)
+        base_delay (float): 第一次重试前的等待秒数
+        multiplier (float): 每次重试等待时间的倍数
+        max_delay (float): 单次等待的上限
+        jitter (float): 抖动比例, 实际等待时间在 [delay*(1-jitter), delay] 之间均匀分布
+        deadline (float): 从第一次请求开始的总时限(秒), 超过后不再重试
+        retry_on (set): 允许重试的失败类型, 见 CONNECT / TIMEOUT / NETWORK / API
+        budget (RetryBudget): 重试预算, 默认使用进程级的 DEFAULT_RETRY_BUDGET
+    """
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.2, multiplier: float = 2.0,
+                 max_delay: float = 2.0, jitter: float = 0.5, deadline: float = 5.0,
+                 retry_on=(CONNECT, TIMEOUT, NETWORK, API), budget: Optional[RetryBudget] = None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.multiplier = multiplier
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.deadline = deadline
+        self.retry_on = frozenset(retry_on)
+        self.budget = budget if budget is not None else DEFAULT_RETRY_BUDGET
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次失败后的等待时间"""
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        return delay * (1 - self.jitter * random.random())
+
+    def next_delay(self, attempt: int, elapsed: float, kind: str) -> Optional[float]:
+        """判断第 attempt 次失败后是否重试
+
+        参数:
+            attempt (int): 已尝试的次数
+            elapsed (float): 从第一次请求开始经过的秒数
+            kind (str): 失败类型
+
+        返回:
+            float | None: 重试前需等待的秒数, 不重试时返回None
+        """
+        if attempt >= self.max_attempts or kind not in self.retry_on:
+            return None
+        delay = self.backoff(attempt)
+        if elapsed + delay > self.deadline:
+            return None
+        if not self.budget.withdraw():
+            return None
+        return delay
+
+
+# 幂等的读取类接口: 任何失败都可以重试
+READ_RETRY_POLICY = RetryPolicy()
+# 发送等非幂等接口: 只在请求确定未到达后端时重试, 避免重复发送
+SEND_RETRY_POLICY = RetryPolicy(max_attempts=3, deadline=3.0, retry_on=(CONNECT,))
@@ -0,0 +1,192 @@
+import bisect
+import contextvars
+import functools
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional
+from .errors import SendQueueFullError
+
+# 发送优先级, 数值越小越先发送
+PRIORITY_REPLY = 0       # 回复(@机器人或私聊)
+PRIORITY_NORMAL = 1      # 插件主动发送
+PRIORITY_BROADCAST = 2   # 定时任务、广播等后台消息
+
+
+class TokenBucket:
+    """令牌桶, 每秒补充 rate 个令牌, 最多累积 burst 个
+
+    rate 为 None 时不限速。不是线程安全的, 由 SendScheduler 加锁使用。
+    """
+    def __init__(self, rate: Optional[float], burst: float = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.rate is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, now: float) -> float:
+        """距离下一个令牌可用还需等待的秒数"""
+        if self.rate is None:
+            return 0
+        self._refill(now)
+        if self._tokens >= 1:
+            return 0
+        return (1 - self._tokens) / self.rate
+
+    def consume(self, now: float):
+        if self.rate is not None:
+            self._refill(now)
+            self._tokens -= 1
+
+
+class _SendJob:
+    __slots__ = ('priority', 'seq', 'buckets', 'send', 'future', 'enqueued')
+
+    def __init__(self, priority, seq, buckets, send, future):
+        self.priority = priority
+        self.seq = seq
+        self.buckets = buckets
+        self.send = send
+        self.future = future
+        self.enqueued = time.monotonic()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class SendScheduler:
+    """发送调度器: 消息先排队, 再按全局/每群/每用户的令牌桶速率发出
+
+    同一优先级内按提交顺序发送, 高优先级(回复)先于低优先级(广播)。
+    发送在调度线程中串行执行, 因此同一个群/用户的消息不会乱序。
+
+    参数:
+        global_rate / global_burst: 全局每秒发送条数与突发上限
+        group_rate / group_burst: 单个群每秒发送条数与突发上限
+        user_rate / user_burst: 单个私聊用户每秒发送条数与突发上限
+        max_queue (int): 队列上限, 超过时 submit 抛出 SendQueueFullError
+    """
+    def __init__(self, global_rate=5.0, global_burst=10, group_rate=1.0, group_burst=3,
+                 user_rate=1.0, user_burst=3, max_queue=1000):
+        self.logger = logging.getLogger('QQBot.SendScheduler')
+        self._global = TokenBucket(global_rate, global_burst)
+        self._group_limit = (group_rate, group_burst)
+        self._user_limit = (user_rate, user_burst)
+        self._buckets = {}
+        self.max_queue = max_queue
+
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self.sent = 0
+        self.failed = 0
+        self.rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+        self._thread = threading.Thread(target=self._run, name='SendScheduler', daemon=True)
+        self._thread.start()
+
+    def _bucket(self, kind: str, target_id: int) -> TokenBucket:
+        key = (kind, target_id)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            rate, burst = self._group_limit if kind == 'group' else self._user_limit
+            bucket = self._buckets[key] = TokenBucket(rate, burst)
+        return bucket
+
+    def submit(self, kind: str, target_id: int, send: Callable, priority: int = PRIORITY_NORMAL) -> Future:
+        """提交一条待发送的消息
+
+        参数:
+            kind (str): 'group' 或 'private'
+            target_id (int): 群号或QQ号
+            send (Callable): 实际执行发送的无参函数
+            priority (int): 优先级, 见 PRIORITY_*
+
+        返回:
+            Future: 发送完成后得到 send() 的返回值或异常
+        """
+        future = Future()
+        # 在发送线程中沿用提交方的追踪上下文
+        send = functools.partial(contextvars.copy_context().run, send)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("SendScheduler is closed")
+            if len(self._queue) >= self.max_queue:
+                self.rejected += 1
+                raise SendQueueFullError(f"Send queue is full ({self.max_queue}), message to {kind} {target_id} dropped")
+            buckets = (self._global, self._bucket(kind, target_id))
+            bisect.insort(self._queue, _SendJob(priority, next(self._seq), buckets, send, future))
+            self._cond.notify()
+        return future
+
+    def _next_job(self) -> Optional[_SendJob]:
+        """取出第一个令牌充足的任务, 没有时等待"""
+        with self._cond:
+            while True:
+                if self._closed and not self._queue:
+                    return None
+                now = time.monotonic()
+                timeout = None
+                for index, job in enumerate(self._queue):
+                    wait = max(bucket.wait_time(now) for bucket in job.buckets)
+                    if wait == 0:
+                        for bucket in job.buckets:
+                            bucket.consume(now)
+                        return self._queue.pop(index)
+                    timeout = wait if timeout is None else min(timeout, wait)
+                self._cond.wait(timeout)
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            waited = time.monotonic() - job.enqueued
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            try:
+                job.future.set_result(job.send())
+                self.sent += 1
+            except Exception as e:
+                self.failed += 1
+                self.logger.error(f"Scheduled send failed after waiting {waited:.2f}s: {str(e)}")
+                job.future.set_exception(e)
+
+    def close(self, timeout: Optional[float] = None):
+        """停止接收新消息, 等待队列中的消息发送完毕"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._cond:
+            depth = {}
+            for job in self._queue:
+                depth[job.priority] = depth.get(job.priority, 0) + 1
+            now = time.monotonic()
+            oldest = max((now - job.enqueued for job in self._queue), default=0)
+            done = self.sent + self.failed
+            return {
+                'queue_depth': len(self._queue),
+                'queue_depth_by_priority': depth,
+                'oldest_wait': round(oldest, 3),
+                'avg_wait': round(self._wait_total / done, 3) if done else 0,
+                'max_wait': round(self._wait_max, 3),
+                'sent': self.sent,
+                'failed': self.failed,
+                'rejected': self.rejected
+            }
@@ -0,0 +1,99 @@
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+
+
+class Trace:
+    """一次消息处理的追踪信息: 响应ID和各阶段的耗时"""
+    __slots__ = ('response_id', 'started', 'spans')
+
+    def __init__(self, response_id: Optional[str] = None):
+        self.response_id = response_id or str(uuid.uuid4())
+        self.started = time.monotonic()
+        # 阶段名 -> 累计秒数, 同一阶段可能执行多次(如多次发送)
+        self.spans = {}
+
+    def add(self, name: str, elapsed: float):
+        self.spans[name] = self.spans.get(name, 0.0) + elapsed
+
+    def format_spans(self) -> str:
+        return " ".join(f"{name}={elapsed * 1000:.1f}ms" for name, elapsed in self.spans.items())
+
+
+_current_trace = contextvars.ContextVar('qqbot_trace', default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    """当前上下文中的追踪信息, 不在消息处理中时为 None"""
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace(response_id: Optional[str] = None):
+    """在当前上下文中开始一次追踪, 退出时恢复之前的追踪
+
+    线程池、事件循环任务中需要复制 contextvars 上下文(contextvars.copy_context)才能延续追踪。
+    """
+    trace = Trace(response_id)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+class SpanMetrics:
+    """各阶段耗时的汇总, 线程安全"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans = {}
+
+    def record(self, name: str, elapsed: float):
+        with self._lock:
+            stats = self._spans.get(name)
+            if stats is None:
+                stats = self._spans[name] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {name: {
+                'count': count,
+                'avg_ms': round(total / count * 1000, 3),
+                'max_ms': round(maximum * 1000, 3)
+            } for name, (count, total, maximum) in self._spans.items()}
+
+
+SPAN_METRICS = SpanMetrics()
+
+
+@contextmanager
+def span(name: str):
+    """记录一个阶段的耗时到当前追踪和 SPAN_METRICS"""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        elapsed = time.monotonic() - started
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, elapsed)
+        SPAN_METRICS.record(name, elapsed)
+
+
+class TraceFilter(logging.Filter):
+    """为日志记录添加 response_id 和 spans 字段, 不在消息处理中时为 '-'
+
+    加在 Handler 上即可作用于所有 logger, 格式中使用 %(response_id)s / %(spans)s。
+    """
+    def filter(self, record: logging.LogRecord) -> bool:
+        trace = _current_trace.get()
+        record.response_id = trace.response_id if trace is not None else '-'
+        record.spans = (trace.format_spans() or '-') if trace is not None else '-'
+        return True
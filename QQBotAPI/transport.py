@@ -0,0 +1,261 @@
+import asyncio
+import itertools
+import json
+import logging
+import threading
+from typing import Callable, Optional
+from websockets.asyncio.client import connect
+from websockets.exceptions import WebSocketException
+from .errors import TransportUnavailableError
+
+
+class WebSocketTransport:
+    """通过 WebSocket 调用 OneBot 接口的基类
+
+    每个调用以 ``{"action", "params", "echo"}`` 帧发送, 后端的响应携带相同的 echo,
+    因此任意多个调用可以同时在一条连接上进行。连接上收到的其他帧(事件)交给 on_event。
+
+    调用在 transport 所属的事件循环中执行:
+        - call(): 供线程中的同步代码使用
+        - acall(): 供任意事件循环中的协程使用
+
+    连接不可用时抛出 TransportUnavailableError, 此时请求一定没有发出, 调用方可以改用 HTTP。
+    """
+    def __init__(self, on_event: Optional[Callable[[dict], None]] = None):
+        self.logger = logging.getLogger('QQBot.WebSocket')
+        self.on_event = on_event
+        self._ws = None
+        self._loop = None
+        self._pending = {}
+        self._echo = itertools.count()
+        self.calls = 0
+        self.events = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._ws is not None
+
+    async def _call(self, action: str, params, timeout: float) -> dict:
+        ws = self._ws
+        if ws is None:
+            raise TransportUnavailableError("WebSocket is not connected")
+        echo = str(next(self._echo))
+        future = asyncio.get_running_loop().create_future()
+        self._pending[echo] = future
+        try:
+            try:
+                await ws.send(json.dumps({'action': action, 'params': params or {}, 'echo': echo}, ensure_ascii=False))
+            except WebSocketException as e:
+                raise TransportUnavailableError(f"WebSocket send failed: {str(e)}") from e
+            self.calls += 1
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(echo, None)
+
+    def call(self, action: str, params=None, timeout: float = 10) -> dict:
+        """在其他线程中同步调用接口, 返回 OneBot 的完整响应"""
+        loop = self._loop
+        if loop is None or not self.connected:
+            raise TransportUnavailableError("WebSocket is not connected")
+        if self._in_loop_thread(loop):
+            # 在 transport 的事件循环中同步等待会死锁
+            raise TransportUnavailableError("Synchronous call from the WebSocket event loop thread")
+        return asyncio.run_coroutine_threadsafe(self._call(action, params, timeout), loop).result()
+
+    async def acall(self, action: str, params=None, timeout: float = 10) -> dict:
+        """在任意事件循环中调用接口, 返回 OneBot 的完整响应"""
+        loop = self._loop
+        if loop is None or not self.connected:
+            raise TransportUnavailableError("WebSocket is not connected")
+        if loop is asyncio.get_running_loop():
+            return await self._call(action, params, timeout)
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._call(action, params, timeout), loop))
+
+    @staticmethod
+    def _in_loop_thread(loop) -> bool:
+        try:
+            return asyncio.get_running_loop() is loop
+        except RuntimeError:
+            return False
+
+    def _handle_frame(self, frame):
+        try:
+            data = json.loads(frame)
+        except ValueError:
+            self.logger.warning(f"Invalid WebSocket frame: {frame!r}")
+            return
+        echo = data.get('echo')
+        if echo is not None and 'post_type' not in data:
+            future = self._pending.get(str(echo))
+            if future is not None and not future.done():
+                future.set_result(data)
+            return
+        self.events += 1
+        if self.on_event is not None:
+            try:
+                self.on_event(data)
+            except Exception as e:
+                self.logger.error(f"Error handling WebSocket event: {str(e)}")
+
+    def _fail_pending(self, reason: str):
+        """连接断开时, 等待中的调用无法得知结果, 统一失败"""
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(reason))
+        self._pending.clear()
+
+    def stats(self) -> dict:
+        return {
+            'connected': self.connected,
+            'calls': self.calls,
+            'events': self.events,
+            'pending': len(self._pending)
+        }
+
+
+class ForwardWebSocketTransport(WebSocketTransport):
+    """正向 WebSocket: 由机器人连接 OneBot 的 WebSocket 服务
+
+    在后台线程中运行自己的事件循环, 断线后按指数退避自动重连。
+
+    参数:
+        url (str): OneBot WebSocket 地址, 如 ws://localhost:3001
+        access_token (str): OneBot 配置的 access_token
+        reconnect_delay (float): 首次重连等待秒数
+        max_reconnect_delay (float): 重连等待上限
+        on_event (Callable): 收到事件时的回调, 在 transport 的线程中执行
+    """
+    def __init__(self, url: str, access_token: Optional[str] = None, reconnect_delay: float = 1.0,
+                 max_reconnect_delay: float = 30.0, on_event: Optional[Callable[[dict], None]] = None):
+        super().__init__(on_event)
+        self.url = url
+        self.access_token = access_token
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.reconnects = 0
+        self._connected_event = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._main = None
+
+    def start(self, wait: float = 5.0):
+        """启动后台线程并等待首次连接, 最多等待 wait 秒(连不上时继续在后台重连)"""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='ForwardWebSocket', daemon=True)
+        self._thread.start()
+        self._main = asyncio.run_coroutine_threadsafe(self._run(), self._loop)
+        if not self._connected_event.wait(wait):
+            self.logger.warning(f"WebSocket {self.url} not connected after {wait}s, falling back to HTTP meanwhile")
+        return self
+
+    async def _run(self):
+        headers = {'Authorization': f'Bearer {self.access_token}'} if self.access_token else None
+        delay = self.reconnect_delay
+        while not self._stopping:
+            try:
+                async with connect(self.url, additional_headers=headers, max_size=None) as ws:
+                    self._ws = ws
+                    self._connected_event.set()
+                    delay = self.reconnect_delay
+                    self.logger.info(f"WebSocket connected to {self.url}")
+                    async for frame in ws:
+                        self._handle_frame(frame)
+            except (OSError, WebSocketException, asyncio.TimeoutError) as e:
+                self.logger.warning(f"WebSocket {self.url} disconnected: {str(e)}")
+            finally:
+                self._ws = None
+                self._connected_event.clear()
+                self._fail_pending("WebSocket connection lost")
+            if self._stopping:
+                break
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def close(self):
+        if self._loop is None:
+            return
+        self._stopping = True
+
+        async def _shutdown():
+            if self._ws is not None:
+                await self._ws.close()
+            self._main.cancel()
+
+        asyncio.run_coroutine_threadsafe(_shutdown(), self._loop).result(5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        self._loop = None
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats['reconnects'] = self.reconnects
+        return stats
+
+
+class _ServerSocket:
+    """将服务端框架(如 FastAPI/Starlette)的 WebSocket 适配为 send(text) 接口"""
+    def __init__(self, websocket):
+        self._websocket = websocket
+
+    async def send(self, text: str):
+        try:
+            await self._websocket.send_text(text)
+        except Exception as e:
+            # 各框架连接断开时的异常类型不同
+            raise TransportUnavailableError(f"WebSocket send failed: {str(e)}") from e
+
+
+class ReverseWebSocketTransport(WebSocketTransport):
+    """反向 WebSocket: 由 OneBot 连接机器人提供的 WebSocket 服务
+
+    同一条连接既推送事件(交给 on_event), 也用于调用接口。
+    在 WebSocket 路由中调用 ``await transport.serve(websocket)``,
+    websocket 需提供 accept / receive_text / send_text 协程(FastAPI/Starlette 的 WebSocket 即可)。
+    新连接会替换旧连接。
+
+    参数:
+        access_token (str): 设置后校验 OneBot 连接时携带的 access_token
+        on_event (Callable): 收到事件时的回调, 在服务的事件循环中执行
+    """
+    def __init__(self, access_token: Optional[str] = None, on_event: Optional[Callable[[dict], None]] = None):
+        super().__init__(on_event)
+        self.access_token = access_token
+        self.connections = 0
+
+    def authorized(self, headers, query_params) -> bool:
+        """校验 Authorization 头或 access_token 查询参数"""
+        if not self.access_token:
+            return True
+        token = headers.get('authorization', '')
+        if token.lower().startswith(('bearer ', 'token ')):
+            token = token.split(' ', 1)[1]
+        return (token or query_params.get('access_token')) == self.access_token
+
+    async def serve(self, websocket):
+        """处理一条 OneBot 反向 WebSocket 连接, 直到连接断开"""
+        if not self.authorized(websocket.headers, websocket.query_params):
+            await websocket.close(code=1008)
+            self.logger.warning("Rejected reverse WebSocket connection with invalid access token")
+            return
+        await websocket.accept()
+        socket = _ServerSocket(websocket)
+        self._loop = asyncio.get_running_loop()
+        self._ws = socket
+        self.connections += 1
+        self.logger.info(f"Reverse WebSocket connected, self_id: {websocket.headers.get('x-self-id')}")
+        try:
+            while True:
+                self._handle_frame(await websocket.receive_text())
+        except Exception as e:
+            # 各框架连接断开时的异常类型不同
+            self.logger.warning(f"Reverse WebSocket disconnected: {e!r}")
+        finally:
+            if self._ws is socket:
+                self._ws = None
+                self._fail_pending("WebSocket connection lost")
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats['connections'] = self.connections
+        return stats
@@ -26,7 +26,8 @@ class echo_message(FunctionTemplate):
         # 静态注册方法
         return {
             'type': 'message_function',
-            'name': 'echo_message'
+            'name': 'echo_message',
+            'triggers': {'commands': ['echo']}
         }
         
 
@@ -0,0 +1,58 @@
+"""对比 QQBotHttp 连接池与逐次新建连接的吞吐量
+
+用法:
+    python benchmarks/bench_http_pool.py [--requests 2000] [--threads 8]
+
+在本地启动 OneBot 替身服务, 分别用模块级 requests.post (每次新建连接)
+和 QQBotHttp 的共享连接池调用 get_msg, 输出 requests/sec。
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from QQBotAPI.QQBotHttp import QQBotHttp
+from tests.onebot_stub import OneBotStub
+
+
+def run(call, total, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda i: call(i), range(total)))
+    return total / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    server = OneBotStub().start()
+    url = server.url + "/get_msg"
+    try:
+        before = run(lambda i: requests.post(url, json={'message_id': i}).json(), args.requests, args.threads)
+        connections_before = server.connections
+
+        api = QQBotHttp(server.url, pool_size=args.threads, warmup=args.threads)
+        server.connections = 0
+        after = run(lambda i: api.get_msg(i), args.requests, args.threads)
+        connections_after = server.connections
+        api.close()
+    finally:
+        server.stop()
+
+    print(f"requests.post (no pool): {before:8.1f} req/s, {connections_before} connections")
+    print(f"QQBotHttp (pooled):      {after:8.1f} req/s, {connections_after} connections")
+    print(f"speedup: {after / before:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
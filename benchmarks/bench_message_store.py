@@ -0,0 +1,100 @@
+"""消息表在 1M / 10M 行时按 message_id 查找的延迟, 对比无索引的旧表结构
+
+用法:
+    python benchmarks/bench_message_store.py [--rows 1000000 10000000] [--lookups 2000] [--legacy-lookups 20]
+
+每个行数生成两个临时数据库: 旧结构(无索引)的表, 以及经 MessageManager 迁移后的表, 行内容相同。
+消息分布在 50 个群和 5000 个发送者中。分别随机查找 message_id, 输出 p50 / p99 延迟;
+旧结构每次查找都扫描全表, 查找次数用 --legacy-lookups 单独设置。
+另测一次按 (group, time) 取某群最近 50 条消息的延迟。10M 行的数据库约占 2GB 磁盘。
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from QQBotAPI.DataManager import MessageManager
+
+LEGACY_SCHEMA = 'CREATE TABLE messages (message_id INTEGER, time INTEGER, "group" INTEGER, sender INTEGER, json JSON)'
+
+
+def fill(path, rows):
+    """直接用 sqlite3 写入旧结构的表, 比逐条 add_message 快得多"""
+    conn = sqlite3.connect(path)
+    conn.execute(LEGACY_SCHEMA)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    random.seed(0)
+    batch = []
+    for message_id in range(1, rows + 1):
+        group, sender = random.randrange(50), random.randrange(5000)
+        payload = json.dumps({
+            "self_id": 1, "time": 1700000000 + message_id, "message_type": "group", "message_id": message_id,
+            "message_seq": message_id, "group_id": group, "sender": {"user_id": sender, "nickname": "n", "card": ""},
+            "message": [{"type": "text", "data": {"text": f"message {message_id}"}}]
+        })
+        batch.append((message_id, 1700000000 + message_id, group, sender, payload))
+        if len(batch) == 100000:
+            conn.executemany("INSERT INTO messages VALUES (?, ?, ?, ?, ?)", batch)
+            batch = []
+    conn.executemany("INSERT INTO messages VALUES (?, ?, ?, ?, ?)", batch)
+    conn.commit()
+    conn.close()
+
+
+def measure(query, keys):
+    latencies = []
+    for key in keys:
+        start = time.perf_counter()
+        query(key)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000000, 10000000])
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--legacy-lookups', type=int, default=20)
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            legacy_path = os.path.join(directory, 'legacy.db')
+            fill(legacy_path, rows)
+            fill(os.path.join(directory, '1.db'), rows)
+            print(f"{rows} rows generated in {time.perf_counter() - start:.1f} s")
+
+            start = time.perf_counter()
+            manager = MessageManager(1, db_path=directory)
+            print(f"  migration (dedupe + indexes): {time.perf_counter() - start:10.1f} s")
+
+            legacy = sqlite3.connect(legacy_path)
+            keys = [random.randrange(1, rows + 1) for _ in range(args.lookups)]
+            p50, p99 = measure(lambda key: legacy.execute(
+                "SELECT json FROM messages WHERE message_id = ?", (key,)).fetchone(), keys[:args.legacy_lookups])
+            print(f"  legacy get by id:   p50 {p50:10.3f} ms   p99 {p99:10.3f} ms")
+            legacy.close()
+
+            p50, p99 = measure(manager.get_message_via_id, keys)
+            print(f"  get_message_via_id: p50 {p50:10.3f} ms   p99 {p99:10.3f} ms")
+
+            with manager.engine.connect() as conn:
+                p50, p99 = measure(lambda group: conn.exec_driver_sql(
+                    'SELECT json FROM messages WHERE "group" = ? ORDER BY time DESC LIMIT 50', (group,)).fetchall(),
+                    [random.randrange(50) for _ in range(200)])
+            print(f"  latest 50 in group: p50 {p50:10.3f} ms   p99 {p99:10.3f} ms")
+            manager.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
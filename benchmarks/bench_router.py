@@ -0,0 +1,105 @@
+"""对比逐个调用 check() 与 TriggerRouter 索引的功能匹配速度
+
+用法:
+    python benchmarks/bench_router.py [--functions 250] [--messages 5000]
+
+注册 --functions 个功能(命令、前缀、正则各占一部分, 另有少量未声明 triggers 的旧功能),
+check() 与 echo 插件一样基于 text_only() 判断。对一批以普通群聊为主、夹杂命令的消息,
+分别用线性扫描(原 Resolver._find_function 的做法)和 TriggerRouter 查找命中的功能, 输出 messages/sec。
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from QQBotAPI.message import ReceivedMessageChain
+from src.router import TriggerRouter
+
+
+def make_function(index, kind):
+    if kind == 'command':
+        command = f"cmd{index}"
+        triggers = {'commands': [command]}
+        check = lambda msg: command if msg.text_only().strip().split(maxsplit=1)[:1] == [command] else ""
+    elif kind == 'prefix':
+        prefix = f"/p{index} "
+        triggers = {'prefixes': [prefix]}
+        check = lambda msg: prefix if msg.text_only().strip().startswith(prefix) else ""
+    elif kind == 'regex':
+        pattern = re.compile(f"^r{index}:\\d+$")
+        triggers = {'regex': [pattern.pattern]}
+        check = lambda msg: pattern.pattern if pattern.search(msg.text_only().strip()) else ""
+    else:
+        keyword = f"legacy{index}"
+        triggers = None
+        check = lambda msg: keyword if keyword in msg.text_only() else ""
+    registration = {'type': 'message_function', 'name': f"{kind}{index}"}
+    if triggers:
+        registration['triggers'] = triggers
+    return type(f"{kind}{index}", (), {
+        'register': classmethod(lambda cls: registration),
+        'check': classmethod(lambda cls, msg: check(msg))
+    })
+
+
+def make_message(text, i):
+    return ReceivedMessageChain({
+        "self_id": 1, "time": 0, "message_type": "group", "message_id": i, "message_seq": i, "group_id": 100,
+        "sender": {"user_id": 2, "nickname": "n", "card": ""},
+        "message": [{"type": "text", "data": {"text": text}}]
+    })
+
+
+def linear(functions, message):
+    return [function for function in functions if function.check(message) not in ("", False, None)]
+
+
+def run(find, messages):
+    start = time.perf_counter()
+    results = [find(message) for message in messages]
+    return len(messages) / (time.perf_counter() - start), results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--functions', type=int, default=250)
+    parser.add_argument('--messages', type=int, default=5000)
+    args = parser.parse_args()
+
+    kinds = ['command', 'prefix', 'regex']
+    functions = [make_function(i, kinds[i % 3]) for i in range(args.functions)]
+    functions += [make_function(args.functions + i, 'legacy') for i in range(5)]
+
+    random.seed(0)
+    texts = []
+    for i in range(args.messages):
+        roll = random.random()
+        n = random.randrange(args.functions)
+        if roll < 0.1:
+            texts.append(f"cmd{n - n % 3} 参数")
+        elif roll < 0.15:
+            texts.append(f"/p{n - n % 3 + 1} 北京")
+        else:
+            texts.append(f"今天吃什么 {i}")
+    messages = [make_message(text, i) for i, text in enumerate(texts)]
+
+    start = time.perf_counter()
+    router = TriggerRouter(functions)
+    build = time.perf_counter() - start
+
+    before, expected = run(lambda message: linear(functions, message), messages)
+    after, actual = run(lambda message: [function for function, _ in router.match(message)], messages)
+    assert expected == actual
+
+    print(f"{len(functions)} functions, {len(messages)} messages, index built in {build * 1000:.1f} ms")
+    print(f"linear check() scan: {before:10.1f} messages/s")
+    print(f"TriggerRouter:       {after:10.1f} messages/s, {router.checked / len(messages):.1f} check() calls/message")
+    print(f"speedup: {after / before:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""对比 HTTP 与正向 WebSocket 调用 OneBot 接口的延迟和吞吐量
+
+用法:
+    python benchmarks/bench_ws_transport.py [--requests 2000] [--threads 8]
+
+在本地分别启动 OneBot HTTP 和 WebSocket 替身服务,
+先串行调用 get_msg 统计延迟, 再用多线程并发调用统计吞吐量。
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from QQBotAPI.QQBotHttp import QQBotHttp
+from QQBotAPI.transport import ForwardWebSocketTransport
+from tests.onebot_stub import OneBotStub, OneBotWebSocketStub
+
+
+def latency(api, total):
+    samples = []
+    for i in range(total):
+        start = time.perf_counter()
+        api.get_msg(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def throughput(api, total, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(api.get_msg, range(total)))
+    return total / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    http_server = OneBotStub().start()
+    ws_server = OneBotWebSocketStub().start()
+    transport = ForwardWebSocketTransport(ws_server.url).start()
+    try:
+        http_api = QQBotHttp(http_server.url, pool_size=args.threads)
+        ws_api = QQBotHttp(http_server.url, pool_size=args.threads, transport=transport)
+        results = {}
+        for name, api in (('HTTP', http_api), ('WebSocket', ws_api)):
+            p50, p99 = latency(api, args.requests // 4)
+            rps = throughput(api, args.requests, args.threads)
+            results[name] = (p50, p99, rps)
+        http_api.close()
+        ws_api.close()
+    finally:
+        transport.close()
+        ws_server.stop()
+        http_server.stop()
+
+    for name, (p50, p99, rps) in results.items():
+        print(f"{name:<10} p50 {p50:6.3f} ms  p99 {p99:6.3f} ms  {rps:8.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
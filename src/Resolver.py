@@ -6,7 +6,10 @@ from typing import Callable, List, Type
 import uuid
 from QQBotAPI.errors import QQBotAPIError
 from QQBotAPI.message import *
+from QQBotAPI.trace import current_trace, span
 from src.func_template import FunctionTemplate
+from src.function_runner import DEFAULT_FUNCTION_RUNNER, FunctionRunner
+from src.router import TriggerRouter
 
 
 class MultipleFunctionFoundError():
@@ -16,19 +19,24 @@ class NoFunctionFoundError():
 
 class Resolver:
     """每个消息传入都会生成Resolver，用于响应消息"""
-    def __init__(self, message:Union[MessageChain,ReceivedMessageChain], QQBot, functions:List[FunctionTemplate], is_quiet_function = False):
+    def __init__(self, message:Union[MessageChain,ReceivedMessageChain], QQBot, functions:Union[TriggerRouter,List[FunctionTemplate]], is_quiet_function = False, runner:FunctionRunner = None):
         self.message = message
         self.QQBot = QQBot
-        self.functions = functions
-        #创建全局唯一的 响应ID
-        self.response_id = str(uuid.uuid4())
-        self.logger = logging.getLogger(__name__+" - "+self.response_id)
+        self.runner = runner or DEFAULT_FUNCTION_RUNNER
+        # 传入功能列表时临时建立索引, 常驻的功能列表应在加载时建好 TriggerRouter
+        self.functions = functions if isinstance(functions, TriggerRouter) else TriggerRouter(functions)
+        #沿用追踪上下文中的响应ID, 日志通过 TraceFilter 带上该ID
+        trace = current_trace()
+        self.response_id = trace.response_id if trace is not None else str(uuid.uuid4())
+        self.logger = logging.getLogger(__name__)
         self.is_quiet_function = is_quiet_function
         
         self.logger.info(f"New Resolver created with response ID: {self.response_id}")
         try:
-            self.function = self._find_function()
-            self._use_function(self.function)
+            with span('match'):
+                self.function = self._find_function()
+            with span('plugin'):
+                self._use_function(self.function)
         except (ConnectionError, QQBotAPIError) as e:
             self.logger.error(f"Error processing message: {str(e)}")
             raise e
@@ -49,17 +57,15 @@ class Resolver:
             ])
         elif len(function) == 1:
             self.logger.info(f"Function {function[0].register()['name']} selected")
-            function[0](self.message, self.QQBot).process()
+            self.runner.run(function[0], self.message, self.QQBot)
         elif len(function) > 1:
             if self.is_quiet_function:
-                self.logger.info("Multiple functions found, but is quiet function")
-                for f in function:
-                    try:
-                        self.logger.info(f"Function {f.register()['name']} Running")
-                        f(self.message, self.QQBot).process()
-                    except Exception as e:
-                        self.logger.error(f"Error processing message: {str(e)}")
-                        self.logger.error(traceback.format_exc())
+                self.logger.info("Multiple functions found, but is quiet function, running concurrently")
+                results = self.runner.run_all(function, self.message, self.QQBot)
+                for f, result in zip(function, results):
+                    if isinstance(result, Exception):
+                        self.logger.error(f"Error processing message in {f.register()['name']}: {str(result)}")
+                        self.logger.error("".join(traceback.format_exception(result)))
             else:
                 sent_message = self.message.reply_chain()
                 sent_message.message.extend([
@@ -69,11 +75,9 @@ class Resolver:
 
 
     def _find_function(self) -> callable:
-        """查找对应的函数"""
+        """查找对应的函数, 只对索引筛选出的候选调用 check()"""
         response_function = []
-        for function in self.functions:
-            res = function.check(self.message)
-            if res != "" and res != False and res != None:
-                self.logger.info(f"Found function: {function.register()['name']} in condition: {res}")
-                response_function.append(function)
+        for function, res in self.functions.match(self.message):
+            self.logger.info(f"Found function: {function.register()['name']} in condition: {res}")
+            response_function.append(function)
         return response_function
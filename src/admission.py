@@ -0,0 +1,59 @@
+import logging
+import random
+import threading
+from collections import Counter
+
+
+class AdmissionController:
+    """过载时跳过未 @机器人 的群消息的 quiet_function 处理
+
+    根据事件在队列中的等待时间(见 event_queue.queue_delay)维护其指数加权平均值。
+    平均等待超过 soft_delay 秒后, 按比例随机跳过群聊中的 quiet_function 处理,
+    到 hard_delay 秒时全部跳过; 等待时间回落后逐渐恢复。
+    被跳过的消息仍会写入数据库, 私聊和 @机器人 的消息不经过本控制器, 总是处理。
+
+    参数:
+        soft_delay (float): 开始跳过的平均等待秒数
+        hard_delay (float): 全部跳过的平均等待秒数
+        smoothing (float): 加权平均中新样本的权重, 0~1
+    """
+    def __init__(self, soft_delay: float = 5.0, hard_delay: float = 30.0, smoothing: float = 0.2):
+        if hard_delay <= soft_delay:
+            raise ValueError(f"hard_delay ({hard_delay}) must be greater than soft_delay ({soft_delay})")
+        self.logger = logging.getLogger(__name__)
+        self.soft_delay = soft_delay
+        self.hard_delay = hard_delay
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self.delay = 0.0
+        self.admitted = 0
+        self.shed = Counter()
+
+    def observe(self, delay: float):
+        """记录一个事件的等待时间, 每个出队的事件调用一次"""
+        with self._lock:
+            self.delay += (delay - self.delay) * self.smoothing
+
+    def shed_ratio(self) -> float:
+        """当前应跳过的比例, 0 为全部处理, 1 为全部跳过"""
+        return min(1.0, max(0.0, (self.delay - self.soft_delay) / (self.hard_delay - self.soft_delay)))
+
+    def admit(self, group_id) -> bool:
+        """是否处理该群的一条未 @机器人 的消息, 跳过时计入该群的 shed"""
+        ratio = self.shed_ratio()
+        with self._lock:
+            if ratio > 0 and random.random() < ratio:
+                self.shed[group_id] += 1
+                return False
+            self.admitted += 1
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'delay': round(self.delay, 3),
+                'shed_ratio': round(self.shed_ratio(), 3),
+                'admitted': self.admitted,
+                'shed': sum(self.shed.values()),
+                'shed_by_group': {str(group_id): count for group_id, count in self.shed.items()}
+            }
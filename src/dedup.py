@@ -0,0 +1,43 @@
+import logging
+from QQBotAPI.cache import TTLCache
+
+
+class DedupWindow:
+    """事件去重窗口
+
+    OneBot 在处理超时时会重发事件, 以 (self_id, message_id) 记录最近处理过的消息,
+    窗口内重复的消息在写入数据库和构造 Resolver 之前丢弃。
+    最多记录 maxsize 条, 超出时淘汰最旧的记录, 内存占用固定。
+
+    参数:
+        maxsize (int): 最多记录的消息数
+        ttl (float): 记录保留秒数, 应大于 OneBot 的重发间隔
+    """
+    def __init__(self, maxsize: int = 10000, ttl: float = 300):
+        self.logger = logging.getLogger(__name__)
+        self._seen = TTLCache(maxsize, ttl)
+        self.suppressed = 0
+
+    def is_duplicate(self, event: dict) -> bool:
+        """事件在窗口内出现过时返回True; 首次出现时记录并返回False, 非消息事件总是返回False
+
+        撤回等通知事件也带有原消息的 message_id, 不能参与去重。
+        """
+        message_id = event.get('message_id')
+        if event.get('post_type') != 'message' or message_id is None:
+            return False
+        if self._seen.add_if_absent((event.get('self_id'), message_id)):
+            return False
+        self.suppressed += 1
+        self.logger.info(f"Duplicate message {message_id} suppressed")
+        return True
+
+    def forget(self, event: dict):
+        """删除事件的记录, 用于事件未被接收(如返回 503)、需要 OneBot 重发的情况"""
+        self._seen.discard((event.get('self_id'), event.get('message_id')))
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._seen),
+            'suppressed': self.suppressed
+        }
@@ -0,0 +1,287 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, Optional
+
+BLOCK = 'block'     # 队列满时等待空位(webhook 请求随之变慢)
+SHED = 'shed'       # 队列满时丢弃事件
+REJECT = 'reject'   # 队列满时拒绝事件, webhook 返回 503
+
+# 事件优先级, 数值越小越先处理
+PRIORITY_ADDRESSED = 0    # 私聊和 @机器人 的消息
+PRIORITY_BACKGROUND = 1   # 其他群消息(quiet_function)和其他事件
+PRIORITY_NAMES = ('addressed', 'background')
+
+# 延迟统计保留的最近样本数
+LATENCY_SAMPLES = 1000
+
+
+_queue_delay = contextvars.ContextVar('event_queue_delay', default=0.0)
+
+
+def queue_delay() -> float:
+    """当前处理的事件在队列中等待的秒数, 不在 EventQueue 的 handler 中时为 0"""
+    return _queue_delay.get()
+
+
+class QueueFullError(Exception):
+    """事件队列已满且策略为 reject 时抛出"""
+    pass
+
+
+class _PriorityClass:
+    """一个优先级的统计: 入队到处理完成的延迟及 SLO"""
+    def __init__(self, slo: Optional[float]):
+        self.slo = slo
+        self.processed = 0
+        self.slo_violations = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def record(self, latency: float):
+        self.processed += 1
+        self.latencies.append(latency)
+        if self.slo is not None and latency > self.slo:
+            self.slo_violations += 1
+
+    def stats(self, depth: int) -> dict:
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 3) if latencies else None
+        return {
+            'depth': depth,
+            'processed': self.processed,
+            'p50': percentile(0.5),
+            'p95': percentile(0.95),
+            'max': round(latencies[-1], 3) if latencies else None,
+            'slo': self.slo,
+            'slo_violations': self.slo_violations
+        }
+
+
+class _Lane:
+    """一个工作通道: 每个优先级一个有界队列 + 一个工作协程, 同一优先级内按到达顺序逐个处理"""
+    def __init__(self, maxsize: int):
+        self.queues = [asyncio.Queue(maxsize) for _ in PRIORITY_NAMES]
+        # 各优先级已入队但未处理完的事件的入队时间, 队首即最早的未完成事件
+        self.pending = [deque() for _ in PRIORITY_NAMES]
+        self.ready = asyncio.Event()
+        self.task = None
+        self.busy = False
+        self.processed = 0
+        self.max_lag = 0.0
+        # 有后台事件等待时连续处理高优先级事件的次数
+        self.streak = 0
+
+    def lag(self, now: float) -> float:
+        oldest = [pending[0] for pending in self.pending if pending]
+        return now - min(oldest) if oldest else 0.0
+
+    def depth(self) -> int:
+        return sum(queue.qsize() for queue in self.queues)
+
+
+class EventQueue:
+    """按会话分通道、按优先级排队的有界事件队列
+
+    webhook 只负责校验事件并放入队列, 随后立即返回;
+    handler(event) 在线程池中执行, 因此阻塞的数据库读写、插件和发送不会卡住事件循环。
+
+    key(event) 相同的事件(同一个群或同一个私聊)总是进入同一个通道, 通道内按顺序处理,
+    因此同一会话的回复不会乱序; 不同会话分散到各通道并行处理。
+    key 为 None 的事件轮流分配到各通道。
+
+    priority(event) 返回 PRIORITY_*, 通道内先处理 PRIORITY_ADDRESSED 的事件,
+    同一会话内只保证同一优先级的事件按顺序处理。为避免后台事件饿死:
+    连续处理 max_burst 个高优先级事件后, 或后台事件已等待超过 max_wait 秒时, 先处理一个后台事件。
+    各优先级分别统计入队到处理完成的延迟, 超过 slo 中对应秒数的计入 slo_violations。
+
+    参数:
+        handler (Callable): 处理单个事件的同步函数
+        workers (int): 通道数, 每个通道同时只处理一个事件
+        maxsize (int): 每个优先级的队列总上限, 平均分配到各通道
+        overflow (str): 通道满时的策略, 见 BLOCK / SHED / REJECT
+        key (Callable): 返回事件所属会话的函数, 默认所有事件轮流分配
+        priority (Callable): 返回事件优先级的函数, 默认均为 PRIORITY_ADDRESSED
+        max_burst (int): 后台事件等待时, 最多连续处理的高优先级事件数
+        max_wait (float): 后台事件等待超过该秒数时优先处理
+        slo (dict): 优先级名 -> 延迟目标秒数, 见 PRIORITY_NAMES
+    """
+    def __init__(self, handler: Callable[[dict], None], workers: int = 4, maxsize: int = 1000, overflow: str = BLOCK,
+                 key: Optional[Callable[[dict], Optional[Hashable]]] = None,
+                 priority: Optional[Callable[[dict], int]] = None,
+                 max_burst: int = 8, max_wait: float = 30.0, slo: Optional[Dict[str, float]] = None):
+        if overflow not in (BLOCK, SHED, REJECT):
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.logger = logging.getLogger(__name__)
+        self.handler = handler
+        self.workers = workers
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.key = key
+        self.priority = priority
+        self.max_burst = max_burst
+        self.max_wait = max_wait
+        slo = slo or {}
+        self._classes = [_PriorityClass(slo.get(name)) for name in PRIORITY_NAMES]
+        self._lanes = []
+        self._next_lane = 0
+        self._executor = None
+        self.failed = 0
+        self.shed = 0
+        self.rejected = 0
+
+    async def start(self):
+        """在当前事件循环中启动各通道的工作协程"""
+        lane_size = max(1, self.maxsize // self.workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='EventWorker')
+        self._lanes = [_Lane(lane_size) for _ in range(self.workers)]
+        for lane in self._lanes:
+            lane.task = asyncio.create_task(self._worker(lane))
+        self.logger.info(f"Event queue started with {self.workers} lanes, maxsize {self.maxsize}, overflow '{self.overflow}'")
+
+    async def stop(self):
+        """等待队列中的事件处理完毕后停止"""
+        if not self._lanes:
+            return
+        for lane in self._lanes:
+            for queue in lane.queues:
+                await queue.join()
+        for lane in self._lanes:
+            lane.task.cancel()
+        await asyncio.gather(*(lane.task for lane in self._lanes), return_exceptions=True)
+        self._executor.shutdown(wait=True)
+
+    def lane_of(self, event: dict) -> int:
+        """返回事件所属通道的序号"""
+        key = self.key(event) if self.key is not None else None
+        if key is None:
+            self._next_lane = (self._next_lane + 1) % self.workers
+            return self._next_lane
+        return hash(key) % self.workers
+
+    def priority_of(self, event: dict) -> int:
+        return self.priority(event) if self.priority is not None else PRIORITY_ADDRESSED
+
+    async def put(self, event: dict) -> bool:
+        """按 overflow 策略放入事件
+
+        返回:
+            bool: 事件是否进入队列
+
+        异常:
+            QueueFullError: 通道已满且策略为 reject
+        """
+        lane = self._lanes[self.lane_of(event)]
+        priority = self.priority_of(event)
+        if self.overflow == BLOCK:
+            await lane.queues[priority].put(event)
+            self._enqueued(lane, priority)
+            return True
+        if self._offer(lane, priority, event):
+            return True
+        if self.overflow == REJECT:
+            self.rejected += 1
+            raise QueueFullError(f"Event queue is full ({self.maxsize})")
+        self.shed += 1
+        self.logger.warning(f"Event queue is full ({self.maxsize}), event dropped")
+        return False
+
+    def offer(self, event: dict) -> bool:
+        """不等待地放入事件, 通道满时丢弃并返回False
+
+        在事件循环中同步调用(如反向 WebSocket 的读取循环)时使用:
+        读取循环不能等待, 否则接口响应也无法被读取。
+        """
+        if self._offer(self._lanes[self.lane_of(event)], self.priority_of(event), event):
+            return True
+        self.shed += 1
+        self.logger.warning(f"Event queue is full ({self.maxsize}), event dropped")
+        return False
+
+    def _offer(self, lane: _Lane, priority: int, event: dict) -> bool:
+        try:
+            lane.queues[priority].put_nowait(event)
+        except asyncio.QueueFull:
+            return False
+        self._enqueued(lane, priority)
+        return True
+
+    @staticmethod
+    def _enqueued(lane: _Lane, priority: int):
+        lane.pending[priority].append(time.monotonic())
+        lane.ready.set()
+
+    def _choose(self, lane: _Lane, now: float) -> Optional[int]:
+        """选择下一个要处理的优先级, 队列都为空时返回None"""
+        high, low = (not queue.empty() for queue in lane.queues)
+        if low and (not high or lane.streak >= self.max_burst
+                    or now - lane.pending[PRIORITY_BACKGROUND][0] > self.max_wait):
+            lane.streak = 0
+            return PRIORITY_BACKGROUND
+        if high:
+            # 只计后台事件等待期间的连续次数
+            lane.streak = lane.streak + 1 if low else 0
+            return PRIORITY_ADDRESSED
+        return None
+
+    async def _worker(self, lane: _Lane):
+        loop = asyncio.get_running_loop()
+        while True:
+            priority = self._choose(lane, time.monotonic())
+            if priority is None:
+                lane.ready.clear()
+                await lane.ready.wait()
+                continue
+            queue = lane.queues[priority]
+            event = queue.get_nowait()
+            lane.busy = True
+            try:
+                context = contextvars.copy_context()
+                # 同一优先级按顺序处理, 队首的入队时间即为该事件的
+                context.run(_queue_delay.set, time.monotonic() - lane.pending[priority][0])
+                await loop.run_in_executor(self._executor, context.run, self.handler, event)
+            except Exception as e:
+                self.failed += 1
+                self.logger.error(f"Error handling event: {str(e)}")
+            finally:
+                now = time.monotonic()
+                enqueued = lane.pending[priority].popleft()
+                lane.max_lag = max(lane.max_lag, now - enqueued)
+                self._classes[priority].record(now - enqueued)
+                lane.processed += 1
+                lane.busy = False
+                queue.task_done()
+
+    def stats(self) -> dict:
+        """队列总体状态、各优先级的延迟和各通道的占用情况
+
+        lag 为通道中最早一个未处理完的事件已等待的秒数, 持续偏大的通道对应繁忙的会话。
+        """
+        now = time.monotonic()
+        lanes = [{
+            'depth': lane.depth(),
+            'busy': lane.busy,
+            'processed': lane.processed,
+            'lag': round(lane.lag(now), 3),
+            'max_lag': round(lane.max_lag, 3)
+        } for lane in self._lanes]
+        return {
+            'depth': sum(lane['depth'] for lane in lanes),
+            'maxsize': self.maxsize,
+            'overflow': self.overflow,
+            'workers': self.workers,
+            'busy': sum(lane['busy'] for lane in lanes),
+            'processed': sum(lane['processed'] for lane in lanes),
+            'failed': self.failed,
+            'shed': self.shed,
+            'rejected': self.rejected,
+            'priorities': {
+                name: self._classes[priority].stats(sum(lane.queues[priority].qsize() for lane in self._lanes))
+                for priority, name in enumerate(PRIORITY_NAMES)
+            },
+            'lanes': lanes
+        }
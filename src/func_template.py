@@ -29,6 +29,8 @@ class FunctionTemplate(ABC):
     def register(cls) -> tuple[str, str]:
         """
         Register function name and type
+        Optional keys: 'triggers' (see TriggerRouter), 'timeout' (seconds, None for no limit)
+        and 'max_concurrency' (see FunctionRunner)
         Returns:
             tuple[str, str]: (function_name, function_type)
         """
@@ -38,6 +40,7 @@ class FunctionTemplate(ABC):
     def process(self):
         """
         Process message
+        May be defined as `async def`; sync implementations run in a thread pool
         """
         pass
 
@@ -0,0 +1,208 @@
+import asyncio
+import contextvars
+import inspect
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Type
+from QQBotAPI.message import ReceivedMessageChain
+from src.func_template import FunctionTemplate
+from src.process_pool import ProcessPoolRunner
+
+
+class FunctionTimeoutError(Exception):
+    """功能未在 register() 声明的 timeout 内完成"""
+    pass
+
+
+class _Limits:
+    """单个功能的并发限制和统计"""
+    def __init__(self, name: str, timeout: Optional[float], max_concurrency: Optional[int], cpu_bound: bool):
+        self.name = name
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.cpu_bound = cpu_bound
+        self.semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+
+    def stats(self) -> dict:
+        return {
+            'running': self.running,
+            'completed': self.completed,
+            'failed': self.failed,
+            'timeouts': self.timeouts,
+            'max_concurrency': self.max_concurrency,
+            'timeout': self.timeout
+        }
+
+
+class FunctionRunner:
+    """执行功能的 process(), 支持同步和 async def 两种实现
+
+    在后台线程中运行自己的事件循环: async def process() 在该循环中执行,
+    同步的 process() 在线程池中执行。每个功能可以在 register() 中声明:
+        - timeout: 超时秒数, 超时后抛出 FunctionTimeoutError, 默认 default_timeout, None 表示不限
+        - max_concurrency: 同时执行的上限, 超出时排队等待(等待时间计入 timeout), 默认不限
+        - cpu_bound: 为真时在 process_pool 的子进程中执行, 见 ProcessPoolRunner
+
+    同步实现无法被中断, 超时后其线程会继续执行到结束, 在此之前仍占用并发名额。
+    async 实现中不应调用阻塞的接口(如同步的 QQBot 发送), 否则会阻塞其他 async 功能。
+
+    参数:
+        max_workers (int): 执行同步 process() 的线程数
+        default_timeout (float): 未声明 timeout 的功能的超时秒数
+        process_pool (ProcessPoolRunner): 执行 cpu_bound 功能的进程池, 默认在首次使用时创建
+    """
+    def __init__(self, max_workers: int = 16, default_timeout: Optional[float] = 60.0, process_pool: ProcessPoolRunner = None):
+        self.logger = logging.getLogger(__name__)
+        self.max_workers = max_workers
+        self.default_timeout = default_timeout
+        self.process_pool = process_pool or ProcessPoolRunner()
+        self._limits = {}
+        self._loop = None
+        self._thread = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._loop is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='FunctionWorker')
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name='FunctionRunner', daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def close(self):
+        with self._lock:
+            if self._loop is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(5)
+            self._executor.shutdown(wait=False)
+            self._loop = None
+        self.process_pool.close()
+
+    def _limits_of(self, function: Type[FunctionTemplate]) -> _Limits:
+        # 只在 runner 的事件循环中调用, Semaphore 需在该循环中创建
+        # 按模块和类名记录: 重载插件会生成新的类, 不能让旧类的记录一直留存;
+        # 延迟加载的占位类与真正的功能类也因此共用同一份限制
+        key = (function.__module__, function.__qualname__)
+        registration = function.register()
+        settings = (registration['name'], registration.get('timeout', self.default_timeout),
+                    registration.get('max_concurrency'), bool(registration.get('cpu_bound')))
+        limits = self._limits.get(key)
+        if limits is None or (limits.name, limits.timeout, limits.max_concurrency, limits.cpu_bound) != settings:
+            # 重载后声明变化时重新创建, 正在执行的任务仍在旧的名额上释放
+            limits = self._limits[key] = _Limits(*settings)
+        return limits
+
+    def _submit(self, coro) -> Future:
+        """在 runner 的事件循环中执行 coro, 并沿用调用方的 contextvars"""
+        loop = self._ensure_started()
+        context = contextvars.copy_context()
+        future = Future()
+
+        def start():
+            task = loop.create_task(coro, context=context)
+
+            def done(task):
+                if task.cancelled():
+                    future.cancel()
+                elif task.exception() is not None:
+                    future.set_exception(task.exception())
+                else:
+                    future.set_result(task.result())
+            task.add_done_callback(done)
+        loop.call_soon_threadsafe(start)
+        return future
+
+    async def _run(self, function: Type[FunctionTemplate], message: ReceivedMessageChain, bot):
+        limits = self._limits_of(function)
+        timeout = limits.timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if limits.semaphore is not None:
+            try:
+                await asyncio.wait_for(limits.semaphore.acquire(), timeout)
+            except asyncio.TimeoutError:
+                limits.timeouts += 1
+                raise FunctionTimeoutError(f"Function {limits.name} waited {timeout}s for a free slot "
+                                           f"(max_concurrency {limits.max_concurrency})") from None
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        limits.running += 1
+
+        def finished(work):
+            limits.running -= 1
+            if limits.semaphore is not None:
+                limits.semaphore.release()
+            if work is not None and not work.cancelled():
+                # 超时后无人等待的结果也要取走异常, 避免 "exception was never retrieved"
+                work.exception()
+
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        if limits.cpu_bound:
+            # 由进程池执行超时: 超时后终止子进程
+            work = loop.run_in_executor(self._executor, context.run, self.process_pool.run, function, message, bot, remaining)
+            waiter, remaining = work, None
+        else:
+            try:
+                instance = function(message, bot)
+            except BaseException:
+                limits.failed += 1
+                finished(None)
+                raise
+            if inspect.iscoroutinefunction(instance.process):
+                # 超时后 wait_for 取消该任务
+                work = asyncio.ensure_future(instance.process())
+                waiter = work
+            else:
+                work = loop.run_in_executor(self._executor, context.run, instance.process)
+                # 线程无法中断, 超时只停止等待, 线程结束后才释放名额
+                waiter = asyncio.shield(work)
+        work.add_done_callback(finished)
+        try:
+            result = await asyncio.wait_for(waiter, remaining)
+        except (asyncio.TimeoutError, TimeoutError):
+            limits.timeouts += 1
+            raise FunctionTimeoutError(f"Function {limits.name} timed out after {timeout}s") from None
+        except Exception:
+            limits.failed += 1
+            raise
+        limits.completed += 1
+        return result
+
+    def run(self, function: Type[FunctionTemplate], message: ReceivedMessageChain, bot):
+        """执行 function(message, bot).process() 并等待完成, 返回其结果
+
+        异常:
+            FunctionTimeoutError: 超时
+            process() 抛出的异常
+        """
+        return self._submit(self._run(function, message, bot)).result()
+
+    async def arun(self, function: Type[FunctionTemplate], message: Optional[ReceivedMessageChain], bot):
+        """run() 的协程版本, 可在其他事件循环中等待"""
+        return await asyncio.wrap_future(self._submit(self._run(function, message, bot)))
+
+    def run_all(self, functions: List[Type[FunctionTemplate]], message: ReceivedMessageChain, bot) -> list:
+        """并发执行多个功能, 等待全部完成
+
+        返回:
+            list: 与 functions 一一对应的结果, 失败的功能对应其异常
+        """
+        async def gather():
+            return await asyncio.gather(*(self._run(function, message, bot) for function in functions), return_exceptions=True)
+        return self._submit(gather()).result()
+
+    def stats(self) -> dict:
+        stats = {limits.name: limits.stats() for limits in list(self._limits.values())}
+        stats['process_pool'] = self.process_pool.stats()
+        return stats
+
+
+DEFAULT_FUNCTION_RUNNER = FunctionRunner()
@@ -1,21 +1,32 @@
+import asyncio
 from datetime import datetime
 import json
 import sys
+import time
 import traceback
+from contextlib import asynccontextmanager
 
 import yaml
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, WebSocket
 import logging
 import os
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 import uvicorn
-import importlib
-import pkgutil
 from QQBotAPI.message import *
 import QQBotAPI
+from QQBotAPI.retry import DEFAULT_RETRY_BUDGET
+from QQBotAPI.send_scheduler import SendScheduler
+from QQBotAPI.trace import SPAN_METRICS, TraceFilter, span, start_trace
+from QQBotAPI.transport import ForwardWebSocketTransport, ReverseWebSocketTransport
 from Resolver import Resolver
+from src.admission import AdmissionController
+from src.dedup import DedupWindow
+from src.event_queue import PRIORITY_ADDRESSED, PRIORITY_BACKGROUND, EventQueue, QueueFullError, queue_delay
+from src.function_runner import DEFAULT_FUNCTION_RUNNER
+from src.plugin_manager import PluginManager
+from src.scheduler import TaskScheduler
 
 def setup_log_directory():
         """设置日志目录和全局日志文件路径"""
@@ -27,13 +38,16 @@ def setup_log_directory():
         log_file_path = os.path.join(log_dir, f'app_{timestamp}.log')
         
         # 配置根日志记录器
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        # response_id 由 TraceFilter 从追踪上下文中取得, 不在消息处理中时为 '-'
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - [%(response_id)s] %(message)s')
         
         file_handler = logging.FileHandler(log_file_path, encoding='utf-8')
         file_handler.setFormatter(formatter)
+        file_handler.addFilter(TraceFilter())
         
         stream_handler = logging.StreamHandler()
         stream_handler.setFormatter(formatter)
+        stream_handler.addFilter(TraceFilter())
         
         logging.basicConfig(
             level=logging.INFO,
@@ -43,8 +57,30 @@ def setup_log_directory():
 setup_log_directory()
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # event_queue / task_scheduler / plugin_manager / send_scheduler / transport 在下方创建, 需要运行在服务的事件循环中
+    await event_queue.start()
+    task_scheduler.start()
+    plugin_manager.start(task_scheduler)
+    yield
+    await plugin_manager.stop()
+    await task_scheduler.stop()
+    await event_queue.stop()
+    # 关闭 async 插件使用的数据库连接, 需在 FunctionRunner 的事件循环停止之前
+    await bot.AsyncMessageManager.close()
+    DEFAULT_FUNCTION_RUNNER.close()
+    if send_scheduler is not None:
+        # 发出已排队的回复
+        await asyncio.to_thread(send_scheduler.close)
+    if isinstance(transport, ForwardWebSocketTransport):
+        # 停止正向 WebSocket 的事件循环线程和重连
+        await asyncio.to_thread(transport.close)
+    # 队列中的消息处理完后, 写入缓冲区中剩余的消息
+    await asyncio.to_thread(bot.MessageManager.close)
+
 # 创建实例
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(ROOT_DIR)
@@ -59,7 +95,84 @@ def load_config():
         logger.error(f"Configuration file not found in {config_path}, creating a default one.")
         default_config = {
             'bot': {
-                'host': 'http://localhost:3000'
+                'host': 'http://localhost:3000',
+                # 设置后经正向 WebSocket 调用接口, 断线时使用 HTTP
+                'ws_url': None,
+                'access_token': None,
+                'http': {
+                    'pool_size': 10,
+                    'keep_alive': True,
+                    'timeout': 10,
+                    'warmup': 2,
+                    'circuit_breaker': {
+                        'failure_threshold': 5,
+                        'recovery_timeout': 30
+                    }
+                }
+            },
+            'ingest': {
+                # webhook: OneBot 以 HTTP POST 推送事件到 /message
+                # reverse_ws: OneBot 连接反向 WebSocket 推送事件, 同一连接也用于调用接口
+                'mode': 'webhook',
+                'ws_path': '/onebot/ws'
+            },
+            'dedup': {
+                # 按 (self_id, message_id) 丢弃重发的消息
+                'maxsize': 10000,
+                'ttl': 300
+            },
+            'plugins': {
+                # 每隔 poll_interval 秒检查 apps 下的文件, 只重载变化的模块
+                'path': 'apps',
+                'poll_interval': 2.0,
+                # 缓存各插件的 register() 内容, lazy 时未变化的插件在 triggers 首次命中时才导入
+                'manifest': os.path.join('AppData', 'plugin_manifest.json'),
+                'lazy': True
+            },
+            'queue': {
+                # 事件进入有界队列后立即返回, 由工作线程处理
+                # 按会话分配到 workers 个通道, 每个通道一个线程
+                'workers': 4,
+                'maxsize': 1000,
+                # 队列满时: block 等待空位, shed 丢弃事件, reject 返回 503
+                'overflow': 'block',
+                # 私聊和 @机器人 的消息优先; 连续处理 max_burst 个后, 或其他消息等待超过 max_wait 秒时, 处理一个其他消息
+                'max_burst': 8,
+                'max_wait': 30.0,
+                # 入队到处理完成的延迟目标(秒), 超过的计入 /stats 中的 slo_violations
+                'slo': {
+                    'addressed': 2.0,
+                    'background': 30.0
+                }
+            },
+            'admission': {
+                # 事件平均排队超过 soft_delay 秒时开始按比例跳过未 @机器人 的群消息的 quiet_function,
+                # 达到 hard_delay 秒时全部跳过; 消息仍会保存
+                'soft_delay': 5.0,
+                'hard_delay': 30.0
+            },
+            'storage': {
+                # 消息先放入缓冲区, 每 batch_size 条或最多 flush_interval 秒在一个事务中写入数据库
+                'write_behind': True,
+                'batch_size': 100,
+                'flush_interval': 0.05,
+                # 写入失败时指数退避重试, 连续失败 max_retries 次后丢弃该批; 缓冲区满 max_buffer 条时 add_message 等待
+                'max_buffer': 10000,
+                'max_retries': 5,
+                # WAL 日志, 读取不阻塞写入; 写入都由一个线程执行, 读取使用 readers 个连接
+                'wal': True,
+                'readers': 4
+            },
+            'rate_limit': {
+                # 启用后消息经限速队列发送, send_* 返回 Future; 删除本节或 enabled 为 False 时直接发送
+                'enabled': True,
+                'global_rate': 5.0,
+                'global_burst': 10,
+                'group_rate': 1.0,
+                'group_burst': 3,
+                'user_rate': 1.0,
+                'user_burst': 3,
+                'max_queue': 1000
             }
         }
         with open(config_path, 'w') as config_file:
@@ -67,65 +180,201 @@ def load_config():
         return default_config
 
 config = load_config()
-bot = QQBotAPI.QQBot(config['bot']['host'])
 
-# Initialize function list
-message_functions = []
-quiet_functions = []
-extern_call_functions = []
-regular_task_functions = []
+def create_send_scheduler(rate_limit_config):
+    """根据配置创建发送限速队列, 配置中没有 rate_limit 或未启用时返回None
+
+    启用后 send_* 返回 Future, 发送失败只在 Future 中体现, 不再抛给调用方。
+    """
+    if not rate_limit_config:
+        return None
+    options = dict(rate_limit_config)
+    if not options.pop('enabled', True):
+        return None
+    return SendScheduler(**options)
+
+ingest_mode = config.get('ingest', {}).get('mode', 'webhook')
+
+def create_transport(bot_config):
+    """反向 WebSocket 模式下使用 OneBot 连入的连接, 否则在配置了 ws_url 时创建正向 WebSocket 连接"""
+    if ingest_mode == 'reverse_ws':
+        # 事件由 dispatch_event 处理, 在下方定义
+        return ReverseWebSocketTransport(access_token=bot_config.get('access_token'), on_event=lambda event: dispatch_event(event))
+    if not bot_config.get('ws_url'):
+        return None
+    return ForwardWebSocketTransport(bot_config['ws_url'], access_token=bot_config.get('access_token')).start()
+
+send_scheduler = create_send_scheduler(config.get('rate_limit', {}))
+transport = create_transport(config['bot'])
+bot = QQBotAPI.QQBot(config['bot']['host'], send_scheduler, storage=config.get('storage', {}), transport=transport, **config['bot'].get('http', {}))
+
 # Import all modules from apps directory
-for _, name, _ in pkgutil.iter_modules(['apps']):
-    module = importlib.import_module(f'apps.{name}')
-    for function in module.functions:
-        if function.register()['type'] == 'message_function':
-            message_functions.append(function)
-        elif function.register()['type'] == 'quiet_function':
-            quiet_functions.append(function)
-        elif function.register()['type'] == 'regular_task_function':
-            regular_task_functions.append(function)
-        elif function.register()['type'] == 'extern_call_function':
-            extern_call_functions.append(function)
-            app.add_api_route(f"/extern_call/{function['name']}", function['function'], methods=["POST"])
-
-@app.post("/message")
+# 插件文件变化时只重载该模块, 见 PluginManager
+plugin_manager = PluginManager(**config.get('plugins', {}))
+plugin_manager.load_all()
+for function in plugin_manager.functions('extern_call_function'):
+    app.add_api_route(f"/extern_call/{function['name']}", function['function'], methods=["POST"])
+
+# 按 register() 中的 interval / cron 执行定时任务
+task_scheduler = TaskScheduler(bot)
+task_scheduler.add_all(plugin_manager.functions('regular_task_function'))
+
+def is_inline_event(message) -> bool:
+    """心跳等元事件处理很快, 直接处理, 不进入队列"""
+    return message["post_type"] == "meta_event"
+
 async def submit(request: Request):
     try:
         message = await request.json()
+    except ValueError:
+        return JSONResponse(status_code=400, content={"detail": "Invalid JSON"})
+    if not isinstance(message, dict) or "post_type" not in message:
+        return JSONResponse(status_code=400, content={"detail": "Not a OneBot event"})
+    if is_inline_event(message):
+        handle_event(message)
+        return Response(status_code=204)
+    if dedup.is_duplicate(message):
+        return Response(status_code=204)
+    try:
+        await event_queue.put(message)
+    except QueueFullError as e:
+        logger.warning(str(e))
+        # 允许 OneBot 重发该事件
+        dedup.forget(message)
+        return JSONResponse(status_code=503, content={"detail": "Event queue is full"})
+    return Response(status_code=204)
+
+def dispatch_event(message):
+    """反向 WebSocket 收到事件时在读取循环中调用, 不能等待队列空位"""
+    if not isinstance(message, dict) or "post_type" not in message:
+        logger.warning(f"Ignored invalid event: {message!r}")
+    elif is_inline_event(message):
+        handle_event(message)
+    elif not dedup.is_duplicate(message):
+        event_queue.offer(message)
+
+async def reverse_websocket(websocket: WebSocket):
+    await transport.serve(websocket)
+
+def handle_event(message):
+    """处理 OneBot 事件, webhook 和反向 WebSocket 共用"""
+    try:
         logger.debug(f"Received data: \n {json.dumps(message, indent=4, ensure_ascii=False)}")
         
         if message["post_type"] == "meta_event":
             if message["meta_event_type"] == "heartbeat":
-                pass
+                # 心跳作为后端存活信号
+                bot.api.circuit_breaker.record_heartbeat(message.get("status", {}))
         
         elif message["post_type"] == "message":
             process_message(message)
                 
     except Exception as e:
-        logger.error(f"Error processing request: {str(e)}")
+        logger.error(f"Error processing event: {str(e)}")
         logger.error(traceback.format_exc())
 
+def conversation_key(message):
+    """消息所属的会话: 群消息按群号, 私聊按发送者, 其他事件不限定通道"""
+    if message.get("post_type") != "message":
+        return None
+    if message.get("message_type") == "group":
+        return ("group", message.get("group_id"))
+    return ("private", message.get("user_id"))
+
+def is_addressed(message) -> bool:
+    """私聊或 @机器人 的群消息, 在解析消息链之前根据原始事件判断"""
+    if message.get("post_type") != "message":
+        return False
+    if message.get("message_type") != "group":
+        return True
+    self_id = str(message.get("self_id", bot.qq_id))
+    segments = message.get("message")
+    if isinstance(segments, str):
+        return f"[CQ:at,qq={self_id}" in segments
+    return any(segment.get("type") == "at" and str(segment.get("data", {}).get("qq")) == self_id
+               for segment in segments or [])
+
+def event_priority(message) -> int:
+    return PRIORITY_ADDRESSED if is_addressed(message) else PRIORITY_BACKGROUND
+
+# OneBot 重发的消息在入队前丢弃
+dedup = DedupWindow(**config.get('dedup', {}))
+
+# 同一会话的消息在同一通道中按顺序处理, 不同会话并行; 私聊和 @机器人 的消息先于其他群消息处理
+event_queue = EventQueue(handle_event, key=conversation_key, priority=event_priority, **config.get('queue', {}))
+
+# 过载时跳过群聊中的 quiet_function
+admission = AdmissionController(**config.get('admission', {}))
+
+if ingest_mode == 'reverse_ws':
+    app.add_api_websocket_route(config['ingest'].get('ws_path', '/onebot/ws'), reverse_websocket)
+else:
+    app.add_api_route("/message", submit, methods=["POST"])
+
+@app.get("/stats")
+async def stats():
+    """运行状态, 用于监控和调整限速参数"""
+    return {
+        'send_scheduler': send_scheduler.stats() if send_scheduler else None,
+        'retry_budget': DEFAULT_RETRY_BUDGET.stats(),
+        'circuit_breaker': bot.api.circuit_breaker.stats(),
+        'response_cache': bot.api.cache.stats(),
+        'single_flight': bot.api.single_flight.stats(),
+        'transport': transport.stats() if transport else None,
+        'event_queue': event_queue.stats(),
+        'admission': admission.stats(),
+        'dedup': dedup.stats(),
+        'storage': bot.MessageManager.stats(),
+        'router': {'message': plugin_manager.message_router.stats(), 'quiet': plugin_manager.quiet_router.stats()},
+        'plugins': plugin_manager.stats(),
+        'functions': DEFAULT_FUNCTION_RUNNER.stats(),
+        'spans': SPAN_METRICS.stats(),
+        'regular_tasks': task_scheduler.stats()
+    }
+
 def process_message(message):
-    message_chain = ReceivedMessageChain(message)
-    bot.MessageManager.add_message(message_chain)
+    # 追踪上下文随 contextvars 传到 Resolver、插件和接口请求中, 记录各阶段耗时
+    admission.observe(queue_delay())
+    with start_trace() as trace:
+        try:
+            resolve_message(message)
+        finally:
+            logger.info(f"Message {message.get('message_id')} processed in "
+                        f"{(time.monotonic() - trace.started) * 1000:.1f}ms: {trace.format_spans()}")
+
+def resolve_message(message):
+    with span('parse'):
+        message_chain = ReceivedMessageChain(message)
+    with span('store'):
+        bot.MessageManager.add_message(message_chain)
+    
+    if not bot.api.circuit_breaker.available():
+        # 后端不可用时回复也发不出去, 只保存消息
+        logger.warning(f"OneBot backend unavailable, skip resolving message {message_chain.get_message_id()}")
+        return
             
     # 正常的消息处理流程
     logger.info(f"检测是否需要Resolver: {message_chain.get_message_id()}")
+    # 取一次当前的插件集合, 处理期间发生的重载不影响本条消息
+    plugins = plugin_manager.plugins
     resolver = None
     if message_chain.is_group:
         for msg in message_chain.message:
             if isinstance(msg, AtMessage) and msg == bot.qq_id:
-                resolver = Resolver(message_chain, bot, message_functions,is_quiet_function=False)
+                resolver = Resolver(message_chain, bot, plugins.message_router, is_quiet_function=False)
                 break
         if resolver == None:
+            if not admission.admit(message_chain.get_group().get_group_id()):
+                logger.info(f"Overloaded, skip quiet functions for message {message_chain.get_message_id()} in group {message_chain.get_group().get_group_id()}")
+                return
             logger.info(f"Message {message_chain.get_message_id()} is not for me {bot.qq_id} in group, searching for quiet functions")
-            resolver = Resolver(message_chain, bot, quiet_functions, is_quiet_function=True)
+            resolver = Resolver(message_chain, bot, plugins.quiet_router, is_quiet_function=True)
     else:
-        resolver = Resolver(message_chain, bot, message_functions, is_quiet_function=False)
+        resolver = Resolver(message_chain, bot, plugins.message_router, is_quiet_function=False)
         
 
     
 
 # 运行应用
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000,reload_dirs=["./apps"])
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,332 @@
+import asyncio
+import importlib
+import importlib.util
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional, Type
+from QQBotAPI.trace import SPAN_METRICS
+from src.func_template import FunctionTemplate
+from src.router import TriggerRouter
+
+FUNCTION_TYPES = ('message_function', 'quiet_function', 'regular_task_function', 'extern_call_function')
+
+
+class LazyFunction:
+    """尚未导入的功能的占位类, 由 PluginManager 根据清单生成
+
+    register() 直接返回清单中记录的内容; 首次调用 check() 或构造实例时才导入插件模块,
+    之后转交给真正的功能类。__module__ / __qualname__ 与真正的功能类相同, 子进程可按其导入。
+    """
+    _manager = None
+    _registration = None
+    _loaded = None
+
+    def __new__(cls, *args, **kwargs):
+        return cls.load()(*args, **kwargs)
+
+    @classmethod
+    def register(cls) -> dict:
+        return cls._registration
+
+    @classmethod
+    def check(cls, message):
+        return cls.load().check(message)
+
+    @classmethod
+    def load(cls) -> Type[FunctionTemplate]:
+        if cls._loaded is None:
+            cls._loaded = cls._manager._load_lazy(cls.__module__, cls.__qualname__)
+        return cls._loaded
+
+
+class PluginSet:
+    """某一时刻加载的全部功能, 创建后不再修改
+
+    重载时构造新的 PluginSet 并整体替换, 处理中的消息继续使用它取到的那一份。
+    """
+    def __init__(self, modules: Dict[str, List[Type[FunctionTemplate]]]):
+        self.modules = modules
+        self.functions = {function_type: [] for function_type in FUNCTION_TYPES}
+        for functions in modules.values():
+            for function in functions:
+                self.functions[function.register()['type']].append(function)
+        self.message_router = TriggerRouter(self.functions['message_function'])
+        self.quiet_router = TriggerRouter(self.functions['quiet_function'])
+
+
+class PluginManager:
+    """加载 apps 下的插件, 并在文件变化时只重载变化的模块
+
+    按 poll_interval 秒检查插件文件的修改时间。变化的模块用 importlib 重新执行为新的模块对象,
+    包插件的子模块随包一起重新导入; 成功后替换 sys.modules 中的模块并整体切换 PluginSet,
+    导入或注册失败时恢复旧模块及其子模块, 旧版本继续运行。
+    机器人状态、缓存和连接不受影响。定时任务随之从 scheduler 中移除或添加。
+    extern_call_function 的路由只在启动时注册, 重载后需重启才能更新。
+
+    设置 manifest 时, 每个模块的功能类型、名称和 register() 内容连同文件签名缓存在该文件中。
+    lazy 为真时, 文件未变化的模块在启动时不导入, 而是用 LazyFunction 占位,
+    直到其 triggers 首次命中(或定时任务首次执行)时才导入, 导入耗时记入 cold_imports。
+    含 extern_call_function 或 register() 无法写入 JSON 的模块总是在启动时导入。
+
+    参数:
+        path (str): 插件目录
+        package (str): 插件目录对应的包名
+        poll_interval (float): 检查间隔(秒)
+        manifest (str): 清单文件路径, 为 None 时不使用清单
+        lazy (bool): 是否按清单延迟导入
+    """
+    def __init__(self, path: str = 'apps', package: str = 'apps', poll_interval: float = 2.0,
+                 manifest: Optional[str] = None, lazy: bool = False):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.package = package
+        self.poll_interval = poll_interval
+        self.manifest_path = manifest
+        self.lazy = lazy and manifest is not None
+        self._manifest = {}
+        self._lazy_lock = threading.Lock()
+        self.cold_imports = {}
+        self.plugins = PluginSet({})
+        self.scheduler = None
+        self._signatures = {}
+        self._task = None
+        self.reloads = 0
+        self.failures = 0
+        self.errors = {}
+
+    @property
+    def message_router(self) -> TriggerRouter:
+        return self.plugins.message_router
+
+    @property
+    def quiet_router(self) -> TriggerRouter:
+        return self.plugins.quiet_router
+
+    def functions(self, function_type: str) -> List[Type[FunctionTemplate]]:
+        return self.plugins.functions[function_type]
+
+    def _scan(self) -> Dict[str, tuple]:
+        """插件模块名 -> 文件签名(最新修改时间, 文件数), 包按其中所有 .py 文件计算"""
+        signatures = {}
+        if not os.path.isdir(self.path):
+            return signatures
+        for entry in os.scandir(self.path):
+            if entry.name.startswith(('_', '.')):
+                continue
+            if entry.is_file() and entry.name.endswith('.py'):
+                signatures[entry.name[:-3]] = (entry.stat().st_mtime_ns, 1)
+            elif entry.is_dir() and os.path.isfile(os.path.join(entry.path, '__init__.py')):
+                mtimes = [os.stat(os.path.join(root, name)).st_mtime_ns
+                          for root, _, files in os.walk(entry.path) for name in files if name.endswith('.py')]
+                signatures[entry.name] = (max(mtimes), len(mtimes))
+        return signatures
+
+    def _import(self, name: str, reload: bool) -> List[Type[FunctionTemplate]]:
+        """导入插件模块并校验其功能, 失败时抛出异常且不影响已加载的版本"""
+        full_name = f'{self.package}.{name}'
+        if not reload:
+            module = importlib.import_module(full_name)
+            return self._validate(full_name, module)
+        importlib.invalidate_caches()
+        spec = importlib.util.find_spec(full_name)
+        if spec is None:
+            raise ImportError(f"Plugin module {full_name} not found")
+        # 包插件的子模块也要重新导入, 否则 from .sub import ... 仍得到旧版本
+        previous = {key: sys.modules.pop(key) for key in list(sys.modules)
+                    if key == full_name or key.startswith(full_name + '.')}
+        # 在新的模块对象中执行, 失败时恢复旧模块及其子模块, 旧模块的命名空间保持不变
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[full_name] = module
+        try:
+            spec.loader.exec_module(module)
+            functions = self._validate(full_name, module)
+        except BaseException:
+            for key in [key for key in sys.modules if key == full_name or key.startswith(full_name + '.')]:
+                del sys.modules[key]
+            sys.modules.update(previous)
+            raise
+        setattr(sys.modules[self.package], name, module)
+        return functions
+
+    @staticmethod
+    def _validate(full_name: str, module) -> List[Type[FunctionTemplate]]:
+        functions = list(module.functions)
+        for function in functions:
+            function_type = function.register()['type']
+            if function_type not in FUNCTION_TYPES:
+                raise ValueError(f"Unknown function type {function_type!r} in {full_name}")
+        # 提前编译 triggers, 声明有误时视为加载失败
+        TriggerRouter(functions)
+        return functions
+
+    def load_all(self) -> PluginSet:
+        """启动时加载全部插件, 单个插件失败时跳过"""
+        self._signatures = self._scan()
+        self._manifest = self._read_manifest()
+        modules = {}
+        deferred = 0
+        for name in sorted(self._signatures):
+            entry = self._manifest.get(name)
+            if self.lazy and entry is not None and entry['signature'] == list(self._signatures[name]) and entry['lazy']:
+                modules[name] = [self._lazy_function(name, function) for function in entry['functions']]
+                deferred += 1
+                continue
+            try:
+                modules[name] = self._import(name, reload=False)
+            except Exception as e:
+                self._record_failure(name, e)
+                continue
+            self._update_manifest(name, modules[name])
+        self._manifest = {name: entry for name, entry in self._manifest.items() if name in self._signatures}
+        self._write_manifest()
+        self.plugins = PluginSet(modules)
+        self.logger.info(f"Loaded {len(modules)} plugin modules, {deferred} deferred until first use")
+        return self.plugins
+
+    def _read_manifest(self) -> dict:
+        if self.manifest_path is None or not os.path.isfile(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable plugin manifest {self.manifest_path}: {str(e)}")
+            return {}
+        if manifest.get('package') != self.package:
+            return {}
+        return manifest.get('modules', {})
+
+    def _write_manifest(self):
+        if self.manifest_path is None:
+            return
+        directory = os.path.dirname(self.manifest_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as manifest_file:
+            json.dump({'package': self.package, 'modules': self._manifest}, manifest_file, ensure_ascii=False, indent=1)
+        os.replace(temp_path, self.manifest_path)
+
+    def _update_manifest(self, name: str, functions: List[Type[FunctionTemplate]]):
+        """记录刚导入的模块的功能, 供下次启动延迟导入"""
+        if self.manifest_path is None:
+            return
+        entries = [{'qualname': function.__qualname__, 'register': function.register()} for function in functions]
+        try:
+            json.dumps(entries)
+            lazy = all(entry['register']['type'] != 'extern_call_function' for entry in entries)
+        except (TypeError, ValueError):
+            entries, lazy = [], False
+        self._manifest[name] = {'signature': list(self._signatures[name]), 'lazy': lazy, 'functions': entries}
+
+    def _lazy_function(self, name: str, entry: dict) -> Type[LazyFunction]:
+        return type(entry['qualname'].rsplit('.', 1)[-1], (LazyFunction,), {
+            '__module__': f'{self.package}.{name}',
+            '__qualname__': entry['qualname'],
+            '_manager': self,
+            '_registration': entry['register']
+        })
+
+    def _load_lazy(self, module_name: str, qualname: str) -> Type[FunctionTemplate]:
+        """导入延迟加载的模块并返回其中的功能类"""
+        with self._lazy_lock:
+            cold = module_name not in sys.modules
+            started = time.monotonic()
+            function = importlib.import_module(module_name)
+            for attribute in qualname.split('.'):
+                function = getattr(function, attribute)
+            if cold:
+                elapsed = time.monotonic() - started
+                self.cold_imports[module_name] = round(elapsed * 1000, 3)
+                SPAN_METRICS.record('plugin_import', elapsed)
+                self.logger.info(f"Plugin module {module_name} imported on first use in {elapsed * 1000:.1f}ms")
+            return function
+
+    def check(self) -> tuple:
+        """检查文件变化并重载变化的模块
+
+        返回:
+            tuple: (移除的功能, 新增的功能), 供更新定时任务
+        """
+        signatures = self._scan()
+        if signatures == self._signatures:
+            return [], []
+        modules = dict(self.plugins.modules)
+        for name in set(self._signatures) - set(signatures):
+            modules.pop(name, None)
+            self._manifest.pop(name, None)
+            for key in [key for key in sys.modules if key == f'{self.package}.{name}'
+                        or key.startswith(f'{self.package}.{name}.')]:
+                del sys.modules[key]
+            self.logger.info(f"Plugin module {name} removed")
+        for name, signature in signatures.items():
+            if self._signatures.get(name) == signature:
+                continue
+            started = time.monotonic()
+            try:
+                modules[name] = self._import(name, reload=f'{self.package}.{name}' in sys.modules)
+            except Exception as e:
+                # 保留旧版本
+                self._record_failure(name, e)
+                continue
+            self.reloads += 1
+            self.errors.pop(name, None)
+            self._signatures[name] = signature
+            self._update_manifest(name, modules[name])
+            self.logger.info(f"Plugin module {name} reloaded in {(time.monotonic() - started) * 1000:.1f}ms")
+        self._signatures = signatures
+        self._write_manifest()
+        old = self.plugins
+        self.plugins = PluginSet(modules)
+        removed = [f for f in old.functions['regular_task_function'] if f not in self.plugins.functions['regular_task_function']]
+        added = [f for f in self.plugins.functions['regular_task_function'] if f not in old.functions['regular_task_function']]
+        return removed, added
+
+    def _record_failure(self, name: str, error: Exception):
+        self.failures += 1
+        self.errors[name] = str(error)
+        self.logger.error(f"Failed to load plugin module {name}, keeping the previous version: {str(error)}")
+        self.logger.error("".join(traceback.format_exception(error)))
+
+    def start(self, scheduler=None):
+        """在当前事件循环中开始监视插件目录, 定时任务的变化同步到 scheduler"""
+        self.scheduler = scheduler
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                # 导入插件可能较慢, 在线程中执行
+                removed, added = await asyncio.to_thread(self.check)
+            except Exception as e:
+                self.logger.error(f"Error checking plugins: {str(e)}")
+                continue
+            if self.scheduler is not None:
+                for function in removed:
+                    self.scheduler.remove(function)
+                self.scheduler.add_all(added)
+
+    def stats(self) -> dict:
+        return {
+            'modules': len(self.plugins.modules),
+            'functions': {function_type: len(functions) for function_type, functions in self.plugins.functions.items()},
+            'reloads': self.reloads,
+            'deferred': sum(1 for functions in self.plugins.modules.values() for function in functions
+                            if isinstance(function, type) and issubclass(function, LazyFunction) and function._loaded is None),
+            'cold_imports_ms': dict(self.cold_imports),
+            'failures': self.failures,
+            'errors': dict(self.errors)
+        }
@@ -0,0 +1,147 @@
+import importlib
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Type
+from QQBotAPI.message import ReceivedMessageChain
+from src.func_template import FunctionTemplate
+
+
+class BotProxy:
+    """子进程中代替 QQBot 传给功能的对象
+
+    发送类调用(send_*)只被记录, 任务结束后由主进程按顺序在真正的 QQBot 上执行;
+    qq_id / nickname 为主进程中的值。其他接口(读取数据库、查询接口等)在子进程中不可用,
+    需要这些数据的功能不应声明 cpu_bound。
+    """
+    def __init__(self, qq_id, nickname):
+        self.qq_id = qq_id
+        self.nickname = nickname
+        self.calls = []
+
+    def __getattr__(self, name):
+        if not name.startswith('send_'):
+            raise AttributeError(f"QQBot.{name} is not available in cpu_bound functions, only send_* calls are proxied")
+
+        def record(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+        return record
+
+
+def _run_in_worker(module: str, qualname: str, snapshot: Optional[dict], qq_id, nickname):
+    """在子进程中执行功能, 返回 (process() 的结果, 记录的发送调用)
+
+    snapshot 为 None 时(定时任务)功能以 msg=None 构造。
+    """
+    function = importlib.import_module(module)
+    for name in qualname.split('.'):
+        function = getattr(function, name)
+    proxy = BotProxy(qq_id, nickname)
+    message = ReceivedMessageChain.json_from_db(snapshot) if snapshot is not None else None
+    result = function(message, proxy).process()
+    return result, proxy.calls
+
+
+class ProcessPoolRunner:
+    """在进程池中执行 register() 声明了 cpu_bound 的功能, 避免 CPU 密集的插件因 GIL 拖慢消息接收
+
+    消息以 get_json_for_db() 的快照传入子进程后重建; 功能类按模块路径在子进程中导入,
+    因此必须定义在模块顶层。子进程中 QQBot 由 BotProxy 代替, 发送在任务完成后由主进程执行。
+
+    每个子进程最多执行 max_tasks_per_child 个任务后被替换, 避免内存持续增长。
+    任务超时或子进程崩溃时重建进程池, 此时同时在执行的其他任务也会失败。
+
+    参数:
+        max_workers (int): 子进程数
+        max_tasks_per_child (int): 子进程被替换前最多执行的任务数
+    """
+    def __init__(self, max_workers: int = 2, max_tasks_per_child: int = 100):
+        self.logger = logging.getLogger(__name__)
+        self.max_workers = max_workers
+        self.max_tasks_per_child = max_tasks_per_child
+        self._executor = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.recycles = 0
+        self.proxied_sends = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    max_tasks_per_child=self.max_tasks_per_child
+                )
+            return self._executor
+
+    def _recycle(self, executor: ProcessPoolExecutor, reason: str):
+        """终止子进程并丢弃进程池, 下一个任务会创建新的进程池"""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self.recycles += 1
+        self.logger.warning(f"Recycling process pool: {reason}")
+        # ProcessPoolExecutor 无法取消已开始的任务, 只能终止子进程
+        for process in list((getattr(executor, '_processes', None) or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, function: Type[FunctionTemplate], message: Optional[ReceivedMessageChain], bot, timeout: Optional[float] = None):
+        """在子进程中执行 function(message, bot).process(), 并在当前线程中执行其发送
+
+        message 为 None 时(定时任务)子进程中同样以 None 构造功能。
+
+        返回:
+            process() 的返回值, 需可 pickle
+
+        异常:
+            TimeoutError: 超时, 进程池被重建
+            process() 抛出的异常
+        """
+        executor = self._get_executor()
+        self.submitted += 1
+        try:
+            future = executor.submit(_run_in_worker, function.__module__, function.__qualname__,
+                                     message.get_json_for_db() if message is not None else None,
+                                     bot.qq_id, getattr(bot, 'nickname', None))
+            result, calls = future.result(timeout)
+        except FutureTimeoutError:
+            self.timeouts += 1
+            self._recycle(executor, f"{function.register()['name']} timed out after {timeout}s")
+            raise TimeoutError(f"Function {function.register()['name']} timed out after {timeout}s") from None
+        except BrokenProcessPool as e:
+            self.failed += 1
+            self._recycle(executor, f"worker died: {str(e)}")
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        for name, args, kwargs in calls:
+            getattr(bot, name)(*args, **kwargs)
+        self.proxied_sends += len(calls)
+        self.completed += 1
+        return result
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            'max_workers': self.max_workers,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'timeouts': self.timeouts,
+            'recycles': self.recycles,
+            'proxied_sends': self.proxied_sends
+        }
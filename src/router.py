@@ -0,0 +1,140 @@
+import re
+from typing import List, Type
+from QQBotAPI.message import *
+from src.func_template import FunctionTemplate
+
+# 消息段类 -> OneBot 消息段类型名
+SEGMENT_TYPES = {
+    TextMessage: 'text',
+    ImageMessage: 'image',
+    BuildInFaceMessage: 'face',
+    AtMessage: 'at',
+    FileMessage: 'file',
+    VoiceMessage: 'voice',
+    JsonMessage: 'json',
+    ReplyFlag: 'reply',
+}
+
+# register() 中 triggers 支持的键
+TRIGGER_KEYS = ('commands', 'prefixes', 'regex', 'segments', 'groups')
+
+
+class _PrefixTrie:
+    """按字符建立的前缀树, 一次遍历文本即可找出所有匹配的前缀"""
+    def __init__(self):
+        self._root = {}
+
+    def add(self, prefix: str, index: int):
+        node = self._root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node.setdefault(None, []).append(index)
+
+    def match(self, text: str) -> list:
+        found = []
+        node = self._root
+        found.extend(node.get(None, ()))
+        for char in text:
+            node = node.get(char)
+            if node is None:
+                break
+            found.extend(node.get(None, ()))
+        return found
+
+
+class TriggerRouter:
+    """按触发条件索引功能, 只对可能命中的功能调用 check()
+
+    功能可以在 register() 中声明 triggers, 加载时编译为索引:
+        - commands: 文本的第一个词等于其中之一(哈希表)
+        - prefixes: 文本以其中之一开头(前缀树)
+        - regex: 文本能被其中之一 search 到
+        - segments: 消息包含其中任一类型的消息段, 如 'image'、'file'
+        - groups: 只在这些群中响应(白名单, 与上面的条件同时满足), 私聊不响应
+
+    文本为 text_only() 去掉首尾空白后的结果。commands / prefixes / regex / segments 任一命中即为候选;
+    都未声明时, 只要满足 groups 即为候选。候选功能仍需 check() 通过才算命中。
+    未声明 triggers 的旧功能对每条消息都是候选。
+
+    参数:
+        functions (list): 功能类列表, 结果保持列表中的顺序
+    """
+    def __init__(self, functions: List[Type[FunctionTemplate]]):
+        self.functions = list(functions)
+        self._legacy = []
+        self._commands = {}
+        self._prefixes = _PrefixTrie()
+        self._regex = []
+        self._segments = {}
+        self._any_text = []
+        self._groups = {}
+        for index, function in enumerate(self.functions):
+            triggers = function.register().get('triggers')
+            if not triggers:
+                self._legacy.append(index)
+                continue
+            unknown = set(triggers) - set(TRIGGER_KEYS)
+            if unknown:
+                raise ValueError(f"Unknown triggers {sorted(unknown)} in function {function.register()['name']}")
+            if triggers.get('groups'):
+                self._groups[index] = {int(group) for group in triggers['groups']}
+            matchers = False
+            for command in triggers.get('commands', ()):
+                self._commands.setdefault(command, []).append(index)
+                matchers = True
+            for prefix in triggers.get('prefixes', ()):
+                self._prefixes.add(prefix, index)
+                matchers = True
+            for pattern in triggers.get('regex', ()):
+                self._regex.append((re.compile(pattern), index))
+                matchers = True
+            for segment in triggers.get('segments', ()):
+                self._segments.setdefault(segment, []).append(index)
+                matchers = True
+            if not matchers:
+                # 只声明了 groups
+                self._any_text.append(index)
+        self.messages = 0
+        self.checked = 0
+
+    def candidates(self, message: ReceivedMessageChain) -> List[Type[FunctionTemplate]]:
+        """返回需要调用 check() 的功能, 保持注册顺序"""
+        text = message.text_only().strip()
+        found = set(self._legacy)
+        found.update(self._any_text)
+        if self._commands and text:
+            found.update(self._commands.get(text.split(maxsplit=1)[0], ()))
+        found.update(self._prefixes.match(text))
+        for pattern, index in self._regex:
+            if index not in found and pattern.search(text):
+                found.add(index)
+        if self._segments:
+            for segment in {SEGMENT_TYPES.get(type(msg)) for msg in message.message}:
+                found.update(self._segments.get(segment, ()))
+        if self._groups:
+            group = message.get_group()
+            group_id = group.get_group_id() if group is not None else None
+            found = {index for index in found if index not in self._groups or group_id in self._groups[index]}
+        return [self.functions[index] for index in sorted(found)]
+
+    def match(self, message: ReceivedMessageChain) -> list:
+        """返回 [(功能, check() 的结果)], 只包含 check() 通过的功能"""
+        self.messages += 1
+        matched = []
+        for function in self.candidates(message):
+            self.checked += 1
+            res = function.check(message)
+            if res != "" and res != False and res != None:
+                matched.append((function, res))
+        return matched
+
+    def __len__(self):
+        return len(self.functions)
+
+    def stats(self) -> dict:
+        return {
+            'functions': len(self.functions),
+            'legacy': len(self._legacy),
+            'messages': self.messages,
+            'checked': self.checked
+        }
@@ -0,0 +1,281 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from typing import List, Type
+from QQBotAPI.trace import start_trace
+from src.func_template import FunctionTemplate
+from src.function_runner import DEFAULT_FUNCTION_RUNNER, FunctionRunner
+
+# 上一次执行未结束时到达执行时间的处理方式
+OVERLAP_SKIP = 'skip'     # 跳过本次
+OVERLAP_QUEUE = 'queue'   # 上一次结束后立即补执行一次
+OVERLAP_ALLOW = 'allow'   # 同时执行
+
+
+class CronExpression:
+    """五段式 cron 表达式: 分 时 日 月 周
+
+    每段支持 *、数字、a-b、a,b 和步长 */n、a-b/n。周日为 0 或 7。
+    日和周都不是 * 时, 满足其一即可(与 crontab 相同)。按本地时间计算。
+    """
+    _RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse(field, low, high) for field, (low, high) in zip(fields, self._RANGES))
+        self.weekdays = {day % 7 for day in weekdays}
+        self._any_day = fields[2] == '*'
+        self._any_weekday = fields[4] == '*'
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int) -> set:
+        values = set()
+        for part in field.split(','):
+            step = 1
+            if '/' in part:
+                part, step = part.split('/')
+                step = int(step)
+            if part == '*':
+                start, end = low, high
+            elif '-' in part:
+                start, end = (int(value) for value in part.split('-'))
+            else:
+                start = end = int(part)
+                if step != 1:
+                    end = high
+            if not (low <= start <= end <= high) or step < 1:
+                raise ValueError(f"Invalid cron field: {field!r}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._any_day:
+            return weekday
+        if self._any_weekday:
+            return day
+        return day or weekday
+
+    def next_after(self, moment: datetime) -> datetime:
+        """moment 之后(不含)的第一个执行时间"""
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 5)
+        while moment < limit:
+            if moment.month not in self.months:
+                month = moment.month % 12 + 1
+                moment = moment.replace(year=moment.year + (month == 1), month=month, day=1, hour=0, minute=0)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Cron expression never fires: {self.expression!r}")
+
+
+class _Job:
+    """一个定时任务的计划和执行状态, 时间均为 time.time() 秒数"""
+    def __init__(self, function: Type[FunctionTemplate], registration: dict):
+        self.function = function
+        self.name = registration['name']
+        self.interval = registration.get('interval')
+        self.cron = CronExpression(registration['cron']) if registration.get('cron') else None
+        if (self.interval is None) == (self.cron is None):
+            raise ValueError(f"Regular task {self.name} must declare exactly one of 'interval' and 'cron'")
+        self.jitter = registration.get('jitter', 0)
+        self.misfire_grace = registration.get('misfire_grace')
+        self.coalesce = registration.get('coalesce', True)
+        self.overlap = registration.get('overlap', OVERLAP_SKIP)
+        if self.overlap not in (OVERLAP_SKIP, OVERLAP_QUEUE, OVERLAP_ALLOW):
+            raise ValueError(f"Unknown overlap policy {self.overlap!r} in regular task {self.name}")
+        self.fire_at = None
+        self.run_at = None
+        self.removed = False
+        self.running = 0
+        self.queued = False
+        self.runs = 0
+        self.failures = 0
+        self.missed = 0
+        self.coalesced = 0
+        self.overlaps = 0
+        self.last_run = None
+        self.last_duration = None
+        self.last_error = None
+
+    def next_fire(self, after: float) -> float:
+        """after 之后(不含)的第一个计划时间"""
+        if self.interval is not None:
+            if self.fire_at is None:
+                return after + self.interval
+            periods = max(0, int((after - self.fire_at) // self.interval)) + 1
+            return self.fire_at + periods * self.interval
+        return self.cron.next_after(datetime.fromtimestamp(after)).timestamp()
+
+    def schedule(self, fire_at: float):
+        self.fire_at = fire_at
+        # 抖动只加在实际执行时间上, 不影响之后的计划
+        self.run_at = fire_at + (random.uniform(0, self.jitter) if self.jitter else 0)
+
+    def stats(self) -> dict:
+        return {
+            'schedule': self.cron.expression if self.cron else f"every {self.interval}s",
+            'next_run': self.run_at,
+            'last_run': self.last_run,
+            'last_duration': self.last_duration,
+            'last_error': self.last_error,
+            'running': self.running,
+            'runs': self.runs,
+            'failures': self.failures,
+            'missed': self.missed,
+            'coalesced': self.coalesced,
+            'overlaps': self.overlaps
+        }
+
+
+class TaskScheduler:
+    """执行 regular_task_function 的 asyncio 调度器
+
+    register() 中声明执行计划:
+        - interval: 每隔多少秒执行一次; 或 cron: 五段式 cron 表达式, 二者选一
+        - jitter: 每次执行随机推迟 0~jitter 秒, 避免大量任务同时请求后端, 默认 0
+        - misfire_grace: 执行时间已过去超过该秒数时放弃本次(计入 missed), 默认不限
+        - coalesce: 错过多次执行时只补执行一次(计入 coalesced), 为 False 时逐次补执行, 默认 True
+        - overlap: 上一次未结束时的处理方式, 见 OVERLAP_*, 默认 skip
+
+    所有任务按下次执行时间放在一个堆中, 调度协程只在最早的任务到期时醒来, 空闲时没有开销。
+    任务经 FunctionRunner 执行(功能以 msg=None 构造), 同样受 timeout / max_concurrency / cpu_bound 约束。
+
+    参数:
+        bot: 传给任务的 QQBot
+        runner (FunctionRunner): 执行任务的 runner
+    """
+    def __init__(self, bot, runner: FunctionRunner = None):
+        self.logger = logging.getLogger(__name__)
+        self.bot = bot
+        self.runner = runner or DEFAULT_FUNCTION_RUNNER
+        self._jobs = []
+        self._heap = []
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._task = None
+        self._running = set()
+
+    def add(self, function: Type[FunctionTemplate]):
+        """添加任务, 计划有误时抛出 ValueError"""
+        job = _Job(function, function.register())
+        job.schedule(job.next_fire(time.time()))
+        self._jobs.append(job)
+        heapq.heappush(self._heap, (job.run_at, next(self._seq), job))
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    def remove(self, function: Type[FunctionTemplate]):
+        """移除任务, 已在执行的不受影响; 堆中的条目在到期时丢弃"""
+        for job in [job for job in self._jobs if job.function is function]:
+            job.removed = True
+            self._jobs.remove(job)
+
+    def add_all(self, functions: List[Type[FunctionTemplate]]):
+        for function in functions:
+            try:
+                self.add(function)
+            except ValueError as e:
+                self.logger.error(f"Regular task {function.register()['name']} not scheduled: {str(e)}")
+
+    def start(self):
+        """在当前事件循环中启动调度协程"""
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())
+        self.logger.info(f"Task scheduler started with {len(self._jobs)} jobs")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        for task in list(self._running):
+            task.cancel()
+        await asyncio.gather(self._task, *self._running, return_exceptions=True)
+        self._task = None
+
+    async def _loop(self):
+        while True:
+            self._wakeup.clear()
+            delay = self._heap[0][0] - time.time() if self._heap else None
+            if delay is None or delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, _, job = heapq.heappop(self._heap)
+            if job.removed:
+                continue
+            self._fire(job, time.time())
+            heapq.heappush(self._heap, (job.run_at, next(self._seq), job))
+
+    def _fire(self, job: _Job, now: float):
+        """到期的任务: 按策略决定是否执行, 并计划下一次"""
+        late = now - job.run_at
+        if job.misfire_grace is not None and late > job.misfire_grace:
+            job.missed += 1
+            self.logger.warning(f"Regular task {job.name} missed its run by {late:.1f}s")
+        elif job.running and job.overlap != OVERLAP_ALLOW:
+            job.overlaps += 1
+            if job.overlap == OVERLAP_QUEUE:
+                job.queued = True
+            else:
+                self.logger.warning(f"Regular task {job.name} is still running, run skipped")
+        else:
+            self._start_run(job)
+        if job.coalesce:
+            next_fire = job.next_fire(now)
+            if job.interval is not None:
+                job.coalesced += round((next_fire - job.fire_at) / job.interval) - 1
+            else:
+                skipped = job.next_fire(job.fire_at)
+                while skipped < next_fire:
+                    job.coalesced += 1
+                    skipped = job.next_fire(skipped)
+        else:
+            next_fire = job.next_fire(job.fire_at)
+        job.schedule(next_fire)
+
+    def _start_run(self, job: _Job):
+        job.running += 1
+        task = asyncio.create_task(self._run(job))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, job: _Job):
+        started = time.monotonic()
+        job.last_run = time.time()
+        try:
+            with start_trace():
+                await self.runner.arun(job.function, None, self.bot)
+            job.last_error = None
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e)
+            self.logger.error(f"Regular task {job.name} failed: {str(e)}")
+        finally:
+            job.runs += 1
+            job.running -= 1
+            job.last_duration = time.monotonic() - started
+        if job.queued and not job.running and not job.removed:
+            job.queued = False
+            self._start_run(job)
+
+    def stats(self) -> dict:
+        return {job.name: job.stats() for job in self._jobs}
@@ -1,5 +1,6 @@
 import pytest
 import logging
+from QQBotAPI.message import ReceivedMessageChain
 
 @pytest.fixture(autouse=True)
 def disable_logging():
@@ -7,3 +8,64 @@ def disable_logging():
     logging.disable(logging.CRITICAL)
     yield
     logging.disable(logging.NOTSET)
+
+
+@pytest.fixture
+def onebot_server():
+    """本地 OneBot HTTP 替身服务"""
+    from onebot_stub import OneBotStub
+    server = OneBotStub().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def onebot_ws_server():
+    """本地 OneBot 正向 WebSocket 替身服务"""
+    from onebot_stub import OneBotWebSocketStub
+    server = OneBotWebSocketStub().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def make_message():
+    """构造收到的文本消息, group_id 为 None 时为私聊, segments 为追加在文本后的消息段"""
+    def make(text='hi', message_id=1, group_id=None, user_id=2, time=0, segments=()):
+        raw = {
+            "self_id": 10000, "time": time, "message_type": "group" if group_id else "private",
+            "message_id": message_id, "message_seq": message_id,
+            "sender": {"user_id": user_id, "nickname": "n", "card": ""},
+            "message": [{"type": "text", "data": {"text": text}}, *segments]
+        }
+        if group_id:
+            raw["group_id"] = group_id
+        return ReceivedMessageChain(raw)
+    return make
+
+
+@pytest.fixture
+def make_function():
+    """构造功能类
+
+    process 为功能的 process 方法, check(msg) 的返回值作为 check() 的结果, 调用次数记在 calls 上,
+    其余关键字参数并入 register() 的返回值
+    """
+    def make(name, process=None, function_type='quiet_function', check=lambda msg: "hit", **registration):
+        registration.update({'type': function_type, 'name': name})
+        return type(name, (), {
+            'calls': 0,
+            '__init__': lambda self, msg, bot: None,
+            'register': classmethod(lambda cls: registration),
+            'check': classmethod(lambda cls, msg: (setattr(cls, 'calls', cls.calls + 1), check(msg))[1]),
+            'process': process
+        })
+    return make
+
+
+@pytest.fixture
+def make_task(make_function):
+    """构造定时任务类, 参数同 make_function"""
+    def make(name, process=None, **registration):
+        return make_function(name, process, function_type='regular_task_function', **registration)
+    return make
@@ -0,0 +1,164 @@
+"""本地的 OneBot HTTP / WebSocket 替身服务, 供测试和性能测试使用"""
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import websockets
+import websockets.asyncio.server
+
+
+class OneBotStub:
+    """模拟 OneBot v11 HTTP API 的最小服务
+
+    每个 action 默认返回 ``{"status": "ok", "data": {}}``,
+    可通过 ``responses`` 指定某个 action 的返回数据, 或通过 ``handlers`` 指定处理函数。
+    """
+    def __init__(self, host='127.0.0.1', port=0):
+        self.responses = {
+            'get_login_info': {'user_id': 10000, 'nickname': 'stub'},
+            'get_friend_list': [],
+        }
+        self.handlers = {}
+        self.calls = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def _reply(self, params):
+                action = self.path.split('?', 1)[0].strip('/')
+                with stub._lock:
+                    stub.calls.append((action, params))
+                if action in stub.handlers:
+                    status, body = stub.handlers[action](params)
+                else:
+                    status, body = 200, {'status': 'ok', 'retcode': 0, 'data': stub.responses.get(action, {})}
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                self._reply(json.loads(body) if body else None)
+
+            def do_GET(self):
+                self._reply(None)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def actions(self):
+        return [action for action, _ in self.calls]
+
+
+class OneBotWebSocketStub:
+    """模拟 OneBot v11 正向 WebSocket 服务
+
+    收到 ``{"action", "params", "echo"}`` 帧后返回带相同 echo 的响应,
+    responses / handlers 的用法与 OneBotStub 相同。
+    """
+    def __init__(self, host='127.0.0.1', port=0):
+        self.responses = {
+            'get_login_info': {'user_id': 10000, 'nickname': 'stub'},
+        }
+        self.handlers = {}
+        self.calls = []
+        self.connections = 0
+        self._host = host
+        self._port = port
+        self._clients = set()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"ws://{host}:{port}"
+
+    async def _handle(self, ws):
+        self.connections += 1
+        self._clients.add(ws)
+        try:
+            async for frame in ws:
+                data = json.loads(frame)
+                action = data['action']
+                self.calls.append((action, data.get('params')))
+                if action in self.handlers:
+                    _, body = self.handlers[action](data.get('params'))
+                else:
+                    body = {'status': 'ok', 'retcode': 0, 'data': self.responses.get(action, {})}
+                await ws.send(json.dumps(dict(body, echo=data.get('echo'))))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self._clients.discard(ws)
+
+    def start(self):
+        self._thread.start()
+
+        async def _serve():
+            return await websockets.asyncio.server.serve(self._handle, self._host, self._port)
+        self._server = asyncio.run_coroutine_threadsafe(_serve(), self._loop).result(5)
+        return self
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(5)
+
+    def disconnect_all(self):
+        """断开所有客户端, 用于测试重连"""
+        async def _close():
+            for ws in list(self._clients):
+                await ws.close()
+        self._run(_close())
+
+    def push_event(self, event):
+        """向所有客户端推送事件"""
+        async def _push():
+            for ws in list(self._clients):
+                await ws.send(json.dumps(event))
+        self._run(_push())
+
+    def stop(self):
+        if not self._loop.is_running():
+            return
+
+        async def _stop():
+            self._server.close()
+            await self._server.wait_closed()
+        self._run(_stop())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+
+    def actions(self):
+        return [action for action, _ in self.calls]
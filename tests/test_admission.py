@@ -0,0 +1,24 @@
+import pytest
+from src.admission import AdmissionController
+
+
+def test_sheds_progressively_with_queue_delay():
+    admission = AdmissionController(soft_delay=1.0, hard_delay=3.0, smoothing=1.0)
+    admission.observe(0.5)
+    assert admission.shed_ratio() == 0
+    assert all(admission.admit(1) for _ in range(10))
+    admission.observe(2.0)
+    assert admission.shed_ratio() == pytest.approx(0.5)
+    admission.observe(5.0)
+    assert not any(admission.admit(2) for _ in range(5))
+    stats = admission.stats()
+    assert stats['admitted'] == 10
+    assert stats['shed_by_group'] == {'2': 5}
+
+def test_delay_is_smoothed():
+    admission = AdmissionController(soft_delay=1.0, hard_delay=2.0, smoothing=0.5)
+    admission.observe(10.0)
+    admission.observe(0.0)
+    assert admission.stats()['delay'] == pytest.approx(2.5)
+    with pytest.raises(ValueError):
+        AdmissionController(soft_delay=2.0, hard_delay=1.0)
@@ -0,0 +1,227 @@
+import sqlite3
+import pytest
+from QQBotAPI.DataManager import SCHEMA_VERSION, MessageManager
+from QQBotAPI.errors import DataNotFoundInDataBaseError
+
+
+def test_add_message_upserts_by_message_id(tmp_path, make_message):
+    manager = MessageManager(10000, db_path=str(tmp_path))
+    manager.add_message(make_message('first', message_id=1))
+    manager.add_message(make_message('again', message_id=1))
+    manager.add_message(make_message('private', message_id=2, group_id=None))
+    assert manager.get_message_via_id(1).text_only() == 'again'
+    assert not manager.get_message_via_id(2).is_group
+    with pytest.raises(DataNotFoundInDataBaseError):
+        manager.get_message_via_id(3)
+    assert manager.flush(5)
+    with manager.engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT COUNT(*) FROM messages").scalar() == 2
+    assert manager.schema_version() == SCHEMA_VERSION
+    manager.close()
+
+def test_legacy_database_is_migrated_in_place(tmp_path):
+    conn = sqlite3.connect(tmp_path / '10000.db')
+    conn.execute('CREATE TABLE messages (message_id INTEGER, time INTEGER, "group" INTEGER, sender INTEGER, json JSON)')
+    for message_id, text in [(1, 'old'), (2, 'other'), (1, 'redelivered')]:
+        conn.execute('INSERT INTO messages VALUES (?, ?, ?, ?, ?)',
+                     (message_id, 0, 100, 200, '"%s"' % text))
+    conn.commit()
+    conn.close()
+
+    manager = MessageManager(10000, db_path=str(tmp_path))
+    assert manager.schema_version() == SCHEMA_VERSION
+    with manager.engine.connect() as conn:
+        rows = conn.exec_driver_sql("SELECT message_id, json FROM messages ORDER BY message_id").fetchall()
+        indexes = {row[1] for row in conn.exec_driver_sql("PRAGMA index_list(messages)")}
+        plan = " ".join(str(row) for row in conn.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT * FROM messages WHERE message_id = 1"))
+    assert [(message_id, json) for message_id, json in rows] == [(1, '"redelivered"'), (2, '"other"')]
+    assert {'ix_messages_message_id', 'ix_messages_group_time', 'ix_messages_sender_time'} <= indexes
+    assert 'ix_messages_message_id' in plan
+    # 再次打开时不重复迁移
+    assert MessageManager(10000, db_path=str(tmp_path)).schema_version() == SCHEMA_VERSION
+
+def test_write_behind_batches_and_reads_unflushed_messages(tmp_path, make_message):
+    manager = MessageManager(10000, db_path=str(tmp_path), batch_size=50, flush_interval=60)
+    for message_id in range(120):
+        manager.add_message(make_message(f'text {message_id}', message_id=message_id))
+    # 不足一批的消息仍在缓冲区中, 但可以读取
+    assert manager.get_message_via_id(119).text_only() == 'text 119'
+    manager.update_message(make_message('edited', message_id=119))
+    assert manager.get_message_via_id(119).text_only() == 'edited'
+    manager.close()
+    stats = manager.stats()
+    assert stats['rows'] == 120 and stats['pending'] == 0
+    assert stats['max_batch'] == 50 and stats['batches'] == 3
+
+    reopened = MessageManager(10000, db_path=str(tmp_path), write_behind=False)
+    assert reopened.get_message_via_id(119).text_only() == 'edited'
+    assert reopened.get_message_via_id(0).text_only() == 'text 0'
+
+def test_buffered_messages_are_written_when_process_exits_without_close(tmp_path):
+    import os
+    import subprocess
+    import sys
+    script = f"""
+from QQBotAPI.DataManager import MessageManager
+from QQBotAPI.message import ReceivedMessageChain
+manager = MessageManager(1, db_path={str(tmp_path)!r}, flush_interval=60)
+for message_id in range(50):
+    manager.add_message(ReceivedMessageChain({{
+        'self_id': 1, 'time': message_id, 'message_type': 'private', 'message_id': message_id, 'message_seq': 0,
+        'sender': {{'user_id': 2, 'nickname': 'n', 'card': ''}}, 'message': []
+    }}))
+"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, '-c', script], cwd=root, check=True, timeout=60)
+    conn = sqlite3.connect(tmp_path / '1.db')
+    assert conn.execute('SELECT COUNT(*) FROM messages').fetchone()[0] == 50
+    conn.close()
+
+@pytest.mark.parametrize('write_behind', [True, False])
+def test_concurrent_readers_and_writers_do_not_lock(tmp_path, write_behind, make_message):
+    import random
+    import threading
+    manager = MessageManager(10000, db_path=str(tmp_path), write_behind=write_behind, batch_size=20, flush_interval=0.01)
+    errors = []
+    writers_done = threading.Event()
+
+    def write(offset):
+        try:
+            for message_id in range(offset, offset + 200):
+                manager.add_message(make_message('new', message_id=message_id))
+                if message_id % 10 == 0:
+                    manager.update_message(make_message('edited', message_id=message_id))
+        except Exception as e:
+            errors.append(e)
+
+    def read():
+        try:
+            while not writers_done.is_set():
+                try:
+                    manager.get_message_via_id(random.randrange(800))
+                except DataNotFoundInDataBaseError:
+                    pass
+                with manager.engine.connect() as conn:
+                    conn.exec_driver_sql('SELECT COUNT(*) FROM messages WHERE "group" = 100').scalar()
+        except Exception as e:
+            errors.append(e)
+
+    writers = [threading.Thread(target=write, args=(offset,)) for offset in range(0, 800, 200)]
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for thread in writers + readers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    writers_done.set()
+    for thread in readers:
+        thread.join()
+    manager.close()
+    assert errors == []
+
+    with sqlite3.connect(tmp_path / '10000.db') as conn:
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert conn.execute('SELECT COUNT(*) FROM messages').fetchone()[0] == 800
+        assert conn.execute("SELECT COUNT(*) FROM messages WHERE json LIKE '%edited%'").fetchone()[0] == 80
+
+def test_reader_connections_are_read_only(tmp_path):
+    manager = MessageManager(10000, db_path=str(tmp_path))
+    with manager.engine.connect() as conn:
+        with pytest.raises(Exception, match='readonly'):
+            conn.exec_driver_sql('DELETE FROM messages')
+    manager.close()
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('write_behind', [True, False])
+async def test_async_manager_reads_and_writes(tmp_path, write_behind, make_message):
+    from QQBotAPI.DataManager import AsyncMessageManager
+    from QQBotAPI.person import Group
+    manager = MessageManager(10000, db_path=str(tmp_path), write_behind=write_behind, flush_interval=60)
+    storage = AsyncMessageManager(manager)
+    for message_id in range(10):
+        await storage.add_message(make_message(f'text {message_id}', message_id=message_id,
+                                               group_id=100 + message_id % 2, time=1700000000 + message_id))
+    assert await storage.flush(5)
+    # 缓冲区中的消息与数据库中的合并返回
+    await storage.add_message(make_message('buffered', message_id=10, group_id=100, time=1700000010))
+    await storage.update_message(make_message('edited', message_id=0, group_id=100, time=1700000000))
+    assert (await storage.get_message_via_id(0)).text_only() == 'edited'
+    assert (await storage.get_message_via_id(10)).text_only() == 'buffered'
+    with pytest.raises(DataNotFoundInDataBaseError):
+        await storage.get_message_via_id(1, group=Group(100))
+
+    messages = await storage.get_messages(group=Group(100), start=1700000002, limit=3)
+    assert [message.get_message_id() for message in messages] == [10, 8, 6]
+    messages = await storage.get_messages(group=Group(100))
+    assert messages[-1].text_only() == 'edited'
+    assert [m.get_message_id() for m in manager.get_messages(end=1700000003)] == [2, 1, 0]
+
+    await storage.close()
+    manager.close()
+
+def test_failed_batches_are_retried_with_backoff(tmp_path, make_message):
+    manager = MessageManager(10000, db_path=str(tmp_path), flush_interval=0.01)
+    upsert, calls = manager._upsert, []
+
+    def flaky(conn, rows):
+        calls.append(len(rows))
+        if len(calls) <= 2:
+            raise OSError('disk I/O error')
+        upsert(conn, rows)
+
+    manager._upsert = flaky
+    manager.add_message(make_message(message_id=1))
+    assert manager.flush(5)
+    manager.close()
+    stats = manager.stats()
+    assert (stats['failures'], stats['dropped'], stats['rows']) == (2, 0, 1)
+
+def test_persistent_failures_drop_batches_and_bound_the_buffer(tmp_path, make_message):
+    manager = MessageManager(10000, db_path=str(tmp_path), batch_size=5, flush_interval=0.001,
+                             max_buffer=5, max_retries=2)
+
+    def broken(conn, rows):
+        raise OSError('database disk image is malformed')
+
+    manager._upsert = broken
+    for message_id in range(20):
+        # 缓冲区满时等待写入线程丢弃失败的批次
+        manager.add_message(make_message(message_id=message_id))
+    manager.close()
+    stats = manager.stats()
+    assert stats['dropped'] == 20 and stats['pending'] == 0
+    assert stats['backpressure_waits'] > 0
+
+def test_empty_flush_does_not_leave_flush_requested(tmp_path):
+    manager = MessageManager(10000, db_path=str(tmp_path), flush_interval=60)
+    assert manager.flush(1)
+    assert not manager._flush_requested
+    manager.close()
+
+@pytest.mark.asyncio
+async def test_async_manager_close_disposes_engines_of_all_loops(tmp_path, make_message):
+    import asyncio
+    import threading
+    from QQBotAPI.DataManager import AsyncMessageManager
+    manager = MessageManager(10000, db_path=str(tmp_path))
+    manager.add_message(make_message(message_id=1))
+    assert manager.flush(5)
+    storage = AsyncMessageManager(manager)
+    other = asyncio.new_event_loop()
+    thread = threading.Thread(target=other.run_forever, daemon=True)
+    thread.start()
+    before = threading.active_count()
+    await storage.get_message_via_id(1)
+    asyncio.run_coroutine_threadsafe(storage.get_message_via_id(1), other).result(5)
+    # 每个事件循环的连接池各有一个 aiosqlite 线程
+    assert threading.active_count() == before + 2
+    await storage.close()
+    assert len(storage._engines) == 0
+    for _ in range(50):
+        if threading.active_count() == before:
+            break
+        await asyncio.sleep(0.02)
+    assert threading.active_count() == before
+    other.call_soon_threadsafe(other.stop)
+    thread.join(5)
+    manager.close()
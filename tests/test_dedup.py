@@ -0,0 +1,34 @@
+from src.dedup import DedupWindow
+
+
+def test_duplicates_are_suppressed_within_window():
+    dedup = DedupWindow(maxsize=2, ttl=60)
+    assert not dedup.is_duplicate({'post_type': 'message', 'self_id': 1, 'message_id': 10})
+    assert dedup.is_duplicate({'post_type': 'message', 'self_id': 1, 'message_id': 10})
+    # 不同账号的相同 message_id 不是重复
+    assert not dedup.is_duplicate({'post_type': 'message', 'self_id': 2, 'message_id': 10})
+    assert not dedup.is_duplicate({'post_type': 'notice'})
+    assert dedup.stats() == {'size': 2, 'suppressed': 1}
+
+def test_window_is_bounded_and_forget_allows_redelivery():
+    dedup = DedupWindow(maxsize=2, ttl=60)
+    for message_id in range(3):
+        dedup.is_duplicate({'post_type': 'message', 'self_id': 1, 'message_id': message_id})
+    # 最旧的记录已被淘汰
+    assert not dedup.is_duplicate({'post_type': 'message', 'self_id': 1, 'message_id': 0})
+    dedup.forget({'post_type': 'message', 'self_id': 1, 'message_id': 0})
+    assert not dedup.is_duplicate({'post_type': 'message', 'self_id': 1, 'message_id': 0})
+    assert dedup.stats()['size'] == 2
+
+def test_expired_entries_are_not_duplicates():
+    dedup = DedupWindow(ttl=0)
+    assert not dedup.is_duplicate({'post_type': 'message', 'self_id': 1, 'message_id': 1})
+    assert not dedup.is_duplicate({'post_type': 'message', 'self_id': 1, 'message_id': 1})
+
+def test_recall_notice_is_not_a_duplicate_of_its_message():
+    dedup = DedupWindow()
+    assert not dedup.is_duplicate({'post_type': 'message', 'self_id': 1, 'message_id': 10})
+    recall = {'post_type': 'notice', 'notice_type': 'group_recall', 'self_id': 1, 'message_id': 10}
+    assert not dedup.is_duplicate(recall)
+    assert not dedup.is_duplicate(recall)
+    assert dedup.stats()['suppressed'] == 0
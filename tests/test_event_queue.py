@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import pytest
+from src.event_queue import EventQueue, QueueFullError
+
+
+@pytest.mark.asyncio
+async def test_events_are_processed_off_the_event_loop():
+    handled = []
+    queue = EventQueue(lambda event: handled.append((event['id'], threading.current_thread().name)), workers=2)
+    await queue.start()
+    for i in range(10):
+        assert await queue.put({'id': i})
+    await queue.stop()
+    assert sorted(i for i, _ in handled) == list(range(10))
+    assert all(name.startswith('EventWorker') for _, name in handled)
+    assert queue.stats()['processed'] == 10
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('overflow', ['shed', 'reject'])
+async def test_full_queue_overflow_policy(overflow):
+    release = threading.Event()
+    queue = EventQueue(lambda event: release.wait(5), workers=1, maxsize=1, overflow=overflow)
+    await queue.start()
+    await queue.put({'id': 0})
+    await asyncio.sleep(0.05)   # 工作线程取走第一个事件并阻塞
+    await queue.put({'id': 1})
+    if overflow == 'reject':
+        with pytest.raises(QueueFullError):
+            await queue.put({'id': 2})
+    else:
+        assert not await queue.put({'id': 2})
+    release.set()
+    await queue.stop()
+    stats = queue.stats()
+    assert stats['processed'] == 2
+    assert (stats['shed'], stats['rejected']) == ((1, 0) if overflow == 'shed' else (0, 1))
+
+@pytest.mark.asyncio
+async def test_same_conversation_is_processed_in_order():
+    import time
+    handled = []
+
+    def handler(event):
+        time.sleep(0.01 if event['seq'] % 2 else 0)
+        handled.append((event['group'], event['seq']))
+
+    queue = EventQueue(handler, workers=4, key=lambda event: event['group'])
+    await queue.start()
+    for seq in range(20):
+        for group in range(3):
+            await queue.put({'group': group, 'seq': seq})
+    stats = queue.stats()
+    assert len(stats['lanes']) == 4
+    assert stats['depth'] > 0 and max(lane['lag'] for lane in stats['lanes']) >= 0
+    await queue.stop()
+    for group in range(3):
+        assert [seq for g, seq in handled if g == group] == list(range(20))
+    assert sum(lane['processed'] for lane in queue.stats()['lanes']) == 60
+
+@pytest.mark.asyncio
+async def test_addressed_events_jump_background_without_starving_it():
+    release = threading.Event()
+    handled = []
+
+    def handler(event):
+        if event['id'] == 'blocker':
+            release.wait(5)
+        handled.append(event['id'])
+
+    queue = EventQueue(handler, workers=1, priority=lambda event: event['priority'], max_burst=2,
+                       slo={'addressed': 60.0, 'background': 0.0})
+    await queue.start()
+    await queue.put({'id': 'blocker', 'priority': 1})
+    await asyncio.sleep(0.05)   # 工作线程取走第一个事件并阻塞
+    for i in range(3):
+        await queue.put({'id': f'b{i}', 'priority': 1})
+    for i in range(3):
+        await queue.put({'id': f'a{i}', 'priority': 0})
+    release.set()
+    await queue.stop()
+    # 高优先级先处理, 连续 2 个后让出一次
+    assert handled == ['blocker', 'a0', 'a1', 'b0', 'a2', 'b1', 'b2']
+    priorities = queue.stats()['priorities']
+    assert priorities['addressed']['processed'] == 3 and priorities['addressed']['slo_violations'] == 0
+    assert priorities['background']['processed'] == 4 and priorities['background']['slo_violations'] == 4
+    assert priorities['background']['p95'] >= priorities['background']['p50']
+
+@pytest.mark.asyncio
+async def test_handler_sees_its_queue_delay():
+    from src.event_queue import queue_delay
+    delays = []
+    queue = EventQueue(lambda event: delays.append(queue_delay()), workers=1)
+    await queue.start()
+    await queue.put({'id': 0})
+    await queue.stop()
+    assert len(delays) == 1 and 0 <= delays[0] < 1
+    assert queue_delay() == 0.0
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+import time
+import pytest
+from src.function_runner import FunctionRunner, FunctionTimeoutError
+
+
+@pytest.fixture
+def runner():
+    runner = FunctionRunner(max_workers=8, default_timeout=5)
+    yield runner
+    runner.close()
+
+def test_sync_and_async_process(runner, make_function):
+    def sync_process(self):
+        return threading.current_thread().name
+
+    async def async_process(self):
+        await asyncio.sleep(0)
+        return 'async'
+
+    sync_function = make_function('sync', sync_process)
+    async_function = make_function('async', async_process)
+    assert runner.run(sync_function, None, None).startswith('FunctionWorker')
+    assert runner.run(async_function, None, None) == 'async'
+    assert runner.stats()['sync']['completed'] == 1
+
+def test_functions_run_concurrently(runner, make_function):
+    slow = make_function('slow', lambda self: time.sleep(0.3))
+
+    async def async_slow(self):
+        await asyncio.sleep(0.3)
+
+    other = make_function('other', async_slow)
+    start = time.monotonic()
+    assert runner.run_all([slow, other, slow], None, None) == [None, None, None]
+    # 串行执行需要 0.9s
+    assert time.monotonic() - start < 0.6
+
+def test_timeout(runner, make_function):
+    async def hang(self):
+        await asyncio.sleep(10)
+
+    hung = make_function('hung', hang, timeout=0.1)
+    stuck = make_function('stuck', lambda self: time.sleep(0.3), timeout=0.1)
+    results = runner.run_all([hung, stuck], None, None)
+    assert all(isinstance(result, FunctionTimeoutError) for result in results)
+    with pytest.raises(FunctionTimeoutError):
+        runner.run(hung, None, None)
+    assert runner.stats()['hung']['timeouts'] == 2
+
+def test_max_concurrency(runner, make_function):
+    lock = threading.Lock()
+    active = []
+    peak = []
+
+    def process(self):
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.05)
+        with lock:
+            active.pop()
+
+    limited = make_function('limited', process, max_concurrency=2)
+    results = runner.run_all([limited] * 6, None, None)
+    assert results == [None] * 6
+    assert max(peak) == 2
+
+def test_reloaded_classes_share_limits_entry(runner, make_function):
+    # 热重载生成同模块同名的新类, 不应留下旧类的记录
+    for _ in range(3):
+        runner.run(make_function('reloaded', lambda self: None), None, None)
+    assert len(runner._limits) == 1
+    assert runner.stats()['reloaded']['completed'] == 3
+    runner.run(make_function('reloaded', lambda self: None, timeout=1), None, None)
+    assert len(runner._limits) == 1 and runner.stats()['reloaded']['timeout'] == 1
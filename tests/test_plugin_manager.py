@@ -0,0 +1,137 @@
+import os
+import sys
+import textwrap
+import pytest
+from src.plugin_manager import PluginManager
+
+PLUGIN = '''
+class {name}:
+    @classmethod
+    def check(cls, msg):
+        return "hit"
+
+    @classmethod
+    def register(cls):
+        return {{'type': '{type}', 'name': '{name}', 'version': {version}}}
+
+functions = [{name}]
+'''
+
+
+@pytest.fixture
+def plugin_dir(tmp_path):
+    package = tmp_path / 'hot_apps'
+    package.mkdir()
+    (package / '__init__.py').write_text('')
+    sys.path.insert(0, str(tmp_path))
+    yield package
+    sys.path.remove(str(tmp_path))
+    for name in [name for name in sys.modules if name.startswith('hot_apps')]:
+        del sys.modules[name]
+
+def write(path, source):
+    path.write_text(textwrap.dedent(source))
+    # 保证修改时间变化
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9 * (1 + len(source))))
+
+def test_reload_only_changed_module(plugin_dir):
+    write(plugin_dir / 'a.py', PLUGIN.format(name='a', type='message_function', version=1))
+    write(plugin_dir / 'b.py', PLUGIN.format(name='b', type='quiet_function', version=1))
+    manager = PluginManager(path=str(plugin_dir), package='hot_apps')
+    manager.load_all()
+    old_b = manager.functions('quiet_function')[0]
+    assert len(manager.message_router) == 1 and len(manager.quiet_router) == 1
+
+    write(plugin_dir / 'a.py', PLUGIN.format(name='a', type='message_function', version=2) + '\n')
+    assert manager.check() == ([], [])
+    assert manager.functions('message_function')[0].register()['version'] == 2
+    assert manager.functions('quiet_function')[0] is old_b
+    assert manager.stats()['reloads'] == 1
+
+def test_failed_reload_keeps_old_version(plugin_dir):
+    write(plugin_dir / 'a.py', PLUGIN.format(name='a', type='message_function', version=1))
+    manager = PluginManager(path=str(plugin_dir), package='hot_apps')
+    manager.load_all()
+    plugins = manager.plugins
+
+    write(plugin_dir / 'a.py', PLUGIN.format(name='a', type='message_function', version=2) + '\nraise RuntimeError("broken")\n')
+    manager.check()
+    assert manager.functions('message_function')[0].register()['version'] == 1
+    assert manager.plugins.modules == plugins.modules
+    assert 'broken' in manager.stats()['errors']['a']
+    assert sys.modules['hot_apps.a'].a.register()['version'] == 1
+
+def test_package_plugin_reloads_changed_submodule(plugin_dir):
+    def write_sub(source):
+        # 每次修改都比包中其他文件更新, 包的签名才会变化
+        newest = max(os.stat(path).st_mtime_ns for path in package.glob('*.py'))
+        write(package / 'sub.py', source)
+        os.utime(package / 'sub.py', ns=(newest, newest + 10 ** 9))
+
+    package = plugin_dir / 'pkg'
+    package.mkdir()
+    write(package / 'sub.py', 'VERSION = 1\n')
+    write(package / '__init__.py', PLUGIN.format(name='pkg', type='message_function', version='VERSION')
+          + 'from .sub import VERSION\n')
+    manager = PluginManager(path=str(plugin_dir), package='hot_apps')
+    manager.load_all()
+    assert manager.functions('message_function')[0].register()['version'] == 1
+
+    write_sub('VERSION = 2\n')
+    manager.check()
+    assert manager.stats()['reloads'] == 1
+    assert manager.functions('message_function')[0].register()['version'] == 2
+    assert sys.modules['hot_apps.pkg.sub'].VERSION == 2
+
+    # 子模块出错时保留旧的包及其子模块
+    write_sub('VERSION = 3\nraise RuntimeError("broken")\n')
+    manager.check()
+    assert manager.functions('message_function')[0].register()['version'] == 2
+    assert sys.modules['hot_apps.pkg'].pkg.register()['version'] == 2
+    assert sys.modules['hot_apps.pkg.sub'].VERSION == 2
+    assert 'broken' in manager.stats()['errors']['pkg']
+
+def test_added_and_removed_regular_tasks(plugin_dir):
+    manager = PluginManager(path=str(plugin_dir), package='hot_apps')
+    manager.load_all()
+    write(plugin_dir / 'task.py', PLUGIN.format(name='task', type='regular_task_function', version=1))
+    removed, added = manager.check()
+    assert removed == [] and [f.register()['name'] for f in added] == ['task']
+    os.remove(plugin_dir / 'task.py')
+    removed, added = manager.check()
+    assert [f.register()["name"] for f in removed] == ["task"] and added == []
+    assert manager.stats()['modules'] == 0
+
+def test_lazy_loading_from_manifest(plugin_dir, tmp_path):
+    source = PLUGIN.format(name='a', type='message_function', version=1).replace(
+        "'version': 1}", "'version': 1, 'triggers': {'commands': ['a']}}")
+    write(plugin_dir / 'a.py', source)
+    manifest = str(tmp_path / 'manifest.json')
+    PluginManager(path=str(plugin_dir), package='hot_apps', manifest=manifest, lazy=True).load_all()
+    del sys.modules['hot_apps.a']
+
+    manager = PluginManager(path=str(plugin_dir), package='hot_apps', manifest=manifest, lazy=True)
+    manager.load_all()
+    assert 'hot_apps.a' not in sys.modules
+    assert manager.stats()['deferred'] == 1
+    function = manager.functions('message_function')[0]
+    assert function.register()['version'] == 1
+
+    from QQBotAPI.message import ReceivedMessageChain
+
+    def message(text):
+        return ReceivedMessageChain({
+            "self_id": 1, "time": 0, "message_type": "private", "message_id": 1, "message_seq": 1,
+            "sender": {"user_id": 2, "nickname": "n", "card": ""},
+            "message": [{"type": "text", "data": {"text": text}}]
+        })
+
+    # triggers 未命中时不导入
+    assert manager.message_router.match(message('b')) == []
+    assert 'hot_apps.a' not in sys.modules
+    assert manager.message_router.match(message('a')) == [(function, 'hit')]
+    assert 'hot_apps.a' in sys.modules
+    assert function.load() is sys.modules['hot_apps.a'].a
+    assert 'hot_apps.a' in manager.stats()['cold_imports_ms']
+    assert manager.stats()['deferred'] == 0
@@ -0,0 +1,66 @@
+import os
+import time
+import pytest
+from QQBotAPI.message import TextMessage
+from src.function_runner import FunctionRunner, FunctionTimeoutError
+from src.process_pool import ProcessPoolRunner
+
+
+class CountWords:
+    """在子进程中执行, 结果和回复都要回到主进程"""
+    def __init__(self, msg, bot):
+        self.msg = msg
+        self.bot = bot
+
+    def process(self):
+        count = len(self.msg.text_only().split())
+        self.msg.reply(f"{count} words from {self.bot.qq_id}", self.bot)
+        return os.getpid()
+
+    @classmethod
+    def register(cls):
+        return {'type': 'message_function', 'name': 'count_words', 'cpu_bound': True}
+
+
+class Spin:
+    def __init__(self, msg, bot):
+        pass
+
+    def process(self):
+        time.sleep(30)
+
+    @classmethod
+    def register(cls):
+        return {'type': 'message_function', 'name': 'spin', 'cpu_bound': True, 'timeout': 0.5}
+
+
+class FakeBot:
+    qq_id = 10000
+    nickname = 'bot'
+
+    def __init__(self):
+        self.sent = []
+
+    def send_private_message(self, user, message, priority=1):
+        self.sent.append((user.get_user_id(), [str(msg) for msg in message if isinstance(msg, TextMessage)], priority))
+
+
+@pytest.fixture(scope='module')
+def runner():
+    runner = FunctionRunner(process_pool=ProcessPoolRunner(max_workers=1))
+    yield runner
+    runner.close()
+
+def test_cpu_bound_runs_in_child_and_proxies_sends(runner, make_message):
+    bot = FakeBot()
+    pid = runner.run(CountWords, make_message('a b c'), bot)
+    assert pid != os.getpid()
+    assert bot.sent == [(2, ['3 words from 10000'], 0)]
+    assert runner.stats()['process_pool']['proxied_sends'] == 1
+
+def test_cpu_bound_timeout_recycles_pool(runner, make_message):
+    with pytest.raises(FunctionTimeoutError):
+        runner.run(Spin, make_message(''), FakeBot())
+    assert runner.stats()['process_pool']['recycles'] == 1
+    # 重建后的进程池仍可使用
+    assert runner.run(CountWords, make_message('a'), FakeBot()) != os.getpid()
@@ -0,0 +1,181 @@
+import pytest
+from QQBotAPI.QQBotHttp import QQBotHttp
+
+
+def test_requests_share_pooled_connection(onebot_server):
+    api = QQBotHttp(onebot_server.url)
+    for _ in range(20):
+        api.get_msg(1)
+    api.close()
+    assert onebot_server.actions().count('get_msg') == 20
+    assert onebot_server.connections == 1
+
+def test_warmup_opens_connections(onebot_server):
+    api = QQBotHttp(onebot_server.url, pool_size=4, warmup=4)
+    api.close()
+    assert onebot_server.actions().count('get_status') == 4
+    assert onebot_server.connections >= 2
+
+def test_json_keyword_is_sent_as_body(onebot_server):
+    api = QQBotHttp(onebot_server.url)
+    api.group_poke(123, 456)
+    api.close()
+    assert onebot_server.calls[-1] == ('group_poke', {'group_id': 123, 'user_id': 456})
+
+@pytest.mark.asyncio
+async def test_async_client_mirrors_endpoints(onebot_server):
+    from QQBotAPI.AsyncQQBotHttp import AsyncQQBotHttp
+    async with AsyncQQBotHttp(onebot_server.url) as api:
+        assert (await api.get_login_info())['user_id'] == 10000
+        await api.send_group_message([{'type': 'text', 'data': {'text': 'hi'}}], 123)
+        await api.group_poke(123, 456)
+    assert onebot_server.actions() == ['get_login_info', 'send_group_msg', 'group_poke']
+
+@pytest.mark.asyncio
+async def test_async_client_overlaps_requests(onebot_server):
+    import asyncio
+    import time
+    from QQBotAPI.AsyncQQBotHttp import AsyncQQBotHttp
+
+    def slow(params):
+        time.sleep(0.2)
+        return 200, {'status': 'ok', 'data': params}
+    onebot_server.handlers['get_msg'] = slow
+    async with AsyncQQBotHttp(onebot_server.url, pool_size=50) as api:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(api.get_msg(i) for i in range(50)))
+        elapsed = time.perf_counter() - start
+    assert [r['message_id'] for r in results] == list(range(50))
+    # 串行执行需要 10 秒
+    assert elapsed < 5
+
+def test_reads_retry_but_sends_do_not_on_api_error(onebot_server):
+    from QQBotAPI.errors import QQBotAPIError
+    failed = lambda params: (200, {'status': 'failed', 'retcode': 100, 'data': None})
+    onebot_server.handlers['get_msg'] = failed
+    onebot_server.handlers['send_group_msg'] = failed
+    api = QQBotHttp(onebot_server.url)
+    with pytest.raises(QQBotAPIError):
+        api.get_msg(1)
+    with pytest.raises(QQBotAPIError):
+        api.send_group_message([], 123)
+    api.close()
+    assert onebot_server.actions().count('get_msg') == 3
+    assert onebot_server.actions().count('send_group_msg') == 1
+
+def test_retry_policy_deadline_and_budget():
+    from QQBotAPI.retry import RetryBudget, RetryPolicy, API, TIMEOUT
+    budget = RetryBudget(ratio=0, min_per_second=0, max_tokens=1)
+    policy = RetryPolicy(max_attempts=5, base_delay=1, jitter=0, deadline=10, retry_on=(API,), budget=budget)
+    assert policy.next_delay(1, 0, TIMEOUT) is None
+    assert policy.next_delay(1, 9.5, API) is None
+    assert policy.next_delay(2, 0, API) == 2
+    assert policy.next_delay(3, 0, API) is None
+    assert budget.stats()['exhausted'] == 1
+
+def test_send_scheduler_paces_and_prioritizes():
+    import threading
+    from QQBotAPI.send_scheduler import SendScheduler, PRIORITY_REPLY, PRIORITY_BROADCAST
+    sent = []
+    started, gate = threading.Event(), threading.Event()
+    scheduler = SendScheduler(global_rate=None, group_rate=20, group_burst=1)
+    # 第一条消息阻塞调度线程, 让后续消息在队列中排序
+    scheduler.submit('group', 1, lambda: started.set() or gate.wait() and sent.append('first'))
+    started.wait(timeout=5)
+    broadcasts = [scheduler.submit('group', 1, lambda i=i: sent.append(f'broadcast{i}'), PRIORITY_BROADCAST) for i in range(3)]
+    reply = scheduler.submit('group', 1, lambda: sent.append('reply'), PRIORITY_REPLY)
+    assert scheduler.stats()['queue_depth'] == 4
+    gate.set()
+    reply.result(timeout=5)
+    for future in broadcasts:
+        future.result(timeout=5)
+    scheduler.close()
+    assert sent == ['first', 'reply', 'broadcast0', 'broadcast1', 'broadcast2']
+    # 单个群每秒 20 条, 5 条消息至少需要 0.2 秒
+    assert scheduler.stats()['max_wait'] >= 0.15
+
+def test_circuit_breaker_fails_fast_and_recovers(onebot_server):
+    import requests
+    from QQBotAPI.circuit_breaker import CLOSED, OPEN
+    from QQBotAPI.errors import CircuitOpenError
+    api = QQBotHttp(onebot_server.url, circuit_breaker={'failure_threshold': 2, 'recovery_timeout': 60})
+    down = lambda params: (500, {'message': 'down'})
+    onebot_server.handlers['get_msg'] = down
+    with pytest.raises(requests.RequestException):
+        api.get_msg(1)
+    assert api.circuit_breaker.state == OPEN
+    calls = len(onebot_server.calls)
+    with pytest.raises(CircuitOpenError):
+        api.get_msg(1)
+    assert len(onebot_server.calls) == calls
+
+    # 正常的心跳允许试探, 探测成功后恢复
+    del onebot_server.handlers['get_msg']
+    api.circuit_breaker.record_heartbeat({'online': True, 'good': True})
+    api.get_msg(1)
+    api.close()
+    assert onebot_server.actions()[-2:] == ['get_status', 'get_msg']
+    assert api.circuit_breaker.state == CLOSED
+
+def test_read_responses_are_cached_and_invalidated(onebot_server):
+    api = QQBotHttp(onebot_server.url)
+    api.get_group_member_info(1, 2)
+    api.get_group_member_info(1, 2)
+    api.get_group_member_info(1, 3)
+    api.get_group_member_info(1, 2, no_cache=True)
+    assert onebot_server.actions().count('get_group_member_info') == 3
+
+    api.set_group_card(1, 2, 'card')
+    api.get_group_member_info(1, 2)
+    api.get_group_member_info(1, 3)
+    api.close()
+    assert onebot_server.actions().count('get_group_member_info') == 4
+    assert api.cache.stats()['get_group_member_info']['hits'] == 2
+    # 初始化时的两次 get_login_info 只请求一次
+    assert onebot_server.actions().count('get_login_info') == 1
+
+def test_essence_changes_invalidate_cached_list(onebot_server):
+    api = QQBotHttp(onebot_server.url)
+    api.get_essence_msg_list(1)
+    api.set_group_essence_msg(5)
+    api.get_essence_msg_list(1)
+    api.delete_group_essence_msg(5)
+    api.get_essence_msg_list(1)
+    api.close()
+    assert onebot_server.actions().count('get_essence_msg_list') == 3
+
+def test_invalidation_rules_use_onebot_action_names():
+    import inspect
+    import re
+    from QQBotAPI.cache import DEFAULT_CACHE_POLICIES, DEFAULT_INVALIDATIONS
+    # 缓存按 URL 中的接口名查找规则, 而不是 Python 方法名
+    actions = set(re.findall(r'_url \+ "/(\w+)"', inspect.getsource(QQBotHttp)))
+    assert set(DEFAULT_INVALIDATIONS) <= actions
+    for rules in DEFAULT_INVALIDATIONS.values():
+        assert {cached for cached, _ in rules} <= actions & set(DEFAULT_CACHE_POLICIES)
+
+def test_concurrent_identical_reads_are_collapsed(onebot_server):
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    def slow(params):
+        time.sleep(0.3)
+        return 200, {'status': 'ok', 'data': params}
+    onebot_server.handlers['get_msg'] = slow
+    api = QQBotHttp(onebot_server.url)
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        results = list(executor.map(lambda _: api.get_msg(42), range(10)))
+    api.close()
+    assert all(result == {'message_id': 42} for result in results)
+    assert onebot_server.actions().count('get_msg') == 1
+    assert api.single_flight.stats()['collapsed'] == 9
+
+@pytest.mark.asyncio
+async def test_async_identical_reads_are_collapsed(onebot_server):
+    import asyncio
+    from QQBotAPI.AsyncQQBotHttp import AsyncQQBotHttp
+    async with AsyncQQBotHttp(onebot_server.url) as api:
+        await asyncio.gather(*(api.get_msg(7) for _ in range(20)), api.send_group_message([], 1), api.send_group_message([], 1))
+    assert onebot_server.actions().count('get_msg') == 1
+    assert onebot_server.actions().count('send_group_msg') == 2
+    assert api.single_flight.stats()['collapsed'] == 19
@@ -0,0 +1,31 @@
+from src.router import TriggerRouter
+
+
+def names(functions):
+    return [function.register()['name'] for function in functions]
+
+def test_router_only_checks_candidates(make_message, make_function):
+    command = make_function('command', triggers={'commands': ['echo']})
+    prefix = make_function('prefix', triggers={'prefixes': ['/天气']})
+    regex = make_function('regex', triggers={'regex': [r'\d+点提醒我']})
+    image = make_function('image', triggers={'segments': ['image']})
+    legacy = make_function('legacy', check=lambda msg: "")
+    router = TriggerRouter([command, prefix, regex, image, legacy])
+
+    assert names(router.candidates(make_message('echo hi', group_id=100))) == ['command', 'legacy']
+    assert names(router.candidates(make_message('/天气 北京', group_id=100))) == ['prefix', 'legacy']
+    assert names(router.candidates(make_message('明天8点提醒我', group_id=100))) == ['regex', 'legacy']
+    image_segment = {"type": "image", "data": {"url": "u", "file": "f", "file_size": 1}}
+    assert names(router.candidates(make_message('', group_id=100, segments=[image_segment]))) == ['image', 'legacy']
+
+    assert names(f for f, _ in router.match(make_message('echo', group_id=100))) == ['command']
+    assert (command.calls, prefix.calls, regex.calls, image.calls) == (1, 0, 0, 0)
+    assert router.stats()['legacy'] == 1
+
+def test_group_allowlist(make_message, make_function):
+    allowed = make_function('allowed', triggers={'commands': ['ping'], 'groups': [100]})
+    group_only = make_function('group_only', triggers={'groups': ['200']})
+    router = TriggerRouter([allowed, group_only])
+    assert names(router.candidates(make_message('ping', group_id=100))) == ['allowed']
+    assert names(router.candidates(make_message('ping', group_id=200))) == ['group_only']
+    assert names(router.candidates(make_message('ping', group_id=None))) == []
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime
+import pytest
+from src.function_runner import FunctionRunner
+from src.process_pool import ProcessPoolRunner
+from src.scheduler import CronExpression, TaskScheduler
+
+
+class CpuTask:
+    """在子进程中执行的定时任务, 构造时 msg 为 None"""
+    def __init__(self, msg, bot):
+        assert msg is None
+        self.bot = bot
+
+    def process(self):
+        self.bot.send_group_message(100, f"report from {os.getpid()}")
+        return os.getpid()
+
+    @classmethod
+    def register(cls):
+        return {'type': 'regular_task_function', 'name': 'cpu_task', 'cpu_bound': True, 'interval': 0.05,
+                'timeout': 30}
+
+
+@pytest.fixture
+def runner():
+    runner = FunctionRunner()
+    yield runner
+    runner.close()
+
+def test_cron_next_after():
+    assert CronExpression('*/15 * * * *').next_after(datetime(2024, 1, 1, 10, 7)) == datetime(2024, 1, 1, 10, 15)
+    assert CronExpression('0 9 * * 1-5').next_after(datetime(2024, 1, 5, 9, 0)) == datetime(2024, 1, 8, 9, 0)
+    assert CronExpression('30 0 1 */3 *').next_after(datetime(2024, 2, 1)) == datetime(2024, 4, 1, 0, 30)
+    with pytest.raises(ValueError):
+        CronExpression('61 * * * *')
+
+@pytest.mark.asyncio
+async def test_interval_jobs_run_and_report_stats(runner, make_task):
+    runs = []
+    scheduler = TaskScheduler(None, runner)
+    scheduler.add(make_task('tick', lambda self: runs.append(time.monotonic()), interval=0.05))
+    scheduler.start()
+    await asyncio.sleep(0.3)
+    await scheduler.stop()
+    stats = scheduler.stats()['tick']
+    assert len(runs) >= 3
+    assert stats['runs'] == len(runs) and stats['failures'] == 0
+    assert stats['next_run'] > stats['last_run']
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('overlap, expected', [('skip', 1), ('queue', 2), ('allow', 3)])
+async def test_overlap_policy(runner, overlap, expected, make_task):
+    release = threading.Event()
+    runs = []
+
+    def slow(self):
+        runs.append(1)
+        release.wait(5)
+
+    scheduler = TaskScheduler(None, runner)
+    job = scheduler.add(make_task('slow', slow, interval=0.05, overlap=overlap))
+    scheduler.start()
+    # 第一次执行期间又到期两次
+    await asyncio.sleep(0.17)
+    release.set()
+    await asyncio.sleep(0.02)
+    await scheduler.stop()
+    assert len(runs) >= expected
+    if overlap == 'skip':
+        assert job.overlaps >= 2 and len(runs) <= 2
+
+def test_coalesce_and_misfire(make_task):
+    scheduler = TaskScheduler(None)
+    scheduler._start_run = lambda job: job.__setattr__('runs', job.runs + 1)
+    coalesced = scheduler.add(make_task('coalesced', None, interval=10))
+    missed = scheduler.add(make_task('missed', None, interval=10, misfire_grace=5))
+    first = coalesced.fire_at
+    for job in (coalesced, missed):
+        # 模拟事件循环阻塞了 35 秒
+        scheduler._fire(job, job.fire_at + 35)
+    assert (coalesced.runs, coalesced.coalesced) == (1, 3)
+    assert coalesced.fire_at == pytest.approx(first + 40)
+    assert (missed.runs, missed.missed) == (0, 1)
+
+class GroupBot:
+    qq_id = 10000
+    nickname = 'bot'
+
+    def __init__(self):
+        self.sent = []
+
+    def send_group_message(self, group_id, message):
+        self.sent.append((group_id, message))
+
+@pytest.mark.asyncio
+async def test_cpu_bound_regular_task_runs_in_child():
+    runner = FunctionRunner(process_pool=ProcessPoolRunner(max_workers=1))
+    bot = GroupBot()
+    scheduler = TaskScheduler(bot, runner)
+    job = scheduler.add(CpuTask)
+    scheduler.start()
+    try:
+        for _ in range(200):
+            if job.runs:
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        await scheduler.stop()
+        runner.close()
+    assert job.runs >= 1 and job.failures == 0, job.last_error
+    group_id, text = bot.sent[0]
+    assert group_id == 100 and text != f"report from {os.getpid()}"
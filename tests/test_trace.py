@@ -0,0 +1,51 @@
+import logging
+import time
+from QQBotAPI.send_scheduler import SendScheduler
+from QQBotAPI.trace import SPAN_METRICS, TraceFilter, current_trace, span, start_trace
+from src.Resolver import Resolver
+from src.function_runner import FunctionRunner
+
+
+def test_spans_are_recorded_on_trace_and_metrics():
+    with start_trace('abc') as trace:
+        with span('store'):
+            time.sleep(0.01)
+        with span('send'):
+            pass
+        with span('send'):
+            pass
+        record = logging.LogRecord('x', logging.INFO, '', 0, 'msg', None, None)
+        TraceFilter().filter(record)
+    assert current_trace() is None
+    assert list(trace.spans) == ['store', 'send']
+    assert trace.spans['store'] >= 0.01
+    assert record.response_id == 'abc' and 'store=' in record.spans
+    assert SPAN_METRICS.stats()['send']['count'] >= 2
+
+def test_trace_follows_plugins_and_scheduled_sends():
+    seen = []
+    function = type('traced', (), {
+        '__init__': lambda self, msg, bot: None,
+        'register': classmethod(lambda cls: {'type': 'message_function', 'name': 'traced'}),
+        'process': lambda self: seen.append(current_trace().response_id)
+    })
+    runner = FunctionRunner()
+    scheduler = SendScheduler()
+    try:
+        with start_trace('abc'):
+            runner.run(function, None, None)
+            scheduler.submit('private', 1, lambda: seen.append(current_trace().response_id)).result(5)
+    finally:
+        runner.close()
+        scheduler.close()
+    assert seen == ['abc', 'abc']
+
+def test_resolver_does_not_create_loggers(make_message):
+    Resolver(make_message(message_id=0), None, [])
+    before = len(logging.Logger.manager.loggerDict)
+    for i in range(50):
+        with start_trace() as trace:
+            resolver = Resolver(make_message(message_id=i), None, [])
+        assert resolver.response_id == trace.response_id
+        assert 'match' in trace.spans and 'plugin' in trace.spans
+    assert len(logging.Logger.manager.loggerDict) == before
@@ -0,0 +1,91 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from QQBotAPI.QQBotHttp import QQBotHttp
+from QQBotAPI.transport import ForwardWebSocketTransport
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+def test_actions_are_multiplexed_over_one_socket(onebot_server, onebot_ws_server):
+    transport = ForwardWebSocketTransport(onebot_ws_server.url).start()
+    api = QQBotHttp(onebot_server.url, transport=transport)
+    onebot_ws_server.handlers['send_group_msg'] = lambda params: (200, {'status': 'ok', 'data': {'message_id': params['group_id']}})
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda i: api.send_group_message([], i), range(50)))
+    transport.close()
+    api.close()
+    assert [r['message_id'] for r in results] == list(range(50))
+    assert onebot_ws_server.connections == 1
+    assert 'send_group_msg' not in onebot_server.actions()
+
+def test_reconnects_and_falls_back_to_http(onebot_server, onebot_ws_server):
+    transport = ForwardWebSocketTransport(onebot_ws_server.url, reconnect_delay=0.05).start()
+    api = QQBotHttp(onebot_server.url, transport=transport)
+    onebot_ws_server.stop()
+    assert wait_until(lambda: not transport.connected)
+    api.get_msg(1)
+    assert onebot_server.actions()[-1] == 'get_msg'
+    transport.close()
+    api.close()
+
+def test_events_are_delivered_to_callback(onebot_ws_server):
+    events = []
+    transport = ForwardWebSocketTransport(onebot_ws_server.url, on_event=events.append).start()
+    onebot_ws_server.push_event({'post_type': 'meta_event', 'meta_event_type': 'heartbeat'})
+    assert wait_until(lambda: events)
+    onebot_ws_server.disconnect_all()
+    assert wait_until(lambda: transport.stats()['reconnects'] == 1 and transport.connected)
+    transport.close()
+    assert events[0]['meta_event_type'] == 'heartbeat'
+
+def test_reverse_websocket_ingests_events_and_serves_calls():
+    import json
+    from fastapi import FastAPI, WebSocket
+    from fastapi.testclient import TestClient
+    from QQBotAPI.transport import ReverseWebSocketTransport
+
+    events = []
+    transport = ReverseWebSocketTransport(access_token='secret', on_event=events.append)
+    app = FastAPI()
+
+    @app.websocket('/onebot/ws')
+    async def onebot(websocket: WebSocket):
+        await transport.serve(websocket)
+
+    client = TestClient(app)
+    with client.websocket_connect('/onebot/ws', headers={'Authorization': 'Bearer secret'}) as ws:
+        ws.send_text(json.dumps({'post_type': 'message', 'message_id': 1}))
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            assert wait_until(lambda: transport.connected)
+            future = executor.submit(transport.call, 'get_status', {}, 5)
+            frame = json.loads(ws.receive_text())
+            assert frame['action'] == 'get_status'
+            ws.send_text(json.dumps({'status': 'ok', 'data': {'good': True}, 'echo': frame['echo']}))
+            assert future.result(5)['data'] == {'good': True}
+    assert events == [{'post_type': 'message', 'message_id': 1}]
+    assert wait_until(lambda: not transport.connected)
+
+def test_reverse_websocket_rejects_invalid_token():
+    from fastapi import FastAPI, WebSocket
+    from fastapi.testclient import TestClient
+    from starlette.websockets import WebSocketDisconnect
+    from QQBotAPI.transport import ReverseWebSocketTransport
+
+    transport = ReverseWebSocketTransport(access_token='secret')
+    app = FastAPI()
+
+    @app.websocket('/onebot/ws')
+    async def onebot(websocket: WebSocket):
+        await transport.serve(websocket)
+
+    with pytest.raises(WebSocketDisconnect):
+        with TestClient(app).websocket_connect('/onebot/ws?access_token=wrong') as ws:
+            ws.receive_text()
+    assert transport.connections == 0